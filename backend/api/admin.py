@@ -1,24 +1,32 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User, FoodItem, Order, OrderItem, CustomerEnquiry
+from .models import User, Restaurant, FoodItem, Order, OrderItem, OrderStatusEvent, CustomerEnquiry
 
 
 @admin.register(User)
 class UserAdmin(BaseUserAdmin):
     """Admin interface for User model"""
     list_display = ['username', 'email', 'role', 'phone', 'is_active', 'created_at']
-    list_filter = ['role', 'is_active', 'is_staff']
+    list_filter = ['role', 'restaurant', 'is_active', 'is_staff']
     search_fields = ['username', 'email', 'phone']
     fieldsets = BaseUserAdmin.fieldsets + (
-        ('Additional Info', {'fields': ('role', 'phone', 'address')}),
+        ('Additional Info', {'fields': ('role', 'phone', 'address', 'restaurant')}),
     )
 
 
+@admin.register(Restaurant)
+class RestaurantAdmin(admin.ModelAdmin):
+    """Admin interface for Restaurant model"""
+    list_display = ['name', 'phone', 'is_active', 'created_at']
+    list_filter = ['is_active']
+    search_fields = ['name', 'address']
+
+
 @admin.register(FoodItem)
 class FoodItemAdmin(admin.ModelAdmin):
     """Admin interface for FoodItem model"""
-    list_display = ['name', 'category', 'price', 'available', 'created_at']
-    list_filter = ['available', 'category', 'created_at']
+    list_display = ['name', 'restaurant', 'category', 'price', 'available', 'created_at']
+    list_filter = ['restaurant', 'available', 'category', 'created_at']
     search_fields = ['name', 'description', 'category']
     list_editable = ['available', 'price']
 
@@ -30,15 +38,26 @@ class OrderItemInline(admin.TabularInline):
     readonly_fields = ['subtotal']
 
 
+class OrderStatusEventInline(admin.TabularInline):
+    """Read-only inline for the order status log"""
+    model = OrderStatusEvent
+    extra = 0
+    can_delete = False
+    readonly_fields = ['from_status', 'to_status', 'actor', 'created_at']
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     """Admin interface for Order model"""
-    list_display = ['id', 'customer_name', 'status', 'payment_method', 'total', 
+    list_display = ['id', 'restaurant', 'customer_name', 'status', 'payment_method', 'total', 
                     'delivery_staff', 'created_at']
-    list_filter = ['status', 'payment_method', 'created_at']
+    list_filter = ['restaurant', 'status', 'payment_method', 'created_at']
     search_fields = ['customer_name', 'phone_number', 'delivery_address']
     list_editable = ['status']
-    inlines = [OrderItemInline]
+    inlines = [OrderItemInline, OrderStatusEventInline]
     readonly_fields = ['created_at', 'updated_at']
 
 
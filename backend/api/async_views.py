@@ -0,0 +1,147 @@
+"""
+Async versions of the hot read endpoints, for deployments served by feasto.asgi.
+
+They use Django's async ORM and cache APIs so a slow query suspends the
+coroutine instead of holding a worker thread. The menu pages with ?page=
+like /api/food/ and returns the same {count, next, previous, results} body;
+the async order list pages with ?before_id= instead of a DRF cursor.
+"""
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.http import HttpResponseNotModified, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from rest_framework.utils.encoders import JSONEncoder
+from .cache import DASHBOARD_STATS_KEY, DASHBOARD_STATS_TTL, MENU_CACHE_TTL, get_menu_version, menu_cache_key
+from .models import User, FoodItem, Order, OrderStatusRollup
+from .serializers import FoodItemSerializer, OrderListSerializer, OrderSerializer
+from .views import (
+    DASHBOARD_ROLLUP_AGGREGATES, _authenticated_user, dashboard_payload, filter_menu,
+    menu_restaurant, orders_visible_to, with_item_count
+)
+
+ORDER_PAGE_SIZE = 50
+
+
+def _json(data, status_code=status.HTTP_200_OK):
+    # DRF's encoder handles the Decimal and datetime values serializers return
+    return JsonResponse(data, status=status_code, encoder=JSONEncoder, safe=False)
+
+
+async def _require_user(request):
+    user = await sync_to_async(_authenticated_user)(request)
+    if user is None:
+        return None, _json({'error': 'Authentication required'}, status.HTTP_401_UNAUTHORIZED)
+    return user, None
+
+
+async def _menu_page(request):
+    """One page of the menu in PageNumberPagination's shape, or None for a page that does not exist"""
+    queryset = filter_menu(FoodItem.objects.all(), request.GET)
+    page_size = api_settings.PAGE_SIZE
+    count = await queryset.acount()
+    pages = max((count + page_size - 1) // page_size, 1)
+    page = request.GET.get('page', '1')
+    if page == 'last':
+        page = pages
+    elif page.isdigit() and 1 <= int(page) <= pages:
+        page = int(page)
+    else:
+        return None
+
+    start = (page - 1) * page_size
+    items = [item async for item in queryset[start:start + page_size]]
+    url = request.build_absolute_uri()
+    if page == 1:
+        previous = None
+    elif page == 2:
+        previous = remove_query_param(url, 'page')
+    else:
+        previous = replace_query_param(url, 'page', page - 1)
+    return {
+        'count': count,
+        'next': replace_query_param(url, 'page', page + 1) if page < pages else None,
+        'previous': previous,
+        'results': FoodItemSerializer(items, many=True, context={'request': request}).data,
+    }
+
+
+async def menu_list(request):
+    """List the menu, served from cache and revalidated with ETag/Last-Modified"""
+    version, last_modified = await sync_to_async(get_menu_version)(menu_restaurant(request.GET))
+    key = menu_cache_key(version, request, request.GET)
+    etag = f'"{key.rsplit(":", 1)[-1]}"'
+
+    response = get_conditional_response(request, etag=etag, last_modified=int(last_modified))
+    if not isinstance(response, HttpResponseNotModified):
+        data = await cache.aget(key)
+        if data is None:
+            data = await _menu_page(request)
+            if data is None:
+                return _json({'detail': 'Invalid page.'}, status.HTTP_404_NOT_FOUND)
+            await cache.aset(key, data, MENU_CACHE_TTL)
+        response = _json(data)
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+async def order_list(request):
+    """List the current user's orders, newest first, paged with ?before_id="""
+    user, error = await _require_user(request)
+    if error:
+        return error
+
+    queryset = orders_visible_to(user, Order.objects.all())
+    status_param = request.GET.get('status')
+    if status_param:
+        queryset = queryset.filter(status=status_param)
+    before_id = request.GET.get('before_id')
+    if before_id:
+        if not before_id.isdigit():
+            return _json({'error': 'Invalid before_id'}, status.HTTP_400_BAD_REQUEST)
+        queryset = queryset.filter(id__lt=int(before_id))
+
+    queryset = with_item_count(queryset.select_related('customer', 'delivery_staff')).order_by('-id')
+    orders = [order async for order in queryset[:ORDER_PAGE_SIZE]]
+    return _json({
+        'next_before_id': orders[-1].id if len(orders) == ORDER_PAGE_SIZE else None,
+        'results': OrderListSerializer(orders, many=True).data,
+    })
+
+
+async def order_detail(request, pk):
+    """Get one of the current user's orders with items and user details"""
+    user, error = await _require_user(request)
+    if error:
+        return error
+
+    queryset = orders_visible_to(user, Order.objects.all())
+    try:
+        order = await queryset.select_related('customer', 'delivery_staff').prefetch_related('items').aget(pk=pk)
+    except Order.DoesNotExist:
+        return _json({'detail': 'Not found.'}, status.HTTP_404_NOT_FOUND)
+    # The ETA field may reload its statistics table, which is a sync query
+    return _json(await sync_to_async(lambda: OrderSerializer(order).data)())
+
+
+async def dashboard_stats(request):
+    """Get dashboard statistics for admin"""
+    user, error = await _require_user(request)
+    if error:
+        return error
+    if user.role != 'admin':
+        return _json({'error': 'Admin access required'}, status.HTTP_403_FORBIDDEN)
+
+    data = await cache.aget(DASHBOARD_STATS_KEY)
+    if data is None:
+        stats = await OrderStatusRollup.objects.aaggregate(**DASHBOARD_ROLLUP_AGGREGATES)
+        total_customers = await User.objects.filter(role='customer').acount()
+        data = dashboard_payload(stats, total_customers)
+        await cache.aset(DASHBOARD_STATS_KEY, data, DASHBOARD_STATS_TTL)
+    return _json(data)
@@ -0,0 +1,184 @@
+"""
+Signed JWT access and refresh tokens, and event stream tickets.
+
+Access tokens are short-lived and verified from their signature alone; the
+user they name is looked up in a small in-process LRU, so a request carrying
+one normally runs no authentication query at all. Refresh tokens live longer,
+are checked against the database and can be used once: refreshing returns a
+new pair and records the old token's id in the database, so every worker
+process rejects a replay. Changing the password invalidates every refresh
+token issued before. Stream tickets are access tokens cut down to opening
+the order event stream for a minute, since EventSource can only send a
+token in the URL.
+
+Cached users are dropped when the user is saved in this process and expire
+after settings.FEASTO_JWT_USER_CACHE_TTL seconds everywhere else, which bounds
+how long a role change or deactivation takes to apply to live access tokens.
+Each request gets its own copy of the cached user, so changes a view makes
+to request.user never reach other requests.
+"""
+import copy
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone as dt_timezone
+import jwt
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+from .models import UsedRefreshToken, User
+
+ALGORITHM = 'HS256'
+
+
+class InvalidToken(Exception):
+    """Raised when a token is malformed, expired, revoked or of the wrong type"""
+
+
+class UserCache:
+    """Thread-safe LRU of active users by id, each entry valid for ttl seconds"""
+
+    def __init__(self, size=1024, ttl=60):
+        self.size = size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._users = OrderedDict()
+
+    def get(self, user_id):
+        """A copy of the active user with user_id, from memory when possible; None if there is none"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is not None and now - entry[1] < self.ttl:
+                self._users.move_to_end(user_id)
+                return copy.copy(entry[0])
+        user = User.objects.filter(pk=user_id, is_active=True).first()
+        if user is not None:
+            with self._lock:
+                self._users[user_id] = (user, now)
+                self._users.move_to_end(user_id)
+                while len(self._users) > self.size:
+                    self._users.popitem(last=False)
+            return copy.copy(user)
+        return None
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+
+
+user_cache = UserCache(settings.FEASTO_JWT_USER_CACHE_SIZE, settings.FEASTO_JWT_USER_CACHE_TTL)
+
+
+def _password_fingerprint(user):
+    # Ties refresh tokens to the current password without putting the hash in the token
+    return hashlib.sha256(f'{user.pk}:{user.password}'.encode()).hexdigest()[:16]
+
+
+def _encode(claims, lifetime):
+    now = int(time.time())
+    return jwt.encode(
+        {**claims, 'iat': now, 'exp': now + lifetime, 'jti': uuid.uuid4().hex},
+        settings.FEASTO_JWT_SECRET, algorithm=ALGORITHM,
+    )
+
+
+def decode_token(token, token_type):
+    """Verified claims of a token of token_type ('access' or 'refresh')"""
+    try:
+        claims = jwt.decode(
+            token, settings.FEASTO_JWT_SECRET, algorithms=[ALGORITHM],
+            options={'require': ['exp', 'iat', 'jti', 'sub', 'type']},
+        )
+    except jwt.PyJWTError as exc:
+        raise InvalidToken(str(exc)) from exc
+    if claims['type'] != token_type:
+        raise InvalidToken('Wrong token type')
+    try:
+        claims['user_id'] = int(claims['sub'])
+    except ValueError:
+        raise InvalidToken('Invalid token subject')
+    return claims
+
+
+def issue_tokens(user):
+    """A fresh {'access', 'refresh', 'access_expires_in'} token pair for user"""
+    claims = {'sub': str(user.pk), 'role': user.role, 'restaurant': user.restaurant_id}
+    return {
+        'access': _encode({**claims, 'type': 'access'}, settings.FEASTO_JWT_ACCESS_TTL),
+        'refresh': _encode(
+            {'sub': str(user.pk), 'type': 'refresh', 'pwd': _password_fingerprint(user)},
+            settings.FEASTO_JWT_REFRESH_TTL,
+        ),
+        'access_expires_in': settings.FEASTO_JWT_ACCESS_TTL,
+    }
+
+
+def issue_stream_ticket(user):
+    """A short-lived token that only opens event streams, for clients that must put it in the URL"""
+    return _encode({'sub': str(user.pk), 'type': 'stream'}, settings.FEASTO_EVENT_TICKET_TTL)
+
+
+def revoke_refresh_token(claims):
+    """Retire a refresh token; returns False if it had already been used or revoked"""
+    expires_at = datetime.fromtimestamp(claims['exp'], tz=dt_timezone.utc)
+    try:
+        with transaction.atomic():
+            UsedRefreshToken.objects.create(jti=claims['jti'], expires_at=expires_at)
+    except IntegrityError:
+        return False
+    # Expired tokens fail decoding anyway, so their ids are no longer needed
+    UsedRefreshToken.objects.filter(expires_at__lt=timezone.now()).delete()
+    return True
+
+
+def refresh_tokens(token):
+    """Trade a refresh token for a new token pair; each refresh token works once"""
+    claims = decode_token(token, 'refresh')
+    user = User.objects.filter(pk=claims['user_id'], is_active=True).first()
+    if user is None or claims.get('pwd') != _password_fingerprint(user):
+        raise InvalidToken('Token is no longer valid')
+    if not revoke_refresh_token(claims):
+        raise InvalidToken('Token has already been used')
+    user_cache.invalidate(user.pk)
+    return user, issue_tokens(user)
+
+
+def user_from_token(token, token_type='access'):
+    """The active user a token of token_type was issued to"""
+    user = user_cache.get(decode_token(token, token_type)['user_id'])
+    if user is None:
+        raise InvalidToken('User not found or inactive')
+    return user
+
+
+def bearer_token(request):
+    """The token of an 'Authorization: Bearer' header, or None"""
+    header = get_authorization_header(request).split()
+    if len(header) != 2 or header[0].lower() != b'bearer':
+        return None
+    return header[1].decode('latin-1')
+
+
+class JWTAuthentication(BaseAuthentication):
+    """Authenticate requests carrying 'Authorization: Bearer <access token>'"""
+
+    def authenticate(self, request):
+        token = bearer_token(request)
+        if token is None:
+            return None
+        try:
+            return user_from_token(token), token
+        except InvalidToken as exc:
+            raise exceptions.AuthenticationFailed(str(exc))
+
+    def authenticate_header(self, request):
+        return 'Bearer'
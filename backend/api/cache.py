@@ -0,0 +1,95 @@
+"""
+Read-through caching helpers shared by the views.
+
+Values are stored in the default cache configured in settings.CACHES. Groups
+of keys that must be dropped together (such as every menu listing) are
+namespaced by a version counter, so bumping the version invalidates them all
+without having to know the individual keys.
+"""
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+MENU_CACHE_TTL = settings.FEASTO_MENU_CACHE_TTL
+DASHBOARD_STATS_KEY = 'dashboard:stats'
+DASHBOARD_STATS_TTL = 30
+
+_MISSING = object()
+
+
+def cached(key, loader, ttl=DEFAULT_TIMEOUT):
+    """Return the cached value for key, calling loader and storing its result on a miss"""
+    value = cache.get(key, _MISSING)
+    if value is _MISSING:
+        value = loader()
+        cache.set(key, value, ttl)
+    return value
+
+
+def invalidate(*keys):
+    """Remove keys from the cache"""
+    cache.delete_many(keys)
+
+
+def _initial_version():
+    # Start from the clock so a flushed cache never hands out an old version again
+    return int(time.time() * 1000)
+
+
+def get_version(namespace, ttl=MENU_CACHE_TTL):
+    """
+    Return (version, last_modified timestamp) of a namespace.
+
+    Versions expire after ttl and restart from the clock. With a per-process
+    cache that is how bumps made by other processes are eventually seen.
+    """
+    version_key, modified_key = f'{namespace}:version', f'{namespace}:last-modified'
+    state = cache.get_many([version_key, modified_key])
+    if version_key not in state:
+        if cache.add(version_key, _initial_version(), ttl):
+            # Another process may have changed the data since the old version was read
+            cache.set(modified_key, time.time(), ttl)
+        state = cache.get_many([version_key, modified_key])
+    return state.get(version_key, _initial_version()), state.get(modified_key, time.time())
+
+
+def bump_version(namespace, ttl=MENU_CACHE_TTL):
+    """Invalidate every key built from the namespace's current version"""
+    version_key = f'{namespace}:version'
+    try:
+        cache.incr(version_key)
+    except ValueError:
+        cache.add(version_key, _initial_version(), ttl)
+    cache.set(f'{namespace}:last-modified', time.time(), ttl)
+
+
+def versioned_key(namespace, version, *parts):
+    """Build a fixed-length key for a value derived from a namespace version"""
+    raw = '|'.join(str(part) for part in (version, *parts))
+    return f'{namespace}:{hashlib.md5(raw.encode()).hexdigest()}'
+
+
+def _menu_namespace(restaurant_id):
+    return 'menu' if restaurant_id is None else f'menu:{restaurant_id}'
+
+
+def get_menu_version(restaurant_id=None):
+    """Return (version, last_modified timestamp) of one restaurant's menu, or of all menus"""
+    return get_version(_menu_namespace(restaurant_id))
+
+
+def bump_menu_version(restaurant_id=None):
+    """Invalidate cached representations of a restaurant's menu and of the combined menu"""
+    bump_version('menu')
+    if restaurant_id is not None:
+        # Other restaurants' cached menus stay valid
+        bump_version(_menu_namespace(restaurant_id))
+
+
+def menu_cache_key(version, request, params, representation='json'):
+    """Cache key for one menu listing, also usable as its ETag"""
+    params = '&'.join(f'{key}={value}' for key, value in sorted(params.items()))
+    # Image and pagination URLs are absolute, so the host and endpoint are part of the representation
+    return versioned_key('menu:list', version, request.build_absolute_uri(request.path), representation, params)
@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.checks import Error, Warning, register
+
+
+@register()
+def check_dispatch_settings(app_configs, **kwargs):
+    """Catch a missing or malformed kitchen location before dispatch runs into it"""
+    location = settings.FEASTO_KITCHEN_LOCATION
+    if location is None:
+        if not settings.FEASTO_AUTO_DISPATCH:
+            return []
+        return [Warning(
+            'FEASTO_AUTO_DISPATCH is on but FEASTO_KITCHEN_LOCATION is not set.',
+            hint='Orders of restaurants without latitude/longitude will not be dispatched. '
+                 'Set FEASTO_KITCHEN_LOCATION="lat,lng" or the restaurant coordinates.',
+            id='api.W001',
+        )]
+    if len(location) != 2 or not (-90 <= location[0] <= 90 and -180 <= location[1] <= 180):
+        return [Error(
+            f'FEASTO_KITCHEN_LOCATION {location!r} is not a valid "lat,lng" pair.',
+            id='api.E001',
+        )]
+    return []
+
+
+@register()
+def check_authentication_backends(app_configs, **kwargs):
+    """Logins check passwords themselves, on the password pool, instead of going through the backends"""
+    if list(settings.AUTHENTICATION_BACKENDS) == ['django.contrib.auth.backends.ModelBackend']:
+        return []
+    return [Warning(
+        'Logins only check usernames and passwords against the User table.',
+        hint='AUTHENTICATION_BACKENDS other than ModelBackend are not used by '
+             'api.logins.verify_credentials.',
+        id='api.W002',
+    )]
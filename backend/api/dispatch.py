@@ -0,0 +1,201 @@
+"""
+Automatic dispatch of ready orders to the nearest available riders.
+
+Each run takes the unassigned ready orders and the delivery users who are
+not out on a delivery and have reported a recent position, builds the full
+rider-to-pickup distance matrix with NumPy and pairs them greedily, cheapest
+pair first. Orders are picked up at their restaurant, and riders who work
+for one restaurant are only matched with its orders. Assignments go through
+api.orders.claim_order, so a rider who claims an order by hand in the
+meantime simply wins it.
+
+Runs are triggered by `manage.py run_dispatch` (once or on an interval) and,
+with settings.FEASTO_AUTO_DISPATCH, on a background thread whenever an order
+becomes ready. Each assignment locks the rider's row and is skipped if the
+rider already carries an order, so concurrent runs in different processes
+never hand the same rider two orders. A cache lock only saves duplicate work.
+"""
+import logging
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+from .models import Order, RiderLocation, User
+from .orders import claim_order
+from .tracking import EARTH_RADIUS_KM, rider_tracker
+
+logger = logging.getLogger(__name__)
+
+DISPATCH_LOCK_KEY = 'dispatch:lock'
+DISPATCH_LOCK_TTL = 60
+# Most orders one automatic run assigns; run_dispatch works through larger backlogs
+AUTO_DISPATCH_LIMIT = 100
+
+_background = ThreadPoolExecutor(max_workers=1, thread_name_prefix='dispatch')
+_run_pending = threading.Event()
+
+Assignment = namedtuple('Assignment', ['order_id', 'rider_id', 'distance_km'])
+
+
+def distance_matrix(origins, destinations):
+    """Haversine distances in km from each origin (rows) to each destination (columns)"""
+    origins = np.radians(np.asarray(origins, dtype=float))
+    destinations = np.radians(np.asarray(destinations, dtype=float))
+    lat1, lng1 = origins[:, 0, None], origins[:, 1, None]
+    lat2, lng2 = destinations[None, :, 0], destinations[None, :, 1]
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def greedy_assignment(cost, max_cost=np.inf):
+    """
+    Pair rows with columns, cheapest (row, column) first, each used at most once.
+
+    Ties keep row order, so rows sorted oldest first win equal costs. Pairs
+    costing more than max_cost are never made. Returns [(row, column, cost)].
+    """
+    n_rows, n_cols = cost.shape
+    flat = np.argsort(cost, axis=None, kind='stable')
+    flat = flat[cost.ravel()[flat] <= max_cost]
+    rows, cols = np.unravel_index(flat, cost.shape)
+
+    row_taken = np.zeros(n_rows, dtype=bool)
+    col_taken = np.zeros(n_cols, dtype=bool)
+    pairs = []
+    limit = min(n_rows, n_cols)
+    for row, col in zip(rows.tolist(), cols.tolist()):
+        if row_taken[row] or col_taken[col]:
+            continue
+        row_taken[row] = col_taken[col] = True
+        pairs.append((row, col, float(cost[row, col])))
+        if len(pairs) == limit:
+            break
+    return pairs
+
+
+def pickup_point(order):
+    """(latitude, longitude) pickup point of an (id, restaurant_id, latitude, longitude) order row, or None"""
+    _, _, latitude, longitude = order
+    if latitude is not None and longitude is not None:
+        return latitude, longitude
+    return settings.FEASTO_KITCHEN_LOCATION
+
+
+def available_riders():
+    """Ids, positions and restaurant ids (0 for any) of riders with no active delivery and a recent location"""
+    cutoff = timezone.now() - timedelta(seconds=rider_tracker.active_window)
+    latest = RiderLocation.objects.filter(rider=OuterRef('pk'), recorded_at__gte=cutoff).order_by('-recorded_at')
+    riders = User.objects.filter(role='delivery', is_active=True).exclude(
+        deliveries__status='out_for_delivery'
+    ).annotate(
+        latitude=Subquery(latest.values('latitude')[:1]),
+        longitude=Subquery(latest.values('longitude')[:1]),
+    ).values_list('id', 'latitude', 'longitude', 'restaurant_id')
+
+    rider_ids, positions, restaurants = [], [], []
+    for rider_id, latitude, longitude, restaurant_id in riders:
+        # Positions this process holds in memory are newer than the last flush
+        live = rider_tracker.position(rider_id)
+        if live is not None and live.timestamp >= cutoff.timestamp():
+            latitude, longitude = live.latitude, live.longitude
+        if latitude is None:
+            continue
+        rider_ids.append(rider_id)
+        positions.append((latitude, longitude))
+        restaurants.append(restaurant_id or 0)
+    return rider_ids, np.asarray(positions, dtype=float).reshape(-1, 2), np.asarray(restaurants)
+
+
+def plan_dispatch(order_ids, pickups, rider_ids, positions, max_km=None,
+                  order_restaurants=None, rider_restaurants=None):
+    """Match orders to riders by pickup distance; returns [Assignment]"""
+    if not order_ids or not rider_ids:
+        return []
+    max_km = settings.FEASTO_DISPATCH_MAX_KM if max_km is None else max_km
+    cost = distance_matrix(pickups, positions)
+    if order_restaurants is not None and rider_restaurants is not None:
+        # Riders tied to a restaurant (non-zero id) never take another restaurant's orders
+        order_restaurants = np.asarray(order_restaurants)[:, None]
+        rider_restaurants = np.asarray(rider_restaurants)[None, :]
+        cost[(rider_restaurants != 0) & (rider_restaurants != order_restaurants)] = np.inf
+    return [
+        Assignment(order_ids[row], rider_ids[col], distance)
+        for row, col, distance in greedy_assignment(cost, max_km)
+    ]
+
+
+def assign_to_idle_rider(order_id, rider):
+    """Claim order_id for rider unless the rider already carries an order; returns the order or None"""
+    with transaction.atomic():
+        # Concurrent assignments to the same rider queue on this row lock, in any process
+        User.objects.select_for_update().filter(pk=rider.pk).values_list('pk').first()
+        if Order.objects.filter(delivery_staff=rider, status='out_for_delivery').exists():
+            return None
+        return claim_order(order_id, rider)
+
+
+def dispatch_ready_orders(limit=1000):
+    """
+    Assign unassigned ready orders to the nearest available riders.
+
+    Orders with no pickup point (restaurant without coordinates and no
+    FEASTO_KITCHEN_LOCATION) are skipped. Returns the assignments that were
+    written, or None if another run holds the dispatch lock.
+    """
+    if not cache.add(DISPATCH_LOCK_KEY, 1, DISPATCH_LOCK_TTL):
+        return None
+    try:
+        orders = list(Order.objects.filter(
+            status='ready', delivery_staff__isnull=True
+        ).order_by('created_at').values_list(
+            'id', 'restaurant_id', 'restaurant__latitude', 'restaurant__longitude'
+        )[:limit])
+        located = [(order, pickup_point(order)) for order in orders]
+        unlocated = [order[0] for order, pickup in located if pickup is None]
+        if unlocated:
+            logger.warning(
+                '%d ready orders (first: #%d) have no pickup point; set their restaurant '
+                'coordinates or FEASTO_KITCHEN_LOCATION', len(unlocated), unlocated[0],
+            )
+            located = [(order, pickup) for order, pickup in located if pickup is not None]
+        if not located:
+            return []
+        rider_ids, positions, rider_restaurants = available_riders()
+        plan = plan_dispatch(
+            [order[0] for order, _ in located], np.asarray([pickup for _, pickup in located], dtype=float),
+            rider_ids, positions,
+            order_restaurants=[order[1] for order, _ in located], rider_restaurants=rider_restaurants,
+        )
+
+        riders = User.objects.in_bulk([assignment.rider_id for assignment in plan])
+        return [
+            assignment for assignment in plan
+            if assign_to_idle_rider(assignment.order_id, riders[assignment.rider_id]) is not None
+        ]
+    finally:
+        cache.delete(DISPATCH_LOCK_KEY)
+
+
+def _dispatch_in_background():
+    # Orders that become ready from here on trigger another run
+    _run_pending.clear()
+    try:
+        dispatch_ready_orders(limit=AUTO_DISPATCH_LIMIT)
+    except Exception:
+        logger.exception('Automatic dispatch failed')
+    finally:
+        # The connection belongs to this pool thread, which may sit idle for a long time
+        connection.close()
+
+
+def schedule_dispatch():
+    """Run a dispatch on the background thread unless one is already waiting to start"""
+    if not _run_pending.is_set():
+        _run_pending.set()
+        _background.submit(_dispatch_in_background)
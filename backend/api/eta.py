@@ -0,0 +1,171 @@
+"""
+Delivery ETA estimates from precomputed prep and travel time statistics.
+
+Every status event that ends a timed phase adds one sample to
+DeliveryTimeStat: prep time (order placed -> ready) on 'ready' and travel
+time (out_for_delivery -> delivered) on 'delivered'. Samples are keyed by the
+order's delivery zone, a grid cell of its drop-off coordinates, and the local
+hour it was placed, and are also added to the all-zones row for that hour.
+
+Estimating an ETA reads an in-process copy of that small table, so order
+responses never scan order history.
+"""
+import math
+import time
+from collections import defaultdict
+from datetime import timedelta
+from django.db import transaction
+from django.utils import timezone
+from .models import DeliveryTimeStat, OrderStatusEvent
+from .rollups import bump
+
+ZONE_DEGREES = 0.02
+# A zone or hour needs this many samples before its average is trusted
+MIN_SAMPLES = 5
+# Longer phases are treated as data errors (e.g. a forgotten status update)
+MAX_SAMPLE_SECONDS = 4 * 3600
+DEFAULT_PREP_SECONDS = 20 * 60
+DEFAULT_TRAVEL_SECONDS = 25 * 60
+
+
+def delivery_zone(latitude, longitude):
+    """Grid cell of a drop-off point, or '' when the order has no coordinates"""
+    if latitude is None or longitude is None:
+        return ''
+    return f'{math.floor(latitude / ZONE_DEGREES)}:{math.floor(longitude / ZONE_DEGREES)}'
+
+
+def _stat_keys(zone, placed_at):
+    hour = timezone.localtime(placed_at).hour
+    keys = [{'zone': '', 'hour': hour}]
+    if zone:
+        keys.append({'zone': zone, 'hour': hour})
+    return keys
+
+
+def _timed_phase(event):
+    """(phase, started_at) for events that end the prep or travel phase, else None"""
+    if event.to_status == 'ready':
+        return 'prep', event.order.created_at
+    if event.to_status == 'delivered':
+        started = OrderStatusEvent.objects.filter(
+            order_id=event.order_id, to_status='out_for_delivery'
+        ).order_by('-created_at').values_list('created_at', flat=True).first()
+        if started is not None:
+            return 'travel', started
+    return None
+
+
+def record_status_timing(event):
+    """Add the phase a status event completes to the delivery time statistics"""
+    phase = _timed_phase(event)
+    if phase is None:
+        return
+    phase, started = phase
+    seconds = (event.created_at - started).total_seconds()
+    if not 0 < seconds <= MAX_SAMPLE_SECONDS:
+        return
+    order = event.order
+    zone = delivery_zone(order.delivery_latitude, order.delivery_longitude)
+    for keys in _stat_keys(zone, order.created_at):
+        bump(DeliveryTimeStat, keys, **{f'{phase}_count': 1, f'{phase}_seconds': seconds})
+
+
+def rebuild_delivery_stats():
+    """Recompute the statistics from the status log of every order"""
+    totals = defaultdict(lambda: {'prep_count': 0, 'prep_seconds': 0.0, 'travel_count': 0, 'travel_seconds': 0.0})
+    dispatched = {}
+    events = OrderStatusEvent.objects.filter(
+        to_status__in=('ready', 'out_for_delivery', 'delivered')
+    ).order_by('order_id', 'created_at').values_list(
+        'order_id', 'to_status', 'created_at',
+        'order__created_at', 'order__delivery_latitude', 'order__delivery_longitude',
+    )
+    for order_id, to_status, created_at, placed_at, latitude, longitude in events.iterator(chunk_size=2000):
+        if to_status == 'out_for_delivery':
+            dispatched[order_id] = created_at
+            continue
+        if to_status == 'ready':
+            phase, started = 'prep', placed_at
+        elif order_id in dispatched:
+            phase, started = 'travel', dispatched.pop(order_id)
+        else:
+            continue
+        seconds = (created_at - started).total_seconds()
+        if not 0 < seconds <= MAX_SAMPLE_SECONDS:
+            continue
+        for keys in _stat_keys(delivery_zone(latitude, longitude), placed_at):
+            row = totals[keys['zone'], keys['hour']]
+            row[f'{phase}_count'] += 1
+            row[f'{phase}_seconds'] += seconds
+
+    with transaction.atomic():
+        DeliveryTimeStat.objects.all().delete()
+        DeliveryTimeStat.objects.bulk_create([
+            DeliveryTimeStat(zone=zone, hour=hour, **row) for (zone, hour), row in totals.items()
+        ])
+    # Other processes pick up the rebuilt table when their copy expires
+    eta_table.invalidate()
+    return len(totals)
+
+
+def _mean(count, seconds):
+    return seconds / count if count >= MIN_SAMPLES else None
+
+
+class EtaTable:
+    """In-process copy of the delivery time averages, reloaded every ttl seconds"""
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._means = {}
+        self._loaded_at = None
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    def _load(self):
+        means = {}
+        overall = [0, 0.0, 0, 0.0]
+        rows = DeliveryTimeStat.objects.values_list(
+            'zone', 'hour', 'prep_count', 'prep_seconds', 'travel_count', 'travel_seconds'
+        )
+        for zone, hour, prep_count, prep_seconds, travel_count, travel_seconds in rows:
+            means[zone, hour] = (_mean(prep_count, prep_seconds), _mean(travel_count, travel_seconds))
+            if not zone:
+                overall = [a + b for a, b in zip(overall, (prep_count, prep_seconds, travel_count, travel_seconds))]
+        means[None] = (_mean(*overall[:2]), _mean(*overall[2:]))
+        self._means, self._loaded_at = means, time.monotonic()
+        return means
+
+    def durations(self, zone, hour):
+        """Expected (prep_seconds, travel_seconds), falling back from zone and hour to all zones to all hours"""
+        means = self._means
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl:
+            means = self._load()
+        prep = travel = None
+        for key in ((zone, hour), ('', hour), None):
+            entry_prep, entry_travel = means.get(key, (None, None))
+            prep = entry_prep if prep is None else prep
+            travel = entry_travel if travel is None else travel
+        return prep or DEFAULT_PREP_SECONDS, travel or DEFAULT_TRAVEL_SECONDS
+
+    def estimate(self, order, now=None):
+        """Expected delivery time of an order, or None once it is delivered or cancelled"""
+        if order.status in ('delivered', 'cancelled'):
+            return None
+        now = now or timezone.now()
+        prep, travel = self.durations(
+            delivery_zone(order.delivery_latitude, order.delivery_longitude),
+            timezone.localtime(order.created_at).hour,
+        )
+        if order.status == 'out_for_delivery':
+            # Status changes stamp updated_at, so it is when the rider left
+            return max(order.updated_at + timedelta(seconds=travel), now)
+        if order.status == 'ready':
+            return now + timedelta(seconds=travel)
+        ready_at = max(order.created_at + timedelta(seconds=prep), now)
+        return ready_at + timedelta(seconds=travel)
+
+
+eta_table = EtaTable()
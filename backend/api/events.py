@@ -0,0 +1,107 @@
+"""
+Publish/subscribe channel for order events pushed to clients over SSE.
+
+Publishers call get_broker().publish(event) from any thread. Subscribers are
+the long-lived /api/events/orders/ streams, each reading from its own asyncio
+queue. The broker class is chosen with settings.FEASTO_EVENT_BROKER; the default
+InProcessBroker only reaches subscribers in the same process, which is enough
+for a single ASGI worker and for local development. A multi-worker deployment
+can plug in a broker backed by an external pub/sub with the same interface.
+"""
+import asyncio
+import threading
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class Subscription:
+    """One subscriber's bounded event queue, bound to the event loop that reads it"""
+
+    def __init__(self, maxsize=100):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+
+    def put(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # The subscriber's loop has already closed
+            pass
+
+    def _put(self, event):
+        if self.queue.full():
+            # A slow client loses its oldest event rather than blocking publishers
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class InProcessBroker:
+    """Fan events out to the subscribers of this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = set()
+
+    def publish(self, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            subscription.put(event)
+
+    def subscribe(self):
+        subscription = Subscription()
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(settings.FEASTO_EVENT_BROKER)()
+    return _broker
+
+
+def order_event(order, previous_status):
+    """Build the payload pushed to clients when an order is created or changes status"""
+    return {
+        'type': 'order.created' if previous_status is None else 'order.updated',
+        'order_id': order.pk,
+        'restaurant_id': order.restaurant_id,
+        'status': order.status,
+        'previous_status': previous_status,
+        'customer_id': order.customer_id,
+        'delivery_staff_id': order.delivery_staff_id,
+        'updated_at': order.updated_at.isoformat() if order.updated_at else None,
+    }
+
+
+def is_visible_to(event, user):
+    """Admins see every order, customers their own, riders theirs plus the claimable pool"""
+    if user.role == 'customer':
+        return event['customer_id'] == user.pk
+    # Staff of one restaurant only follow that restaurant's orders
+    if user.restaurant_id and event['restaurant_id'] != user.restaurant_id:
+        return False
+    if user.role == 'admin':
+        return True
+    if user.role == 'delivery':
+        return (
+            event['delivery_staff_id'] == user.pk
+            or event['status'] == 'ready'
+            or event['previous_status'] == 'ready'
+        )
+    return False
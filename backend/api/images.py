@@ -0,0 +1,137 @@
+"""
+Resized, compressed variants of menu item photos.
+
+Uploads are decoded once and re-encoded at each width in VARIANT_WIDTHS as
+WebP, and also as AVIF when the installed Pillow can write it. Variants are
+named after the hash of their own bytes, so a name never points at different
+content and the files can be served with a far-future, immutable cache
+policy. Identical outputs (the same photo on two items) are stored once.
+
+Items that use image_url get the same treatment from api.remote_images,
+which also keeps a content-addressed copy of the downloaded original.
+
+FoodItem.image_variants records what was generated, for the uploaded file
+name or the image_url it was made from:
+
+    {'source': 'food_images/pizza.jpg', 'webp': [[80, 'food_images/variants/<hash>.webp'], ...]}
+"""
+import hashlib
+import io
+import posixpath
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from PIL import Image, ImageOps
+
+VARIANT_WIDTHS = (80, 160, 320, 640)
+VARIANT_DIR = 'food_images/variants'
+
+Image.init()
+# (format, extension, MIME type, encoder options)
+VARIANT_FORMATS = [
+    (name, extension, mime, options)
+    for name, extension, mime, options in (
+        ('WEBP', 'webp', 'image/webp', {'quality': 80, 'method': 4}),
+        ('AVIF', 'avif', 'image/avif', {'quality': 60, 'speed': 8}),
+    )
+    if name in Image.SAVE
+]
+MIME_TYPES = {extension: mime for _, extension, mime, _ in VARIANT_FORMATS}
+# Extensions of downloaded originals, by the format Pillow detects
+ORIGINAL_EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+
+
+def _target_widths(width):
+    """Variant widths for a source width, never upscaling"""
+    widths = [target for target in VARIANT_WIDTHS if target < width]
+    if width <= VARIANT_WIDTHS[-1]:
+        widths.append(width)
+    return widths
+
+
+def _decode(data):
+    image = Image.open(io.BytesIO(data))
+    # JPEGs can decode straight at a reduced scale, far cheaper than full size
+    image.draft(image.mode, (VARIANT_WIDTHS[-1], VARIANT_WIDTHS[-1]))
+    image = ImageOps.exif_transpose(image)
+    has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+    return image.convert('RGBA' if has_alpha else 'RGB')
+
+
+def _store(data, extension):
+    """Save data under its content hash in VARIANT_DIR, once; returns the storage name"""
+    name = f'{VARIANT_DIR}/{hashlib.sha256(data).hexdigest()[:32]}.{extension}'
+    if not default_storage.exists(name):
+        name = default_storage.save(name, ContentFile(data))
+    return name
+
+
+def build_variants(data):
+    """Encode and store every variant of an image's bytes; returns {extension: [[width, name]]}"""
+    image = _decode(data)
+    variants = {extension: [] for _, extension, _, _ in VARIANT_FORMATS}
+    for width in _target_widths(image.width):
+        height = max(1, round(image.height * width / image.width))
+        resized = image.resize((width, height), Image.LANCZOS) if width != image.width else image
+        for name, extension, _, options in VARIANT_FORMATS:
+            buffer = io.BytesIO()
+            resized.save(buffer, name, **options)
+            variants[extension].append([width, _store(buffer.getvalue(), extension)])
+    return variants
+
+
+def store_original(data):
+    """Keep a copy of a downloaded image under its content hash; returns the storage name"""
+    image_format = Image.open(io.BytesIO(data)).format
+    if image_format not in ORIGINAL_EXTENSIONS:
+        raise ValueError(f'Unsupported image format: {image_format}')
+    return _store(data, ORIGINAL_EXTENSIONS[image_format])
+
+
+def variants_for_file(name):
+    """Build the variants of a stored image; runs in backfill worker processes"""
+    with default_storage.open(name, 'rb') as source:
+        return {'source': name, **build_variants(source.read())}
+
+
+def image_source(item):
+    """What an item's variants are built from: its image_url, else its uploaded file name"""
+    if item.image_url:
+        return item.image_url
+    return item.image.name if item.image else None
+
+
+def refresh_image_variants(item):
+    """
+    Bring item.image_variants in line with the item's image before it is saved.
+
+    New uploads are processed here; images that were already stored without
+    variants are left to `manage.py build_image_variants`, and image_url
+    downloads to api.remote_images, so saving an item never re-reads its photo.
+    """
+    image = item.image
+    if not item.image_url and image and not image._committed:
+        upload = image.file
+        upload.seek(0)
+        data = upload.read()
+        upload.seek(0)
+        # Store the upload now, as the field would on save, so its final name is known
+        image.save(image.name, upload, save=False)
+        item.image_variants = {'source': image.name, **build_variants(data)}
+    elif item.image_variants.get('source') != image_source(item):
+        # Variants of a previous photo must not be served for this one
+        item.image_variants = {}
+
+
+def stored_image_url(name):
+    """Path of the view serving a stored variant or original"""
+    return reverse('image-file', args=[posixpath.basename(name)])
+
+
+def srcsets(variants, absolute_url):
+    """{MIME type: srcset} of stored variants, smallest first, with URLs made absolute by absolute_url"""
+    return {
+        mime: ', '.join(f'{absolute_url(stored_image_url(name))} {width}w' for width, name in variants[extension])
+        for extension, mime in MIME_TYPES.items()
+        if variants.get(extension)
+    }
@@ -0,0 +1,120 @@
+"""
+Server-side stock of menu items.
+
+FoodItem.stock is the number of portions left, or NULL for items whose stock
+is not tracked. Checkout reserves the portions of every ordered item with a
+single conditional UPDATE that only decrements rows holding enough stock, so
+concurrent orders can never take the same portion twice. Items that run out
+are marked unavailable in the same statement. Cancelled orders put their
+portions back.
+
+update() bypasses the FoodItem save signals, so menu caches are only
+invalidated when an item actually runs out; stock counts in cached menu
+listings may lag until the next menu change.
+"""
+from collections import Counter
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from .cache import bump_menu_version
+from .models import FoodItem, OrderItem
+from .pricing import price_index
+
+
+class OutOfStock(Exception):
+    """Raised when a tracked item has fewer portions left than were ordered"""
+
+    def __init__(self, items):
+        self.items = items
+        super().__init__(f"Not enough stock for {', '.join(items)}")
+
+
+def order_quantities(items):
+    """{food_item_id: total quantity} of (food_item_id, quantity) order lines"""
+    quantities = Counter()
+    for food_item_id, quantity in items:
+        quantities[food_item_id] += quantity
+    return quantities
+
+
+def _taken(quantities):
+    return Case(
+        *[When(id=food_item_id, then=Value(quantity)) for food_item_id, quantity in quantities.items()],
+        output_field=IntegerField(),
+    )
+
+
+def _tracked_stock(ids):
+    return dict(FoodItem.objects.filter(id__in=ids, stock__isnull=False).values_list('id', 'stock'))
+
+
+def reserve_stock(quantities):
+    """
+    Take {food_item_id: quantity} portions out of stock in one UPDATE.
+
+    Either every tracked item had enough stock and all are decremented, or
+    nothing changes and OutOfStock is raised. Untracked items are ignored.
+    Call inside the transaction that creates the order.
+    """
+    if not quantities:
+        return
+    enough = Q()
+    for food_item_id, quantity in quantities.items():
+        enough |= Q(id=food_item_id, stock__gte=quantity)
+    taken = _taken(quantities)
+
+    try:
+        with transaction.atomic():
+            updated = FoodItem.objects.filter(enough).update(
+                # Kept before stock: MySQL evaluates SET left to right with the
+                # values already assigned, other databases with the old row
+                available=Case(When(stock__lte=taken, then=Value(False)), default=F('available')),
+                stock=F('stock') - taken,
+            )
+            stock = _tracked_stock(quantities)
+            if updated < len(stock):
+                # Some tracked item was short; roll the others back
+                raise OutOfStock([])
+    except OutOfStock:
+        stock = _tracked_stock(quantities)
+        short = [food_item_id for food_item_id, left in stock.items() if left < quantities[food_item_id]]
+        names = dict(FoodItem.objects.filter(id__in=short).values_list('id', 'name'))
+        raise OutOfStock([names[food_item_id] for food_item_id in short if food_item_id in names])
+
+    sold_out = [food_item_id for food_item_id, left in stock.items() if left == 0]
+    if sold_out:
+        _menu_changed(sold_out)
+
+
+def release_stock(quantities):
+    """Put {food_item_id: quantity} portions back into stock, e.g. for a cancelled order"""
+    if not quantities:
+        return
+    # Items that sold out stay unavailable until staff turn them back on
+    FoodItem.objects.filter(id__in=quantities, stock__isnull=False).update(
+        stock=F('stock') + _taken(quantities)
+    )
+
+
+def release_order_stock(order_id):
+    """Return the portions of a cancelled order to stock"""
+    lines = OrderItem.objects.filter(order_id=order_id).values_list('food_item_id', 'quantity')
+    release_stock(order_quantities(lines))
+
+
+def _menu_changed(food_item_ids):
+    restaurants = set(FoodItem.objects.filter(id__in=food_item_ids).values_list('restaurant_id', flat=True))
+
+    def invalidate():
+        price_index.invalidate()
+        for restaurant_id in restaurants:
+            bump_menu_version(restaurant_id)
+
+    transaction.on_commit(invalidate)
+
+
+def low_stock(threshold, restaurant_id=None):
+    """Tracked items with at most threshold portions left, fewest first"""
+    items = FoodItem.objects.filter(stock__lte=threshold)
+    if restaurant_id is not None:
+        items = items.filter(restaurant_id=restaurant_id)
+    return items.order_by('stock', 'id')
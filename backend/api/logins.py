@@ -0,0 +1,210 @@
+"""
+Login attempts: throttling and a bounded pool for password checks.
+
+Checking a password runs PBKDF2 at Django's default iteration count, which
+is meant to be expensive. Two guards stop a login burst, such as a shift
+change, or a password-guessing run from starving the rest of the API:
+
+- Failed attempts are counted in the cache per username and per client IP.
+  Once either count reaches its limit, further attempts get 429 without any
+  hashing until the window ends. Successful logins are not counted, so many
+  riders behind one IP can still sign in together.
+- Passwords are checked on a fixed pool of threads. hashlib releases the GIL
+  while hashing, so at most settings.FEASTO_PASSWORD_WORKERS cores hash at
+  once. When more than settings.FEASTO_PASSWORD_QUEUE checks are already
+  waiting, new attempts get 503 with Retry-After instead of an unbounded
+  queue.
+
+The hashing cost itself is unchanged, so stored hashes are as strong as before.
+"""
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from django.contrib.auth.signals import user_login_failed
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.exceptions import APIException, Throttled
+from .metrics import Histogram
+from .models import User
+
+LATENCY_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class LoginBusy(APIException):
+    """Raised when the password check queue is full"""
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many logins in progress, try again shortly.'
+    default_code = 'login_busy'
+    # Sent as Retry-After by DRF's exception handler
+    wait = 1
+
+
+class PasswordCheckPool:
+    """Fixed worker threads for password hashing with a bounded wait queue"""
+
+    def __init__(self, workers, max_queue):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-check')
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_ms = Histogram(LATENCY_BUCKETS)
+        self.check_ms = Histogram(LATENCY_BUCKETS)
+
+    def run(self, func, *args):
+        """Run func(*args) on a pool thread and return its result; raises LoginBusy when the queue is full"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise LoginBusy()
+        enqueued = time.perf_counter()
+        with self._lock:
+            self.queued += 1
+
+        def task():
+            started = time.perf_counter()
+            with self._lock:
+                self.queued -= 1
+                self.running += 1
+                self.wait_ms.observe((started - enqueued) * 1000)
+            try:
+                return func(*args)
+            finally:
+                with self._lock:
+                    self.running -= 1
+                    self.completed += 1
+                    self.check_ms.observe((time.perf_counter() - started) * 1000)
+                self._slots.release()
+
+        try:
+            return self._executor.submit(task).result()
+        except RuntimeError:
+            # The executor is shutting down; the task never ran
+            self._slots.release()
+            raise
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'max_queue': self.max_queue,
+                'queued': self.queued,
+                'running': self.running,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'wait_ms': self.wait_ms.snapshot(),
+                'check_ms': self.check_ms.snapshot(),
+            }
+
+
+password_pool = PasswordCheckPool(settings.FEASTO_PASSWORD_WORKERS, settings.FEASTO_PASSWORD_QUEUE)
+
+
+def _username_key(username):
+    # Hashed so arbitrary usernames make valid, fixed-length cache keys
+    return f'login:failures:user:{hashlib.sha256(username.lower().encode()).hexdigest()[:32]}'
+
+
+def _failure_keys(username, ip):
+    keys = {_username_key(username): settings.FEASTO_LOGIN_FAILURES_PER_USER}
+    if ip:
+        keys[f'login:failures:ip:{ip}'] = settings.FEASTO_LOGIN_FAILURES_PER_IP
+    return keys
+
+
+def check_login_allowed(username, ip):
+    """Raise Throttled if the username or IP has used up its failed attempts"""
+    keys = _failure_keys(username, ip)
+    counts = cache.get_many(list(keys))
+    if any(counts.get(key, 0) >= limit for key, limit in keys.items()):
+        raise Throttled(wait=settings.FEASTO_LOGIN_FAILURE_WINDOW)
+
+
+def record_login_failure(username, ip):
+    for key in _failure_keys(username, ip):
+        # The window starts with the first failure and is not extended by later ones
+        cache.add(key, 0, settings.FEASTO_LOGIN_FAILURE_WINDOW)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Expired between add() and incr()
+            cache.add(key, 1, settings.FEASTO_LOGIN_FAILURE_WINDOW)
+
+
+def check_user_password(user, password):
+    """
+    Whether password is user's password, hashing on the pool.
+
+    An outdated stored hash is upgraded as User.check_password would, with
+    the save on the calling thread so pool threads never hold database
+    connections.
+    """
+    upgrade = []
+    if not password_pool.run(check_password, password, user.password, upgrade.append):
+        return False
+    if upgrade:
+        user.password = password_pool.run(make_password, password)
+        user.save(update_fields=['password'])
+    return True
+
+
+def verify_credentials(username, password):
+    """
+    The active user with these credentials, or None.
+
+    Does what ModelBackend.authenticate does, but only the hashing runs on
+    the pool. Other AUTHENTICATION_BACKENDS are not consulted (see api.W002).
+    """
+    try:
+        user = User._default_manager.get_by_natural_key(username)
+    except User.DoesNotExist:
+        # Hash anyway so an unknown username takes as long as a wrong password
+        password_pool.run(make_password, password)
+        return None
+    if not check_user_password(user, password) or not user.is_active:
+        return None
+    return user
+
+
+def _client_ip(request):
+    return request.META.get('REMOTE_ADDR') if request is not None else None
+
+
+def authenticate_login(username, password, request=None):
+    """
+    Check a login attempt against the throttle and the password; returns the user or None.
+
+    Sends user_login_failed like django.contrib.auth.authenticate; the caller
+    sends user_logged_in, which login() does for session logins.
+    """
+    ip = _client_ip(request)
+    check_login_allowed(username, ip)
+    user = verify_credentials(username, password)
+    if user is None:
+        record_login_failure(username, ip)
+        user_login_failed.send(sender=__name__, credentials={'username': username}, request=request)
+    else:
+        cache.delete(_username_key(username))
+    return user
+
+
+def confirm_password(user, password, request=None):
+    """
+    Check the current password of a signed-in user, e.g. before changing it.
+
+    Counted against the same limits as logins, so a stolen token cannot be
+    used to guess the password faster than the login form allows.
+    """
+    ip = _client_ip(request)
+    check_login_allowed(user.get_username(), ip)
+    if not check_user_password(user, password):
+        record_login_failure(user.get_username(), ip)
+        return False
+    return True
@@ -0,0 +1,28 @@
+from datetime import datetime, time
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from api.models import SalesRollup, ItemSalesRollup
+from api.rollups import backfill_sales_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the hourly sales rollups used by the analytics API from delivered orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='Only rebuild buckets on or after this date (YYYY-MM-DD)')
+
+    def handle(self, *args, **kwargs):
+        since = None
+        if kwargs['since']:
+            day = parse_date(kwargs['since'])
+            if day is None:
+                raise CommandError('--since must be a date in YYYY-MM-DD format')
+            since = timezone.make_aware(datetime.combine(day, time.min))
+
+        self.stdout.write('Rebuilding sales rollups...')
+        backfill_sales_rollups(since)
+        self.stdout.write(self.style.SUCCESS(
+            f'Sales rollups rebuilt: {SalesRollup.objects.count()} bucket rows, '
+            f'{ItemSalesRollup.objects.count()} item rows'
+        ))
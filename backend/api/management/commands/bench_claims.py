@@ -0,0 +1,108 @@
+import statistics
+import threading
+import time
+from collections import Counter
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from api.models import User, Restaurant, Order, OrderStatusEvent
+from api.orders import claim_next_order, claim_order
+from api.rollups import rebuild_status_rollup
+
+BENCH_PREFIX = 'bench-claim-'
+
+
+class Command(BaseCommand):
+    help = 'Race many rider threads for the same ready orders and check every order is claimed once'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--riders', type=int, default=50, help='Concurrent rider threads')
+        parser.add_argument('--orders', type=int, default=500, help='Ready orders to dispatch')
+        parser.add_argument('--mode', choices=['next', 'same'], default='next',
+                            help="'next' pulls from the dispatch queue, 'same' has every rider claim the same orders")
+
+    def handle(self, *args, **kwargs):
+        if connection.vendor == 'sqlite':
+            raise CommandError('SQLite serialises writers; run this against MySQL')
+
+        restaurant = Restaurant.objects.create(name=f'{BENCH_PREFIX}restaurant')
+        customer = User.objects.create_user(username=f'{BENCH_PREFIX}customer', password=None)
+        riders = [
+            User.objects.create_user(username=f'{BENCH_PREFIX}rider-{i}', password=None, role='delivery')
+            for i in range(kwargs['riders'])
+        ]
+        Order.objects.bulk_create([
+            Order(restaurant=restaurant, customer=customer, customer_name='Bench Customer',
+                  delivery_address='1 Bench St', phone_number='0000000000', payment_method='cash', total=Decimal('10.00'), status='ready')
+            for _ in range(kwargs['orders'])
+        ])
+        order_ids = list(Order.objects.filter(customer=customer).values_list('id', flat=True))
+
+        claims = []
+        latencies = []
+        lock = threading.Lock()
+        start_gate = threading.Barrier(len(riders))
+
+        def work(rider):
+            start_gate.wait()
+            try:
+                if kwargs['mode'] == 'next':
+                    while True:
+                        start = time.perf_counter()
+                        order = claim_next_order(rider)
+                        with lock:
+                            latencies.append((time.perf_counter() - start) * 1000)
+                        if order is None:
+                            break
+                        with lock:
+                            claims.append((order.pk, rider.pk))
+                else:
+                    for order_id in order_ids:
+                        start = time.perf_counter()
+                        order = claim_order(order_id, rider)
+                        with lock:
+                            latencies.append((time.perf_counter() - start) * 1000)
+                            if order is not None:
+                                claims.append((order.pk, rider.pk))
+            finally:
+                connections.close_all()
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=work, args=(rider,)) for rider in riders]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        try:
+            claimed_twice = [pk for pk, count in Counter(pk for pk, _ in claims).items() if count > 1]
+            stored = dict(Order.objects.filter(customer=customer).values_list('id', 'delivery_staff_id'))
+            mismatched = [pk for pk, rider_id in claims if stored[pk] != rider_id]
+            unclaimed = [pk for pk, rider_id in stored.items() if rider_id is None]
+
+            latencies.sort()
+            self.stdout.write(
+                f'{len(claims)} claims by {len(riders)} riders in {elapsed:.2f}s '
+                f'({len(claims) / elapsed:.0f} claims/s), p50 {statistics.median(latencies):.2f} ms, '
+                f'p99 {latencies[int(len(latencies) * 0.99)]:.2f} ms per attempt'
+            )
+            if claimed_twice or mismatched or unclaimed:
+                raise CommandError(
+                    f'{len(claimed_twice)} orders claimed twice, {len(mismatched)} lost writes, '
+                    f'{len(unclaimed)} left unclaimed'
+                )
+            self.stdout.write(self.style.SUCCESS('Every order was claimed exactly once'))
+        finally:
+            # Raw deletes: the claimed orders are removed from the rollups by the rebuild below.
+            # Claims log status events, which reference the orders and have to go first.
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'DELETE FROM {OrderStatusEvent._meta.db_table} WHERE order_id IN '
+                    f'(SELECT id FROM {Order._meta.db_table} WHERE customer_id = %s)', [customer.pk]
+                )
+                cursor.execute(f'DELETE FROM {Order._meta.db_table} WHERE customer_id = %s', [customer.pk])
+            User.objects.filter(username__startswith=BENCH_PREFIX).delete()
+            restaurant.delete()
+            # Claims moved the seeded orders between rollup rows
+            rebuild_status_rollup()
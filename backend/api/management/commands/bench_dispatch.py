@@ -0,0 +1,75 @@
+import math
+import random
+import statistics
+import time
+import numpy as np
+from django.core.management.base import BaseCommand
+from api.dispatch import distance_matrix, greedy_assignment
+from api.tracking import distance_km
+
+
+class Command(BaseCommand):
+    help = 'Time the dispatch solver on simulated orders and riders, against a pure-Python baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=1000, help='Ready orders per run')
+        parser.add_argument('--riders', type=int, default=200, help='Available riders per run')
+        parser.add_argument('--radius-km', type=float, default=8, help='City radius points are scattered over')
+        parser.add_argument('--runs', type=int, default=20, help='Timed runs')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **kwargs):
+        rng = random.Random(kwargs['seed'])
+        center = (12.9716, 77.5946)
+
+        def scatter(count):
+            # Uniform over a disc around the city centre
+            points = []
+            for _ in range(count):
+                distance = kwargs['radius_km'] * math.sqrt(rng.random())
+                bearing = rng.uniform(0, 2 * math.pi)
+                points.append((
+                    center[0] + distance * math.cos(bearing) / 111.32,
+                    center[1] + distance * math.sin(bearing) / (111.32 * math.cos(math.radians(center[0]))),
+                ))
+            return points
+
+        numpy_times, python_times, distances = [], [], []
+        for run in range(kwargs['runs']):
+            pickups, riders = scatter(kwargs['orders']), scatter(kwargs['riders'])
+
+            started = time.perf_counter()
+            pairs = greedy_assignment(distance_matrix(pickups, riders))
+            numpy_times.append((time.perf_counter() - started) * 1000)
+            distances.extend(cost for _, _, cost in pairs)
+
+            if run < 3:
+                started = time.perf_counter()
+                baseline = self.python_greedy(pickups, riders)
+                python_times.append((time.perf_counter() - started) * 1000)
+                assert np.isclose(sum(cost for _, _, cost in baseline), sum(cost for _, _, cost in pairs))
+
+        self.stdout.write(
+            f'{kwargs["orders"]} orders x {kwargs["riders"]} riders: '
+            f'{len(distances) // kwargs["runs"]} assignments per run, '
+            f'mean pickup distance {statistics.mean(distances):.2f} km'
+        )
+        self.stdout.write(
+            f'  NumPy:       median {statistics.median(numpy_times):.1f} ms, max {max(numpy_times):.1f} ms'
+        )
+        self.stdout.write(f'  pure Python: median {statistics.median(python_times):.1f} ms')
+
+    def python_greedy(self, pickups, riders):
+        pairs = sorted(
+            (distance_km(*pickup, *rider), row, col)
+            for row, pickup in enumerate(pickups)
+            for col, rider in enumerate(riders)
+        )
+        used_rows, used_cols, result = set(), set(), []
+        for cost, row, col in pairs:
+            if row in used_rows or col in used_cols:
+                continue
+            used_rows.add(row)
+            used_cols.add(col)
+            result.append((row, col, cost))
+        return result
@@ -0,0 +1,185 @@
+import random
+import statistics
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from api.models import User, Restaurant, FoodItem, Order
+
+BENCH_PREFIX = 'bench-idx-'
+
+# Indexes added for the OrderViewSet, dashboard and menu access paths
+BENCH_INDEXES = {
+    Order: [
+        'orders_status_created_idx', 'orders_staff_status_idx', 'orders_customer_created_idx',
+        'orders_rest_created_idx', 'orders_rest_status_idx',
+    ],
+    User: ['users_role_idx'],
+    FoodItem: ['food_items_avail_cat_idx'],
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed orders and compare EXPLAIN plans and timings with and without the access path indexes. '
+        'Drops and recreates indexes, so it only runs against an empty scratch database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', required=True,
+                            help='Alias of an empty, disposable database to benchmark on')
+        parser.add_argument('--orders', type=int, default=1_000_000, help='Orders to seed')
+        parser.add_argument('--restaurants', type=int, default=10, help='Restaurants the orders are spread over')
+        parser.add_argument('--runs', type=int, default=20, help='Timed runs per query')
+        parser.add_argument('--keep', action='store_true', help='Keep the seeded rows afterwards')
+
+    def handle(self, *args, **kwargs):
+        self.using = kwargs['database']
+        if self.using not in connections:
+            raise CommandError(f'Unknown database {self.using!r}')
+        self.connection = connections[self.using]
+        if any(model.objects.using(self.using).exists() for model in (Order, Restaurant, User)):
+            # MySQL DDL is not transactional; never drop indexes under live data
+            raise CommandError(f'Database {self.using!r} is not empty; run this against a scratch database')
+
+        customers, riders, restaurants = self.seed(kwargs['orders'], kwargs['restaurants'])
+        try:
+            queries = self.queries(customers[0], riders[0], restaurants[0])
+            self.stdout.write(self.style.MIGRATE_HEADING('Without access path indexes'))
+            try:
+                # Inside the try, so indexes dropped before a failure or Ctrl-C are put back
+                self.drop_indexes()
+                before = self.measure(queries, kwargs['runs'])
+            finally:
+                self.create_indexes()
+            self.stdout.write(self.style.MIGRATE_HEADING('With access path indexes'))
+            after = self.measure(queries, kwargs['runs'])
+
+            self.stdout.write(self.style.MIGRATE_HEADING('Summary (median ms)'))
+            for label in queries:
+                self.stdout.write(f'{label:>28}: {before[label]:9.2f} -> {after[label]:9.2f}')
+        finally:
+            if not kwargs['keep']:
+                self.cleanup()
+
+    def seed(self, total, restaurant_count):
+        self.stdout.write(f'Seeding {total} orders over {restaurant_count} restaurants...')
+        restaurants = [
+            Restaurant.objects.using(self.using).create(name=f'{BENCH_PREFIX}restaurant-{i}').pk
+            for i in range(restaurant_count)
+        ]
+        users = User.objects.using(self.using).bulk_create(
+            [User(username=f'{BENCH_PREFIX}customer-{i}', role='customer') for i in range(1000)]
+            + [User(username=f'{BENCH_PREFIX}rider-{i}', role='delivery') for i in range(200)],
+            batch_size=1000,
+        )
+        bench_users = User.objects.using(self.using).filter(username__startswith=BENCH_PREFIX)
+        customers = list(bench_users.filter(role='customer').values_list('id', flat=True))
+        riders = list(bench_users.filter(role='delivery').values_list('id', flat=True))
+        del users
+
+        statuses = [choice for choice, _ in Order.STATUS_CHOICES]
+        # Mostly finished orders, as in a long-running deployment
+        weights = [2, 1, 1, 1, 1, 90, 4]
+        batch = []
+        for i in range(total):
+            order_status = random.choices(statuses, weights)[0]
+            batch.append(Order(
+                restaurant_id=random.choice(restaurants),
+                customer_id=random.choice(customers),
+                customer_name='Bench Customer',
+                delivery_address='1 Bench St',
+                phone_number='0000000000',
+                payment_method=random.choice(['cash', 'card']),
+                total=Decimal(random.randint(500, 5000)) / 100,
+                status=order_status,
+                delivery_staff_id=random.choice(riders) if order_status in ('out_for_delivery', 'delivered') else None,
+            ))
+            if len(batch) == 10000:
+                Order.objects.using(self.using).bulk_create(batch)
+                batch = []
+        Order.objects.using(self.using).bulk_create(batch)
+        return customers, riders, restaurants
+
+    def queries(self, customer_id, rider_id, restaurant_id):
+        orders = Order.objects.using(self.using)
+        return {
+            # Should stay flat as restaurants are added, since only this branch's rows are read
+            'restaurant orders by status': orders.filter(
+                restaurant_id=restaurant_id, status='pending'
+            ).order_by('-created_at')[:50],
+            'restaurant order list': orders.filter(restaurant_id=restaurant_id).order_by('-created_at', '-id')[:50],
+            'orders by status': orders.filter(status='pending').order_by('-created_at')[:50],
+            'rider active orders': orders.filter(delivery_staff_id=rider_id, status='out_for_delivery'),
+            'customer order history': orders.filter(customer_id=customer_id).order_by('-created_at')[:50],
+            'customers count': User.objects.using(self.using).filter(role='customer').values('id'),
+            'available menu category': FoodItem.objects.using(self.using).filter(available=True, category='Pizza'),
+        }
+
+    def measure(self, queries, runs):
+        medians = {}
+        for label, queryset in queries.items():
+            self.stdout.write(f'-- {label}')
+            self.stdout.write(queryset.explain())
+            timings = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                list(queryset.all())
+                timings.append((time.perf_counter() - start) * 1000)
+            medians[label] = statistics.median(timings)
+            self.stdout.write(f'   median {medians[label]:.2f} ms over {runs} runs')
+        return medians
+
+    def _indexes(self):
+        for model, names in BENCH_INDEXES.items():
+            for index in model._meta.indexes:
+                if index.name in names:
+                    yield model, index
+
+    def _existing_indexes(self, model):
+        with self.connection.cursor() as cursor:
+            constraints = self.connection.introspection.get_constraints(cursor, model._meta.db_table)
+        return {name for name, info in constraints.items() if info['index']}
+
+    def drop_indexes(self):
+        with self.connection.schema_editor() as editor:
+            for model, index in self._indexes():
+                # Skip what an earlier, interrupted run already dropped
+                if index.name in self._existing_indexes(model):
+                    editor.remove_index(model, index)
+
+    def create_indexes(self):
+        with self.connection.schema_editor() as editor:
+            for model, index in self._indexes():
+                if index.name not in self._existing_indexes(model):
+                    editor.add_index(model, index)
+            self.drop_implicit_fk_indexes(editor)
+
+    def drop_implicit_fk_indexes(self, editor):
+        """
+        Drop the FK index MySQL needed while the indexes were gone.
+
+        Removing the last index led by a foreign key without db_index (such as
+        Order.restaurant) makes Django's MySQL backend add a plain index on
+        that column. The recreated indexes cover the key again, so it would
+        only skew later runs.
+        """
+        fields = set()
+        for model, index in self._indexes():
+            field = model._meta.get_field(index.fields[0].lstrip('-'))
+            if field.get_internal_type() == 'ForeignKey' and not field.db_index:
+                fields.add((model, field))
+        for model, field in fields:
+            name = editor._create_index_name(model._meta.db_table, [field.column], suffix='')
+            if name in self._existing_indexes(model):
+                editor.execute(editor._delete_index_sql(model, name))
+
+    def cleanup(self):
+        self.stdout.write('Removing seeded rows...')
+        bench_users = User.objects.using(self.using).filter(username__startswith=BENCH_PREFIX)
+        # Raw deletes skip the per-row signals; seeded orders never entered the rollups
+        with self.connection.cursor() as cursor:
+            for user_id in bench_users.filter(role='customer').values_list('id', flat=True):
+                cursor.execute(f'DELETE FROM {Order._meta.db_table} WHERE customer_id = %s', [user_id])
+        bench_users.delete()
+        Restaurant.objects.using(self.using).filter(name__startswith=BENCH_PREFIX).delete()
@@ -0,0 +1,93 @@
+import statistics
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from api.models import User, Restaurant, FoodItem, Order, OrderItem
+from api.serializers import OrderCreateSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compare round trips and latency of per-item, bulk and batch order creation'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=15, help='Line items per order')
+        parser.add_argument('--runs', type=int, default=200, help='Orders created per strategy')
+        parser.add_argument('--batch-size', type=int, default=20, help='Orders per batch request')
+
+    def handle(self, *args, **kwargs):
+        # Everything is rolled back so the benchmark leaves no rows behind
+        with transaction.atomic():
+            customer = User.objects.create_user(username='bench-order-create', password=None)
+            restaurant = Restaurant.objects.create(name='bench-order-create')
+            food_items = FoodItem.objects.bulk_create([
+                FoodItem(restaurant=restaurant, name=f'Bench item {i}', description='Benchmark',
+                         price=Decimal('9.99'), category='Bench')
+                for i in range(kwargs['items'])
+            ])
+            if not food_items[0].pk:
+                food_items = list(FoodItem.objects.filter(category='Bench', description='Benchmark'))
+
+            payload = {
+                'customer': customer.pk,
+                'customer_name': 'Bench Customer',
+                'delivery_address': '1 Bench St',
+                'phone_number': '0000000000',
+                'payment_method': 'cash',
+                'total': str(Decimal('9.99') * len(food_items)),
+                'items': [
+                    {'food_item': item.pk, 'name': item.name, 'quantity': 1, 'price': str(item.price)}
+                    for item in food_items
+                ],
+            }
+
+            self.report('per-item INSERT', self.run(kwargs['runs'], 1, lambda: self.create_per_item(payload)))
+            self.report('bulk_create', self.run(kwargs['runs'], 1, lambda: self.create_bulk(payload)))
+            batch_size = kwargs['batch_size']
+            self.report(
+                f'batch of {batch_size}',
+                self.run(max(1, kwargs['runs'] // batch_size), batch_size,
+                         lambda: self.create_batch(payload, batch_size)),
+            )
+            transaction.set_rollback(True)
+
+    def create_per_item(self, payload):
+        """The original create path: one INSERT per line item"""
+        serializer = OrderCreateSerializer(data=payload)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        items_data = data.pop('items')
+        order = Order.objects.create(**data)
+        for item_data in items_data:
+            OrderItem.objects.create(order=order, **item_data)
+
+    def create_bulk(self, payload):
+        serializer = OrderCreateSerializer(data=payload)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+    def create_batch(self, payload, batch_size):
+        serializer = OrderCreateSerializer(data=[payload] * batch_size, many=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+    def run(self, runs, orders_per_run, create):
+        timings = []
+        queries = 0
+        for _ in range(runs):
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                create()
+                timings.append((time.perf_counter() - start) * 1000)
+            queries += len(captured)
+        return timings, queries / (runs * orders_per_run)
+
+    def report(self, label, result):
+        timings, queries_per_order = result
+        timings.sort()
+        p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+        self.stdout.write(
+            f'{label:>18}: {queries_per_order:6.1f} queries/order, '
+            f'p50 {statistics.median(timings):7.2f} ms, p99 {p99:7.2f} ms per request'
+        )
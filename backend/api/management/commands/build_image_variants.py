@@ -0,0 +1,68 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from api.cache import bump_menu_version
+from api.images import variants_for_file
+from api.models import FoodItem
+
+
+class Command(BaseCommand):
+    help = 'Generate resized WebP/AVIF variants for uploaded food images that do not have them yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Worker processes decoding and encoding images')
+        parser.add_argument('--force', action='store_true', help='Rebuild variants that already exist')
+        parser.add_argument('--batch-size', type=int, default=200, help='Items written per transaction')
+
+    def handle(self, *args, **kwargs):
+        items = FoodItem.objects.exclude(image='').exclude(image__isnull=True)
+        pending = [
+            (item_id, restaurant_id, name)
+            for item_id, restaurant_id, name, variants in items.values_list(
+                'id', 'restaurant_id', 'image', 'image_variants'
+            )
+            if kwargs['force'] or variants.get('source') != name
+        ]
+        if not pending:
+            self.stdout.write(self.style.SUCCESS('All images already have variants'))
+            return
+
+        self.stdout.write(f"Building variants for {len(pending)} images with {kwargs['workers']} workers...")
+        # Workers only read files and encode images; forked database connections must not be shared
+        connections.close_all()
+        started = time.perf_counter()
+        done, failed = [], 0
+        with ProcessPoolExecutor(max_workers=kwargs['workers'], initializer=django.setup) as pool:
+            futures = {
+                pool.submit(variants_for_file, name): (item_id, restaurant_id)
+                for item_id, restaurant_id, name in pending
+            }
+            for future in as_completed(futures):
+                item_id, restaurant_id = futures[future]
+                try:
+                    done.append((item_id, restaurant_id, future.result()))
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write(f'Item {item_id}: {exc}')
+                if len(done) >= kwargs['batch_size']:
+                    self._save(done)
+                    done = []
+        self._save(done)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Variants built for {len(pending) - failed} images in {elapsed:.1f}s ({failed} failed)'
+        ))
+
+    def _save(self, results):
+        with transaction.atomic():
+            for item_id, _, variants in results:
+                # Skip items whose image was replaced while the batch was being built
+                FoodItem.objects.filter(id=item_id, image=variants['source']).update(image_variants=variants)
+        # update() skips the save signals, so drop the cached menus here
+        for restaurant_id in {restaurant_id for _, restaurant_id, _ in results}:
+            bump_menu_version(restaurant_id)
@@ -0,0 +1,34 @@
+import time
+from django.core.management.base import BaseCommand
+from api.remote_images import pending_urls, refresh_remote_images
+
+
+class Command(BaseCommand):
+    help = 'Download image_url photos that have no local copy yet and build their resized variants'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Seconds between runs; 0 runs once and exits')
+        parser.add_argument('--limit', type=int, default=500, help='Most URLs fetched per run')
+        parser.add_argument('--workers', type=int, default=8, help='Parallel downloads')
+        parser.add_argument('--retry-failed', action='store_true', help='Fetch URLs that failed before again')
+
+    def handle(self, *args, **kwargs):
+        retry_failed = kwargs['retry_failed']
+        while True:
+            started = time.perf_counter()
+            urls = pending_urls(retry_failed=retry_failed, limit=kwargs['limit'])
+            results = refresh_remote_images(urls, workers=kwargs['workers']) if urls else {}
+            for url, error in results.items():
+                if error:
+                    self.stderr.write(f'Failed: {error}')
+            elapsed = time.perf_counter() - started
+            failed = sum(1 for error in results.values() if error)
+            self.stdout.write(self.style.SUCCESS(
+                f'{len(results) - failed} images fetched, {failed} failed in {elapsed:.1f}s'
+            ))
+            if not kwargs['interval']:
+                break
+            # Failures are only retried on the first run, not on every interval
+            retry_failed = False
+            time.sleep(kwargs['interval'])
@@ -0,0 +1,123 @@
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        'Drive concurrent GET requests at a running server and report throughput and tail latency. '
+        'Run it against the same app served by WSGI (e.g. gunicorn -w 4 feasto.wsgi) and ASGI '
+        '(e.g. uvicorn --workers 4 feasto.asgi:application) to compare the two. With --login, '
+        'a second group of clients posts logins at the same time, to check that a login burst '
+        'does not slow down the rest of the API.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='+', help='URLs to request, cycled in order')
+        parser.add_argument('--concurrency', type=int, default=50, help='Concurrent clients')
+        parser.add_argument('--duration', type=float, default=30, help='Seconds to run')
+        parser.add_argument('--header', action='append', default=[],
+                            help="Extra request header, e.g. 'Cookie: sessionid=...' (repeatable)")
+        parser.add_argument('--timeout', type=float, default=10, help='Per-request timeout in seconds')
+        parser.add_argument('--login', help='Login URL to post to alongside the GET traffic, e.g. http://localhost:8000/api/auth/token/')
+        parser.add_argument('--login-concurrency', type=int, default=50, help='Concurrent login clients')
+        parser.add_argument('--login-body', default='{"username": "rider{n}", "password": "password123"}',
+                            help='JSON body of each login; {n} is replaced by a number below --login-users')
+        parser.add_argument('--login-users', type=int, default=100, help='Distinct values of {n} in --login-body')
+
+    def handle(self, *args, **kwargs):
+        headers = {}
+        for header in kwargs['header']:
+            name, sep, value = header.partition(':')
+            if not sep:
+                raise CommandError(f'Invalid header: {header}')
+            headers[name.strip()] = value.strip()
+
+        urls = kwargs['urls']
+        deadline = time.monotonic() + kwargs['duration']
+
+        def get_request(index, sent):
+            return urllib.request.Request(urls[(index + sent) % len(urls)], headers=headers)
+
+        groups = [('api', get_request, kwargs['concurrency'])]
+        if kwargs['login']:
+            login_headers = {**headers, 'Content-Type': 'application/json'}
+
+            def login_request(index, sent):
+                user = (index + sent * kwargs['login_concurrency']) % kwargs['login_users']
+                body = kwargs['login_body'].replace('{n}', str(user)).encode()
+                return urllib.request.Request(kwargs['login'], data=body, headers=login_headers, method='POST')
+
+            groups.append(('login', login_request, kwargs['login_concurrency']))
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(len(groups)) as runner:
+            futures = {
+                name: runner.submit(self._run_group, build, concurrency, deadline, kwargs['timeout'])
+                for name, build, concurrency in groups
+            }
+            results = {name: future.result() for name, future in futures.items()}
+        elapsed = time.monotonic() - started
+
+        for name, _, concurrency in groups:
+            latencies, errors = results[name]
+            if len(groups) > 1:
+                self.stdout.write(f'[{name}]')
+            self._report(latencies, errors, elapsed, concurrency)
+
+    def _run_group(self, build_request, concurrency, deadline, timeout):
+        """Run concurrency clients until deadline; returns (sorted latencies in ms, {error: count})"""
+        lock = threading.Lock()
+        latencies = []
+        errors = {}
+
+        def client(index):
+            sent = 0
+            while time.monotonic() < deadline:
+                request = build_request(index, sent)
+                sent += 1
+                start = time.perf_counter()
+                retry_after = None
+                try:
+                    with urllib.request.urlopen(request, timeout=timeout) as response:
+                        response.read()
+                    error = None
+                except urllib.error.HTTPError as exc:
+                    error = f'HTTP {exc.code}' if exc.code != 304 else None
+                    retry_after = exc.headers.get('Retry-After')
+                except OSError as exc:
+                    error = type(exc).__name__
+                elapsed = (time.perf_counter() - start) * 1000
+                with lock:
+                    if error:
+                        errors[error] = errors.get(error, 0) + 1
+                    else:
+                        latencies.append(elapsed)
+                if retry_after and retry_after.isdigit():
+                    # Back off like a real client instead of hammering a throttled endpoint
+                    time.sleep(max(0, min(int(retry_after), deadline - time.monotonic())))
+
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(client, range(concurrency)))
+        latencies.sort()
+        return latencies, errors
+
+    def _report(self, latencies, errors, elapsed, concurrency):
+        if not latencies:
+            raise CommandError(f'No successful requests; errors: {errors}')
+
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))]
+
+        self.stdout.write(f'{len(latencies)} requests in {elapsed:.1f}s with {concurrency} clients')
+        self.stdout.write(f'  throughput: {len(latencies) / elapsed:.1f} req/s')
+        self.stdout.write(
+            f'  latency ms: p50 {statistics.median(latencies):.1f}, p95 {percentile(0.95):.1f}, '
+            f'p99 {percentile(0.99):.1f}, max {latencies[-1]:.1f}'
+        )
+        if errors:
+            self.stdout.write(self.style.WARNING(f'  errors: {errors}'))
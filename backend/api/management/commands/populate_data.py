@@ -1,14 +1,24 @@
 from django.core.management.base import BaseCommand
-from api.models import User, FoodItem, Order, OrderItem
+from django.db import transaction
+from api.models import User, Restaurant, FoodItem, Order, OrderItem
 from decimal import Decimal
 
 
 class Command(BaseCommand):
     help = 'Populate database with sample data for testing'
 
+    # One transaction, so the sales rollups see each delivered order's items when it commits
+    @transaction.atomic
     def handle(self, *args, **kwargs):
         self.stdout.write('Creating sample data...')
 
+        restaurant = Restaurant.objects.create(
+            name='Feasto',
+            address='1 Feasto Street',
+            phone='1234567890'
+        )
+        self.stdout.write(self.style.SUCCESS(f'Created restaurant: {restaurant.name}'))
+
         # Create users
         admin_user = User.objects.create_superuser(
             username='admin',
@@ -108,12 +118,13 @@ class Command(BaseCommand):
 
         food_items = []
         for item_data in food_items_data:
-            food_item = FoodItem.objects.create(**item_data)
+            food_item = FoodItem.objects.create(restaurant=restaurant, **item_data)
             food_items.append(food_item)
             self.stdout.write(self.style.SUCCESS(f'Created food item: {food_item.name}'))
 
         # Create sample orders
         order1 = Order.objects.create(
+            restaurant=restaurant,
             customer=customer_user,
             customer_name=customer_user.get_full_name(),
             delivery_address='456 Customer Ave',
@@ -139,6 +150,7 @@ class Command(BaseCommand):
         self.stdout.write(self.style.SUCCESS(f'Created order: Order #{order1.id}'))
 
         order2 = Order.objects.create(
+            restaurant=restaurant,
             customer=customer_user,
             customer_name=customer_user.get_full_name(),
             delivery_address='456 Customer Ave',
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from api.eta import rebuild_delivery_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-zone, per-hour prep and travel time statistics used for delivery ETAs'
+
+    def handle(self, *args, **kwargs):
+        rows = rebuild_delivery_stats()
+        self.stdout.write(self.style.SUCCESS(f'Delivery time statistics rebuilt ({rows} zone/hour rows)'))
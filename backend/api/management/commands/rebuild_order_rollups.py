@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from api.models import OrderStatusRollup
+from api.rollups import rebuild_status_rollup
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-status order rollup used by the admin dashboard'
+
+    def handle(self, *args, **kwargs):
+        rebuild_status_rollup()
+        for row in OrderStatusRollup.objects.order_by('status'):
+            self.stdout.write(f'{row.status}: {row.order_count} orders, {row.revenue} revenue')
+        self.stdout.write(self.style.SUCCESS('Order rollups rebuilt'))
@@ -0,0 +1,30 @@
+import time
+from django.core.management.base import BaseCommand
+from api.dispatch import dispatch_ready_orders
+
+
+class Command(BaseCommand):
+    help = 'Assign ready, unassigned orders to the nearest available riders, once or on an interval'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Seconds between runs; 0 runs once and exits')
+        parser.add_argument('--limit', type=int, default=1000, help='Most orders dispatched per run')
+
+    def handle(self, *args, **kwargs):
+        while True:
+            started = time.perf_counter()
+            assignments = dispatch_ready_orders(limit=kwargs['limit'])
+            elapsed = (time.perf_counter() - started) * 1000
+            if assignments is None:
+                self.stdout.write('Another dispatch run is in progress')
+            else:
+                for assignment in assignments:
+                    self.stdout.write(
+                        f'Order #{assignment.order_id} -> rider {assignment.rider_id} '
+                        f'({assignment.distance_km:.2f} km)'
+                    )
+                self.stdout.write(self.style.SUCCESS(f'{len(assignments)} orders dispatched in {elapsed:.0f} ms'))
+            if not kwargs['interval']:
+                break
+            time.sleep(kwargs['interval'])
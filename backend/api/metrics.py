@@ -0,0 +1,169 @@
+"""
+In-process request metrics collected by RequestMetricsMiddleware.
+
+Each endpoint (resolved view name) gets histograms for latency, SQL time,
+non-database time, serialization time, query count and response size.
+Values live in process memory, so each worker reports its own numbers.
+
+Serialization time is the time serializers spend in to_representation (see
+api.serializers.TimedSerializerMixin) plus the time spent rendering the
+response body; it is part of app_ms.
+"""
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from rest_framework.renderers import BaseRenderer
+
+METRICS = {
+    'duration_ms': (
+        'Total request time in milliseconds',
+        (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000),
+    ),
+    'sql_ms': (
+        'Time spent in SQL queries in milliseconds',
+        (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500),
+    ),
+    'app_ms': (
+        'Request time not spent in SQL (view code, serializers, rendering, middleware) in milliseconds',
+        (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500),
+    ),
+    'serialize_ms': (
+        'Time spent in serializers and rendering the response body in milliseconds',
+        (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500),
+    ),
+    'queries': (
+        'SQL queries per request',
+        (0, 1, 2, 3, 5, 10, 20, 50, 100, 200),
+    ),
+    'response_bytes': (
+        'Response body size in bytes',
+        (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304),
+    ),
+}
+
+# Gauges and counters of the login password check pool (api.logins)
+PASSWORD_CHECK_METRICS = (
+    ('queued', 'gauge', 'Password checks waiting for a worker'),
+    ('running', 'gauge', 'Password checks being hashed'),
+    ('completed', 'counter', 'Password checks finished'),
+    ('rejected', 'counter', 'Logins turned away because the queue was full'),
+    ('wait_ms', 'histogram', 'Time a password check waited for a worker in milliseconds'),
+    ('check_ms', 'histogram', 'Time spent hashing a password in milliseconds'),
+)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self):
+        cumulative = []
+        running = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            running += count
+            cumulative.append((bound, running))
+        return {'count': self.count, 'sum': round(self.sum, 3), 'buckets': cumulative}
+
+
+class SerializationTimer:
+    """Adds up the serialization time of one request; nested measurements count once"""
+
+    def __init__(self):
+        self.seconds = 0.0
+        self._depth = 0
+
+    def start(self):
+        self._depth += 1
+        return time.perf_counter() if self._depth == 1 else None
+
+    def stop(self, started):
+        self._depth -= 1
+        if started is not None:
+            self.seconds += time.perf_counter() - started
+
+
+# Timer of the request being handled, set by RequestMetricsMiddleware
+serialization_timer = contextvars.ContextVar('serialization_timer', default=None)
+
+
+class MetricsRegistry:
+    """Thread-safe collection of per-endpoint histograms"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = defaultdict(
+            lambda: {name: Histogram(buckets) for name, (_, buckets) in METRICS.items()}
+        )
+
+    def record(self, view, **values):
+        with self._lock:
+            histograms = self._endpoints[view]
+            for name, value in values.items():
+                histograms[name].observe(value)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                view: {name: histogram.snapshot() for name, histogram in histograms.items()}
+                for view, histograms in sorted(self._endpoints.items())
+            }
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+
+
+registry = MetricsRegistry()
+
+
+class PrometheusRenderer(BaseRenderer):
+    """Render a registry snapshot in the Prometheus text exposition format"""
+    media_type = 'text/plain'
+    format = 'prometheus'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not isinstance(data, dict) or 'endpoints' not in data:
+            return str(data)
+
+        lines = []
+        for name, (help_text, _) in METRICS.items():
+            metric = f'feasto_request_{name}'
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} histogram')
+            for view, histograms in data['endpoints'].items():
+                histogram = histograms[name]
+                for bound, count in histogram['buckets']:
+                    lines.append(f'{metric}_bucket{{view="{view}",le="{bound}"}} {count}')
+                lines.append(f'{metric}_sum{{view="{view}"}} {histogram["sum"]}')
+                lines.append(f'{metric}_count{{view="{view}"}} {histogram["count"]}')
+        if 'password_checks' in data:
+            lines.extend(self._password_checks(data['password_checks']))
+        return '\n'.join(lines) + '\n'
+
+    def _password_checks(self, pool):
+        lines = []
+        for name, kind, help_text in PASSWORD_CHECK_METRICS:
+            metric = f'feasto_password_checks_{name}'
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} {kind}')
+            if kind == 'histogram':
+                for bound, count in pool[name]['buckets']:
+                    lines.append(f'{metric}_bucket{{le="{bound}"}} {count}')
+                lines.append(f'{metric}_sum {pool[name]["sum"]}')
+                lines.append(f'{metric}_count {pool[name]["count"]}')
+            else:
+                lines.append(f'{metric} {pool[name]}')
+        return lines
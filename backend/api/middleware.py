@@ -0,0 +1,83 @@
+import time
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from .metrics import SerializationTimer, registry, serialization_timer
+
+
+class QueryStats:
+    """Database execute wrapper that counts queries and their total time"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+def resolve_view_name(request):
+    """Name the view that handled a request, e.g. 'OrderViewSet.list' or 'dashboard_stats'"""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return '<unresolved>'
+    func = match.func
+    cls = getattr(func, 'cls', None)
+    actions = getattr(func, 'actions', None)
+    if cls is not None and actions:
+        action = actions.get(request.method.lower(), request.method.lower())
+        return f'{cls.__name__}.{action}'
+    if cls is not None:
+        return cls.__name__
+    return getattr(func, '__name__', match.view_name)
+
+
+class RequestMetricsMiddleware:
+    """
+    Record query count, SQL time, non-database time, serialization time and
+    response size per endpoint.
+
+    Enabled with settings.FEASTO_METRICS_ENABLED; results are exposed at /api/metrics/.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'FEASTO_METRICS_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = QueryStats()
+        timer = SerializationTimer()
+        token = serialization_timer.set(timer)
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(stats):
+                response = self.get_response(request)
+        finally:
+            serialization_timer.reset(token)
+        duration = time.perf_counter() - start
+
+        size = len(response.content) if not response.streaming else 0
+        registry.record(
+            resolve_view_name(request),
+            duration_ms=duration * 1000,
+            sql_ms=stats.duration * 1000,
+            app_ms=max(duration - stats.duration, 0) * 1000,
+            serialize_ms=timer.seconds * 1000,
+            queries=stats.count,
+            response_bytes=size,
+        )
+        return response
+
+    def process_template_response(self, request, response):
+        # Called just before the response is rendered; DRF responses render their body here
+        timer = serialization_timer.get()
+        if timer is not None:
+            started = timer.start()
+            response.add_post_render_callback(lambda rendered: timer.stop(started))
+        return response
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-17 10:00
+
+from django.db import migrations, models
+
+
+def backfill_status_rollup(apps, schema_editor):
+    Order = apps.get_model('api', 'Order')
+    OrderStatusRollup = apps.get_model('api', 'OrderStatusRollup')
+    totals = Order.objects.order_by().values('status').annotate(
+        order_count=models.Count('id'), revenue=models.Sum('total')
+    )
+    OrderStatusRollup.objects.bulk_create([
+        OrderStatusRollup(status=row['status'], order_count=row['order_count'], revenue=row['revenue'])
+        for row in totals
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_alter_customerenquiry_subject'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderStatusRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('confirmed', 'Confirmed'), ('preparing', 'Preparing'), ('ready', 'Ready for Delivery'), ('out_for_delivery', 'Out for Delivery'), ('delivered', 'Delivered'), ('cancelled', 'Cancelled')], max_length=20, unique=True)),
+                ('order_count', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'db_table': 'order_status_rollups',
+            },
+        ),
+        migrations.RunPython(backfill_status_rollup, migrations.RunPython.noop),
+    ]
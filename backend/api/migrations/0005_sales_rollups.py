@@ -0,0 +1,47 @@
+# Generated by Django 4.2.7 on 2026-10-17 10:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_orderstatusrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('payment_method', models.CharField(choices=[('cash', 'Cash on Delivery'), ('card', 'Credit/Debit Card')], max_length=20)),
+                ('category', models.CharField(blank=True, default='', max_length=50)),
+                ('order_count', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'db_table': 'sales_rollups',
+                'indexes': [models.Index(fields=['category', 'hour'], name='sales_rollup_category_hour')],
+                'unique_together': {('hour', 'payment_method', 'category')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ItemSalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('payment_method', models.CharField(choices=[('cash', 'Cash on Delivery'), ('card', 'Credit/Debit Card')], max_length=20)),
+                ('category', models.CharField(max_length=50)),
+                ('quantity', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('food_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_rollups', to='api.fooditem')),
+            ],
+            options={
+                'db_table': 'item_sales_rollups',
+                'indexes': [models.Index(fields=['category', 'hour'], name='item_rollup_category_hour')],
+                'unique_together': {('hour', 'payment_method', 'food_item')},
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-17 10:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customerenquiry',
+            index=models.Index(fields=['created_at', 'id'], name='enquiries_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fooditem',
+            index=models.Index(fields=['created_at', 'id'], name='food_items_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['created_at', 'id'], name='orders_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['created_at', 'id'], name='users_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-17 10:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_created_at_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='fooditem',
+            index=models.Index(fields=['available', 'category'], name='food_items_avail_cat_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'created_at'], name='orders_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['delivery_staff', 'status'], name='orders_staff_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['customer', 'created_at'], name='orders_customer_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['role'], name='users_role_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-17 10:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_access_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['delivery_staff', 'updated_at'], name='orders_staff_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'updated_at'], name='orders_status_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-17 10:15
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_orderstatusevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RiderLocation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('recorded_at', models.DateTimeField()),
+                ('rider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='locations', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'rider_locations',
+                'indexes': [models.Index(fields=['rider', 'recorded_at'], name='rider_locations_rider_idx'), models.Index(fields=['recorded_at'], name='rider_locations_time_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-17 10:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_riderlocation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='delivery_latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='delivery_longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='DeliveryTimeStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('zone', models.CharField(blank=True, default='', max_length=20)),
+                ('hour', models.PositiveSmallIntegerField()),
+                ('prep_count', models.IntegerField(default=0)),
+                ('prep_seconds', models.FloatField(default=0)),
+                ('travel_count', models.IntegerField(default=0)),
+                ('travel_seconds', models.FloatField(default=0)),
+            ],
+            options={
+                'db_table': 'delivery_time_stats',
+                'unique_together': {('zone', 'hour')},
+            },
+        ),
+    ]
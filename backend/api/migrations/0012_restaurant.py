@@ -0,0 +1,86 @@
+# Generated by Django 4.2.7 on 2026-10-17 10:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def assign_default_restaurant(apps, schema_editor):
+    # Existing menu items and orders all belong to the original single kitchen
+    Restaurant = apps.get_model('api', 'Restaurant')
+    FoodItem = apps.get_model('api', 'FoodItem')
+    Order = apps.get_model('api', 'Order')
+    if not FoodItem.objects.exists() and not Order.objects.exists():
+        return
+    restaurant = Restaurant.objects.create(name='Feasto')
+    FoodItem.objects.update(restaurant=restaurant)
+    Order.objects.update(restaurant=restaurant)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_delivery_time_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Restaurant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('address', models.TextField(blank=True, default='')),
+                ('phone', models.CharField(blank=True, max_length=15, null=True)),
+                ('latitude', models.FloatField(blank=True, null=True)),
+                ('longitude', models.FloatField(blank=True, null=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'restaurants',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='fooditem',
+            name='restaurant',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='food_items', to='api.restaurant'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='restaurant',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='orders', to='api.restaurant'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='restaurant',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='staff', to='api.restaurant'),
+        ),
+        migrations.RunPython(assign_default_restaurant, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='fooditem',
+            name='restaurant',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='food_items', to='api.restaurant'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='restaurant',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='orders', to='api.restaurant'),
+        ),
+        migrations.AddIndex(
+            model_name='fooditem',
+            index=models.Index(fields=['restaurant', 'available', 'category'], name='food_items_rest_avail_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fooditem',
+            index=models.Index(fields=['restaurant', 'created_at', 'id'], name='food_items_rest_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['restaurant', 'created_at', 'id'], name='orders_rest_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['restaurant', 'status', 'created_at'], name='orders_rest_status_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-17 10:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_restaurant'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fooditem',
+            name='stock',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='fooditem',
+            index=models.Index(fields=['stock'], name='food_items_stock_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fooditem',
+            index=models.Index(fields=['restaurant', 'stock'], name='food_items_rest_stock_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 10:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_fooditem_stock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fooditem',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
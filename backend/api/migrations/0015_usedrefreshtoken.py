@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-17 11:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_fooditem_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UsedRefreshToken',
+            fields=[
+                ('jti', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'db_table': 'used_refresh_tokens',
+            },
+        ),
+    ]
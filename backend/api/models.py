@@ -13,6 +13,14 @@ class User(AbstractUser):
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='customer')
     phone = models.CharField(max_length=15, blank=True, null=True)
     address = models.TextField(blank=True, null=True)
+    # Admins and delivery staff of one restaurant; empty means every restaurant
+    restaurant = models.ForeignKey(
+        'Restaurant',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='staff'
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -21,18 +29,50 @@ class User(AbstractUser):
 
     class Meta:
         db_table = 'users'
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='users_created_id_idx'),
+            models.Index(fields=['role'], name='users_role_idx'),
+        ]
+
+
+# Restaurant Model
+class Restaurant(models.Model):
+    """A kitchen or branch with its own menu, orders and staff"""
+    name = models.CharField(max_length=200)
+    address = models.TextField(blank=True, default='')
+    phone = models.CharField(max_length=15, blank=True, null=True)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        db_table = 'restaurants'
+        ordering = ['name']
 
 
 # Food Item Model
 class FoodItem(models.Model):
     """Model for food items in the menu"""
+    # Indexed through the composite indexes below, which all lead with it
+    restaurant = models.ForeignKey(
+        Restaurant, on_delete=models.PROTECT, related_name='food_items', db_index=False
+    )
     name = models.CharField(max_length=200)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     category = models.CharField(max_length=50)
     image = models.ImageField(upload_to='food_images/', blank=True, null=True)
     image_url = models.URLField(max_length=500, blank=True, null=True)  # For external image URLs
+    # Resized WebP/AVIF copies of image, maintained by api.images
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     available = models.BooleanField(default=True)
+    # Portions left; NULL means stock is not tracked for this item
+    stock = models.PositiveIntegerField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -50,6 +90,16 @@ class FoodItem(models.Model):
     class Meta:
         db_table = 'food_items'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='food_items_created_id_idx'),
+            models.Index(fields=['available', 'category'], name='food_items_avail_cat_idx'),
+            # Per-restaurant menus, so their cost does not grow with other branches' items
+            models.Index(fields=['restaurant', 'available', 'category'], name='food_items_rest_avail_idx'),
+            models.Index(fields=['restaurant', 'created_at', 'id'], name='food_items_rest_created_idx'),
+            # Low-stock reports read a range of these, never the whole table
+            models.Index(fields=['stock'], name='food_items_stock_idx'),
+            models.Index(fields=['restaurant', 'stock'], name='food_items_rest_stock_idx'),
+        ]
 
 
 # Order Model
@@ -70,9 +120,25 @@ class Order(models.Model):
         ('card', 'Credit/Debit Card'),
     ]
 
+    # Allowed next statuses for each status; delivered and cancelled are final
+    STATUS_TRANSITIONS = {
+        'pending': ('confirmed', 'cancelled'),
+        'confirmed': ('preparing', 'cancelled'),
+        'preparing': ('ready', 'cancelled'),
+        'ready': ('out_for_delivery', 'cancelled'),
+        'out_for_delivery': ('delivered',),
+        'delivered': (),
+        'cancelled': (),
+    }
+
+    restaurant = models.ForeignKey(
+        Restaurant, on_delete=models.PROTECT, related_name='orders', db_index=False
+    )
     customer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='orders')
     customer_name = models.CharField(max_length=200)
     delivery_address = models.TextField()
+    delivery_latitude = models.FloatField(null=True, blank=True)
+    delivery_longitude = models.FloatField(null=True, blank=True)
     phone_number = models.CharField(max_length=15)
     special_instructions = models.TextField(blank=True, null=True)
     payment_method = models.CharField(max_length=20, choices=PAYMENT_METHOD_CHOICES)
@@ -93,9 +159,27 @@ class Order(models.Model):
     def __str__(self):
         return f"Order #{self.id} - {self.customer_name}"
 
+    def can_transition_to(self, new_status):
+        return new_status in self.STATUS_TRANSITIONS.get(self.status, ())
+
     class Meta:
         db_table = 'orders'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='orders_created_id_idx'),
+            # Admin status filter and dashboard status lookups, newest first
+            models.Index(fields=['status', 'created_at'], name='orders_status_created_idx'),
+            # Delivery staff work lists: their orders in a given status
+            models.Index(fields=['delivery_staff', 'status'], name='orders_staff_status_idx'),
+            # Customer order history, newest first
+            models.Index(fields=['customer', 'created_at'], name='orders_customer_created_idx'),
+            # Delivery work queue polls for orders changed since a watermark
+            models.Index(fields=['delivery_staff', 'updated_at'], name='orders_staff_updated_idx'),
+            models.Index(fields=['status', 'updated_at'], name='orders_status_updated_idx'),
+            # Restaurant-scoped order lists and status filters
+            models.Index(fields=['restaurant', 'created_at', 'id'], name='orders_rest_created_idx'),
+            models.Index(fields=['restaurant', 'status', 'created_at'], name='orders_rest_status_idx'),
+        ]
 
 
 # Order Item Model
@@ -118,6 +202,133 @@ class OrderItem(models.Model):
         db_table = 'order_items'
 
 
+# Order Status Event Model
+class OrderStatusEvent(models.Model):
+    """Append-only log of order status changes"""
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='status_events')
+    from_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    to_status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    actor = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='order_status_events'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Order #{self.order_id}: {self.from_status} -> {self.to_status}"
+
+    class Meta:
+        db_table = 'order_status_events'
+        ordering = ['created_at', 'id']
+        indexes = [
+            models.Index(fields=['order', 'created_at'], name='status_events_order_idx'),
+            models.Index(fields=['to_status', 'created_at'], name='status_events_status_idx'),
+        ]
+
+
+# Order Status Rollup Model
+class OrderStatusRollup(models.Model):
+    """Running order count and revenue per status, kept current on status changes"""
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES, unique=True)
+    order_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.status}: {self.order_count} orders"
+
+    class Meta:
+        db_table = 'order_status_rollups'
+
+
+# Sales Rollup Models
+class SalesRollup(models.Model):
+    """Hourly delivered-order totals per payment method and category ('' = all categories)"""
+    hour = models.DateTimeField()
+    payment_method = models.CharField(max_length=20, choices=Order.PAYMENT_METHOD_CHOICES)
+    category = models.CharField(max_length=50, blank=True, default='')
+    order_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.hour:%Y-%m-%d %H:00} {self.payment_method} {self.category or 'all'}"
+
+    class Meta:
+        db_table = 'sales_rollups'
+        unique_together = [('hour', 'payment_method', 'category')]
+        indexes = [models.Index(fields=['category', 'hour'], name='sales_rollup_category_hour')]
+
+
+class ItemSalesRollup(models.Model):
+    """Hourly delivered quantity and revenue per food item and payment method"""
+    hour = models.DateTimeField()
+    payment_method = models.CharField(max_length=20, choices=Order.PAYMENT_METHOD_CHOICES)
+    food_item = models.ForeignKey(FoodItem, on_delete=models.CASCADE, related_name='sales_rollups')
+    category = models.CharField(max_length=50)
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.hour:%Y-%m-%d %H:00} {self.food_item_id} x{self.quantity}"
+
+    class Meta:
+        db_table = 'item_sales_rollups'
+        unique_together = [('hour', 'payment_method', 'food_item')]
+        indexes = [models.Index(fields=['category', 'hour'], name='item_rollup_category_hour')]
+
+
+# Delivery Time Statistics Model
+class DeliveryTimeStat(models.Model):
+    """Running prep and travel time totals per delivery zone ('' = all zones) and hour of day"""
+    zone = models.CharField(max_length=20, blank=True, default='')
+    hour = models.PositiveSmallIntegerField()
+    prep_count = models.IntegerField(default=0)
+    prep_seconds = models.FloatField(default=0)
+    travel_count = models.IntegerField(default=0)
+    travel_seconds = models.FloatField(default=0)
+
+    def __str__(self):
+        return f"{self.zone or 'all'} {self.hour:02d}:00"
+
+    class Meta:
+        db_table = 'delivery_time_stats'
+        unique_together = [('zone', 'hour')]
+
+
+# Rider Location Model
+class RiderLocation(models.Model):
+    """GPS ping from a delivery rider, written in batches by the live tracker"""
+    rider = models.ForeignKey(User, on_delete=models.CASCADE, related_name='locations')
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    recorded_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.rider_id} @ {self.latitude:.5f},{self.longitude:.5f}"
+
+    class Meta:
+        db_table = 'rider_locations'
+        indexes = [
+            models.Index(fields=['rider', 'recorded_at'], name='rider_locations_rider_idx'),
+            models.Index(fields=['recorded_at'], name='rider_locations_time_idx'),
+        ]
+
+
+# Used Refresh Token Model
+class UsedRefreshToken(models.Model):
+    """JWT id of a refresh token that was traded in or revoked; rows are pruned once it expires"""
+    jti = models.CharField(max_length=32, primary_key=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.jti
+
+    class Meta:
+        db_table = 'used_refresh_tokens'
+
+
 # Customer Enquiry Model
 class CustomerEnquiry(models.Model):
     """Model for customer enquiries/feedback"""
@@ -145,3 +356,6 @@ class CustomerEnquiry(models.Model):
         db_table = 'customer_enquiries'
         ordering = ['-created_at']
         verbose_name_plural = 'Customer Enquiries'
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='enquiries_created_id_idx'),
+        ]
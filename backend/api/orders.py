@@ -0,0 +1,104 @@
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .events import get_broker, order_event
+from .models import Order, OrderStatusEvent
+from .rollups import record_order_change
+
+
+class InvalidTransition(Exception):
+    """Raised when an order cannot move from its current status to the requested one"""
+
+
+def _apply_transition(order_id, old_status, new_status, actor=None, filters=None, **changes):
+    """
+    Move an order from old_status to new_status with a conditional UPDATE.
+
+    The UPDATE only matches while the order is still in old_status (and any
+    extra filters hold), so concurrent writers cannot both succeed. The status
+    event and rollups are written in the same transaction. Returns the updated
+    order, or None if the order had already changed.
+    """
+    now = timezone.now()
+    values = {'status': new_status, 'updated_at': now, **changes}
+    if new_status == 'delivered':
+        values['delivered_at'] = now
+
+    with transaction.atomic():
+        updated = Order.objects.filter(pk=order_id, status=old_status, **(filters or {})).update(**values)
+        if not updated:
+            return None
+        order = Order.objects.select_related('customer', 'delivery_staff').get(pk=order_id)
+        OrderStatusEvent.objects.create(order=order, from_status=old_status, to_status=new_status, actor=actor)
+        # update() bypasses the save signals that maintain the rollups
+        record_order_change(order, old_status, order.total, new_status, order.total)
+        publish_order_change(order, old_status)
+    return order
+
+
+def publish_order_change(order, previous_status):
+    """Push an order event to subscribed clients once the transaction commits"""
+    event = order_event(order, previous_status)
+    transaction.on_commit(lambda: get_broker().publish(event))
+    if order.status == 'ready' and settings.FEASTO_AUTO_DISPATCH:
+        transaction.on_commit(_schedule_dispatch)
+
+
+def _schedule_dispatch():
+    # Imported here because the dispatcher assigns orders through this module
+    from .dispatch import schedule_dispatch
+    schedule_dispatch()
+
+
+def transition_order(order, new_status, actor=None, **changes):
+    """Move order to new_status if the transition table allows it and nobody changed it first"""
+    if not order.can_transition_to(new_status):
+        raise InvalidTransition(f'Cannot change status from {order.status} to {new_status}')
+    return _apply_transition(order.pk, order.status, new_status, actor, **changes)
+
+
+def assign_order(order, staff, actor=None):
+    """Hand a ready order to staff, or reassign one that is already out for delivery"""
+    if order.status == 'out_for_delivery':
+        return _apply_transition(order.pk, order.status, order.status, actor, delivery_staff=staff)
+    return transition_order(order, 'out_for_delivery', actor, delivery_staff=staff)
+
+
+def claimable_filters(rider):
+    """Filters matching the unassigned orders rider may take once they are ready"""
+    filters = {'delivery_staff__isnull': True}
+    if rider.restaurant_id:
+        filters['restaurant_id'] = rider.restaurant_id
+    return filters
+
+
+def claim_order(order_id, rider):
+    """
+    Assign a ready, unassigned order of the rider's restaurant to rider.
+
+    The conditional UPDATE only matches while the order is still unclaimed, so
+    when riders race for the same order exactly one wins. Returns the claimed
+    order, or None if it was no longer available.
+    """
+    return _apply_transition(
+        order_id, 'ready', 'out_for_delivery', rider,
+        filters=claimable_filters(rider), delivery_staff=rider,
+    )
+
+
+def claim_next_order(rider):
+    """
+    Take the oldest claimable order off the dispatch queue for rider.
+
+    Ready, unassigned orders form the queue. Rows locked by other riders'
+    claims are skipped rather than waited on, so concurrent riders each get a
+    different order without queueing behind one another. Returns None when the
+    queue is empty.
+    """
+    with transaction.atomic():
+        order_id = Order.objects.select_for_update(skip_locked=True).filter(
+            status='ready', **claimable_filters(rider)
+        ).order_by('created_at').values_list('id', flat=True).first()
+        if order_id is None:
+            return None
+        return claim_order(order_id, rider)
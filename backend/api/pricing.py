@@ -0,0 +1,49 @@
+import threading
+import time
+from collections import namedtuple
+from .cache import get_menu_version
+from .models import FoodItem
+
+PriceEntry = namedtuple('PriceEntry', ['id', 'name', 'price', 'category', 'available', 'restaurant_id'])
+
+
+class PriceIndex:
+    """In-process cache of menu prices and availability keyed by food item id"""
+    fields = ('id', 'name', 'price', 'category', 'available', 'restaurant_id')
+
+    def __init__(self, ttl=60):
+        # The menu version catches writes from other processes sharing the cache;
+        # the TTL bounds staleness when the cache is process-local
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # {id: (PriceEntry, fetched_at)}; only items that have been ordered are held
+        self._entries = {}
+        self._version = None
+
+    def invalidate(self):
+        with self._lock:
+            self._entries = {}
+
+    def lookup(self, ids):
+        """Return {id: PriceEntry} for the given ids, querying only those not cached"""
+        version = get_menu_version()[0]
+        now = time.monotonic()
+        with self._lock:
+            if version != self._version:
+                self._entries = {}
+                self._version = version
+            cached = {pk: self._entries.get(pk) for pk in ids}
+        found = {pk: cached[pk][0] for pk in ids if cached[pk] is not None and now - cached[pk][1] <= self.ttl}
+
+        missing = set(ids) - found.keys()
+        if missing:
+            rows = {row[0]: PriceEntry(*row) for row in FoodItem.objects.filter(id__in=missing).values_list(*self.fields)}
+            with self._lock:
+                # Keep the rows only if the menu did not change while they were read
+                if version == self._version:
+                    self._entries.update((pk, (entry, now)) for pk, entry in rows.items())
+            found.update(rows)
+        return found
+
+
+price_index = PriceIndex()
@@ -0,0 +1,191 @@
+"""
+Local copies of menu images hosted elsewhere.
+
+Items with an image_url are served from the remote host until the image has
+been downloaded once. After that the original and its resized variants
+(see api.images) are served from our own domain under content-hashed names,
+with far-future cache headers. An item is fetched again only when its
+image_url changes; failed downloads are marked and retried by
+`manage.py fetch_remote_images --retry-failed`.
+
+Downloads happen outside the request cycle: `manage.py fetch_remote_images`
+(once or on an interval) and, with settings.FEASTO_FETCH_REMOTE_IMAGES, a
+background thread started when an item's image_url changes.
+
+Anyone who can edit a menu item chooses the URL, so downloads only connect
+to public addresses. Every connection, including each redirect, resolves the
+host and refuses loopback, private, link-local and other non-global
+addresses before anything is sent. Environment proxies are not used, since
+the check applies to the address actually connected to.
+"""
+import ipaddress
+import logging
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection, HTTPSConnection
+from urllib.error import URLError
+from urllib.parse import urlsplit
+from urllib.request import (
+    HTTPDefaultErrorHandler, HTTPErrorProcessor, HTTPHandler, HTTPRedirectHandler, HTTPSHandler,
+    OpenerDirector, Request, UnknownHandler,
+)
+from django.conf import settings
+from django.db import connection, transaction
+from PIL import Image
+from .cache import bump_menu_version
+from .images import build_variants, store_original
+from .models import FoodItem
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = 'Feasto image fetcher'
+
+_background = ThreadPoolExecutor(max_workers=2, thread_name_prefix='remote-images')
+
+
+class FetchError(Exception):
+    """Raised when a remote image cannot be downloaded or decoded"""
+
+
+def is_public_address(ip):
+    """Whether ip is routable on the public internet"""
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+def _create_public_connection(address, timeout, source_address=None):
+    """socket.create_connection that refuses hosts resolving to any non-public address"""
+    host, port = address
+    try:
+        resolved = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except socket.gaierror as exc:
+        raise FetchError(f'Cannot resolve {host}: {exc}') from exc
+    for *_, sockaddr in resolved:
+        if not is_public_address(ipaddress.ip_address(sockaddr[0])):
+            raise FetchError(f'{host} resolves to non-public address {sockaddr[0]}')
+    # Connect to the address that was checked, not to a fresh lookup of the name
+    return socket.create_connection((resolved[0][4][0], port), timeout, source_address)
+
+
+class _PublicHTTPConnection(HTTPConnection):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _create_public_connection
+
+
+class _PublicHTTPSConnection(HTTPSConnection):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _create_public_connection
+
+
+class _PublicHTTPHandler(HTTPHandler):
+
+    def do_open(self, http_class, req, **kwargs):
+        return super().do_open(_PublicHTTPConnection, req, **kwargs)
+
+
+class _PublicHTTPSHandler(HTTPSHandler):
+
+    def do_open(self, http_class, req, **kwargs):
+        return super().do_open(_PublicHTTPSConnection, req, **kwargs)
+
+
+def _opener():
+    # Only HTTP(S), so a redirect cannot switch to ftp: or file:, and no proxies
+    opener = OpenerDirector()
+    for handler in (_PublicHTTPHandler(), _PublicHTTPSHandler(), HTTPRedirectHandler(),
+                    HTTPDefaultErrorHandler(), HTTPErrorProcessor(), UnknownHandler()):
+        opener.add_handler(handler)
+    return opener
+
+
+def download(url):
+    """Bytes of the image at url, refusing non-HTTP URLs, non-public hosts, error statuses and oversized bodies"""
+    if urlsplit(url).scheme not in ('http', 'https'):
+        raise FetchError(f'Unsupported URL scheme: {url}')
+    limit = settings.FEASTO_REMOTE_IMAGE_MAX_BYTES
+    request = Request(url, headers={'User-Agent': USER_AGENT, 'Accept': 'image/*'})
+    try:
+        with _opener().open(request, timeout=settings.FEASTO_REMOTE_IMAGE_TIMEOUT) as response:
+            # Read one byte past the limit to tell a full-size body from an oversized one
+            data = response.read(limit + 1)
+    except (URLError, OSError) as exc:
+        raise FetchError(f'{url}: {exc}') from exc
+    if len(data) > limit:
+        raise FetchError(f'{url}: larger than {limit} bytes')
+    return data
+
+
+def fetch_remote_image(url):
+    """Download url and store the original and its variants; returns the image_variants value"""
+    data = download(url)
+    try:
+        return {'source': url, 'original': store_original(data), **build_variants(data)}
+    except (OSError, ValueError, Image.DecompressionBombError) as exc:
+        raise FetchError(f'{url}: {exc}') from exc
+
+
+def pending_urls(retry_failed=False, limit=None):
+    """Distinct image_urls of items whose image has not been downloaded for their current URL"""
+    items = FoodItem.objects.exclude(image_url='').exclude(image_url__isnull=True).order_by('id')
+    urls = {}
+    for url, variants in items.values_list('image_url', 'image_variants').iterator(chunk_size=2000):
+        if variants.get('source') != url or (retry_failed and variants.get('failed')):
+            urls[url] = None
+            if len(urls) == limit:
+                break
+    return list(urls)
+
+
+def _save(url, variants):
+    """Record variants on every item still pointing at url; returns the number of items updated"""
+    with transaction.atomic():
+        items = FoodItem.objects.filter(image_url=url)
+        restaurants = set(items.values_list('restaurant_id', flat=True))
+        updated = items.update(image_variants=variants)
+    # update() skips the save signals, so drop the cached menus here
+    for restaurant_id in restaurants:
+        bump_menu_version(restaurant_id)
+    return updated
+
+
+def refresh_remote_images(urls, workers=4):
+    """
+    Download each url once, in parallel, and attach the results to the items using it.
+
+    Returns {url: error message or None}.
+    """
+    results = {}
+
+    def fetch(url):
+        try:
+            return url, fetch_remote_image(url), None
+        except FetchError as exc:
+            return url, {'source': url, 'failed': True}, str(exc)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for url, variants, error in pool.map(fetch, urls):
+            _save(url, variants)
+            results[url] = error
+    return results
+
+
+def _fetch_in_background(url):
+    try:
+        error = refresh_remote_images([url], workers=1)[url]
+        if error:
+            logger.warning('Could not fetch menu image %s', error)
+    finally:
+        # The connection belongs to this pool thread, which may sit idle for a long time
+        connection.close()
+
+
+def schedule_fetch(item):
+    """Download an item's image_url in the background once the current transaction commits"""
+    url = item.image_url
+    if url and settings.FEASTO_FETCH_REMOTE_IMAGES:
+        transaction.on_commit(lambda: _background.submit(_fetch_in_background, url))
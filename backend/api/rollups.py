@@ -0,0 +1,157 @@
+from collections import defaultdict
+from decimal import Decimal
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncHour
+from .cache import DASHBOARD_STATS_KEY, invalidate
+from .models import Order, OrderItem, OrderStatusRollup, SalesRollup, ItemSalesRollup
+
+
+def bump(model, keys, **deltas):
+    """Add deltas to the rollup row identified by keys, creating it if missing"""
+    updates = {field: F(field) + value for field, value in deltas.items()}
+    if model.objects.filter(**keys).update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**keys, **deltas)
+    except IntegrityError:
+        # Another writer created the row first
+        model.objects.filter(**keys).update(**updates)
+
+
+def record_status_changes(changes):
+    """
+    Apply order changes to the status rollup.
+
+    Each change is an (old_status, old_total, new_status, new_total) tuple;
+    old_status is None for new orders and new_status is None for deleted ones.
+    """
+    deltas = defaultdict(lambda: [0, Decimal('0')])
+    for old_status, old_total, new_status, new_total in changes:
+        if old_status:
+            deltas[old_status][0] -= 1
+            deltas[old_status][1] -= Decimal(old_total)
+        if new_status:
+            deltas[new_status][0] += 1
+            deltas[new_status][1] += Decimal(new_total)
+
+    for order_status, (count, revenue) in deltas.items():
+        if count or revenue:
+            bump(OrderStatusRollup, {'status': order_status}, order_count=count, revenue=revenue)
+    invalidate(DASHBOARD_STATS_KEY)
+
+
+def record_order_change(order, old_status, old_total, new_status, new_total, created=False):
+    """Update the status and sales rollups for one order change"""
+    if (old_status, old_total) == (new_status, new_total):
+        return
+    record_status_changes([(old_status, old_total, new_status, new_total)])
+    if old_status == 'delivered':
+        record_sale(order, sign=-1, total=old_total)
+    if new_status == 'delivered':
+        # A new order's items are saved after it, so its lines are counted once the transaction commits
+        record_sale(order, lines_saved=not created)
+
+
+def rebuild_status_rollup():
+    """Recompute the status rollup from the orders table with a single aggregate query"""
+    totals = Order.objects.order_by().values('status').annotate(
+        order_count=Count('id'), revenue=Sum('total')
+    )
+    with transaction.atomic():
+        OrderStatusRollup.objects.all().delete()
+        OrderStatusRollup.objects.bulk_create([
+            OrderStatusRollup(status=row['status'], order_count=row['order_count'], revenue=row['revenue'])
+            for row in totals
+        ])
+    invalidate(DASHBOARD_STATS_KEY)
+
+
+def _truncate_hour(value):
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def record_sale(order, sign=1, total=None, lines_saved=True):
+    """
+    Add (sign=1) or remove (sign=-1) a delivered order from the hourly sales rollups.
+
+    The order total is recorded right away. The category and item rows come
+    from the order's items; with lines_saved=False they are recorded when the
+    current transaction commits, so items created after the order are included.
+    """
+    total = order.total if total is None else total
+    keys = {'hour': _truncate_hour(order.created_at), 'payment_method': order.payment_method}
+    bump(SalesRollup, {**keys, 'category': ''}, order_count=sign, revenue=sign * Decimal(total))
+    if lines_saved:
+        record_sale_lines(order, sign)
+    else:
+        transaction.on_commit(lambda: record_sale_lines(order, sign))
+
+
+def record_sale_lines(order, sign=1):
+    """Add or remove a delivered order's items from the category and item sales rollups"""
+    hour = _truncate_hour(order.created_at)
+    lines = order.items.values('food_item_id', 'food_item__category', 'quantity', 'price')
+
+    categories = defaultdict(Decimal)
+    items = defaultdict(lambda: [0, Decimal('0')])
+    for line in lines:
+        revenue = line['quantity'] * line['price']
+        categories[line['food_item__category']] += revenue
+        items[(line['food_item_id'], line['food_item__category'])][0] += line['quantity']
+        items[(line['food_item_id'], line['food_item__category'])][1] += revenue
+
+    keys = {'hour': hour, 'payment_method': order.payment_method}
+    for category, revenue in categories.items():
+        bump(SalesRollup, {**keys, 'category': category}, order_count=sign, revenue=sign * revenue)
+    for (food_item_id, category), (quantity, revenue) in items.items():
+        bump(
+            ItemSalesRollup, {**keys, 'food_item_id': food_item_id},
+            category=category, quantity=sign * quantity, revenue=sign * revenue,
+        )
+
+
+def backfill_sales_rollups(since=None):
+    """Rebuild the hourly sales rollups for delivered orders created at or after since"""
+    orders = Order.objects.filter(status='delivered')
+    lines = OrderItem.objects.filter(order__status='delivered')
+    sales = SalesRollup.objects.all()
+    item_sales = ItemSalesRollup.objects.all()
+    if since is not None:
+        since = _truncate_hour(since)
+        orders = orders.filter(created_at__gte=since)
+        lines = lines.filter(order__created_at__gte=since)
+        sales = sales.filter(hour__gte=since)
+        item_sales = item_sales.filter(hour__gte=since)
+
+    line_revenue = ExpressionWrapper(F('quantity') * F('price'), output_field=DecimalField())
+    order_totals = orders.annotate(bucket=TruncHour('created_at')).order_by().values(
+        'bucket', 'payment_method'
+    ).annotate(order_count=Count('id'), revenue=Sum('total'))
+    category_totals = lines.annotate(bucket=TruncHour('order__created_at')).order_by().values(
+        'bucket', 'order__payment_method', 'food_item__category'
+    ).annotate(order_count=Count('order', distinct=True), revenue=Sum(line_revenue))
+    item_totals = lines.annotate(bucket=TruncHour('order__created_at')).order_by().values(
+        'bucket', 'order__payment_method', 'food_item_id', 'food_item__category'
+    ).annotate(units=Sum('quantity'), revenue=Sum(line_revenue))
+
+    with transaction.atomic():
+        sales.delete()
+        item_sales.delete()
+        SalesRollup.objects.bulk_create([
+            SalesRollup(hour=row['bucket'], payment_method=row['payment_method'], category='',
+                        order_count=row['order_count'], revenue=row['revenue'])
+            for row in order_totals
+        ] + [
+            SalesRollup(hour=row['bucket'], payment_method=row['order__payment_method'],
+                        category=row['food_item__category'], order_count=row['order_count'],
+                        revenue=row['revenue'])
+            for row in category_totals
+        ], batch_size=1000)
+        ItemSalesRollup.objects.bulk_create([
+            ItemSalesRollup(hour=row['bucket'], payment_method=row['order__payment_method'],
+                            food_item_id=row['food_item_id'], category=row['food_item__category'],
+                            quantity=row['units'], revenue=row['revenue'])
+            for row in item_totals
+        ], batch_size=1000)
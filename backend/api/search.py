@@ -0,0 +1,165 @@
+"""
+In-process full-text search over the menu.
+
+The index maps every token of an item's name, category and description to
+the items containing it, weighted by field. It is rebuilt from the database
+whenever the menu version changes, the same signal that invalidates cached
+menu listings, so searches never touch the food_items table except to load
+the matching rows.
+
+Query tokens match indexed tokens exactly, as a prefix ("marg" finds
+"margherita") or, for tokens of four or more letters, within one typo
+(insertion, deletion, substitution or swap of adjacent letters). Typo
+candidates come from a deletion index, so no scan of the vocabulary is needed.
+"""
+import bisect
+import math
+import re
+import threading
+import unicodedata
+from collections import defaultdict, namedtuple
+from .cache import get_menu_version
+from .models import FoodItem
+
+SearchHit = namedtuple('SearchHit', ['id', 'score', 'matched'])
+IndexState = namedtuple('IndexState', ['version', 'postings', 'vocabulary', 'deletion_index', 'items'])
+
+FIELD_WEIGHTS = {'name': 3.0, 'category': 2.0, 'description': 1.0}
+EXACT, PREFIX, TYPO = 1.0, 0.6, 0.5
+MIN_TYPO_LENGTH = 4
+MAX_PREFIX_EXPANSIONS = 50
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """Lowercase, accent-stripped word tokens of text"""
+    text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode().lower()
+    return TOKEN_RE.findall(text)
+
+
+def _deletions(term):
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+
+def _within_one_typo(a, b):
+    """True if a and b differ by one insertion, deletion, substitution or adjacent swap"""
+    if a == b or abs(len(a) - len(b)) > 1:
+        return a == b
+    prefix = 0
+    while prefix < min(len(a), len(b)) and a[prefix] == b[prefix]:
+        prefix += 1
+    if len(a) == len(b):
+        if a[prefix + 1:] == b[prefix + 1:]:
+            return True
+        return a[prefix:prefix + 2] == b[prefix:prefix + 2][::-1] and a[prefix + 2:] == b[prefix + 2:]
+    shorter, longer = (a, b) if len(a) < len(b) else (b, a)
+    return shorter[prefix:] == longer[prefix + 1:]
+
+
+class MenuSearchIndex:
+    """Inverted index of menu items, rebuilt when the menu version changes"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Swapped as a whole so searches never mix two generations of the index
+        self._state = IndexState(None, {}, [], {}, {})
+
+    def _build(self, version):
+        postings = defaultdict(dict)
+        items = {}
+        rows = FoodItem.objects.values_list('id', 'name', 'category', 'description', 'available', 'restaurant_id')
+        for item_id, name, category, description, available, restaurant_id in rows.iterator(chunk_size=2000):
+            items[item_id] = (category, available, restaurant_id)
+            for field, text in (('name', name), ('category', category), ('description', description)):
+                tokens = tokenize(text)
+                for token in tokens:
+                    # Repeats add weight with diminishing returns; short fields weigh more per token
+                    weight = FIELD_WEIGHTS[field] / math.sqrt(len(tokens))
+                    postings[token][item_id] = postings[token].get(item_id, 0) + weight
+
+        deletion_index = defaultdict(list)
+        for token in postings:
+            if len(token) >= MIN_TYPO_LENGTH:
+                for deletion in _deletions(token):
+                    deletion_index[deletion].append(token)
+
+        return IndexState(version, dict(postings), sorted(postings), dict(deletion_index), items)
+
+    def _current(self):
+        version = get_menu_version()[0]
+        if self._state.version != version:
+            with self._lock:
+                # Another thread may have rebuilt it while we waited
+                if self._state.version != version:
+                    self._state = self._build(version)
+        return self._state
+
+    def _expand(self, state, term, allow_prefix):
+        """{indexed token: match weight} for one query term"""
+        matches = {}
+        if term in state.postings:
+            matches[term] = EXACT
+        if allow_prefix:
+            start = bisect.bisect_left(state.vocabulary, term)
+            for token in state.vocabulary[start:start + MAX_PREFIX_EXPANSIONS]:
+                if not token.startswith(term):
+                    break
+                matches.setdefault(token, PREFIX)
+        if len(term) >= MIN_TYPO_LENGTH:
+            candidates = set(state.deletion_index.get(term, ()))
+            for deletion in _deletions(term):
+                candidates.update(state.deletion_index.get(deletion, ()))
+                if deletion in state.postings:
+                    candidates.add(deletion)
+            for token in candidates:
+                if _within_one_typo(term, token):
+                    matches.setdefault(token, TYPO)
+        return matches
+
+    def search(self, query, category=None, available=None, restaurant_id=None):
+        """
+        Rank items matching query.
+
+        Items matching more of the query terms rank first, then by score.
+        Returns [SearchHit] best first.
+        """
+        state = self._current()
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        postings, items = state.postings, state.items
+        total = len(items) or 1
+
+        scores = defaultdict(float)
+        matched = defaultdict(int)
+        for position, term in enumerate(terms):
+            # Short terms only expand as prefixes while they are the word being typed
+            allow_prefix = len(term) >= 3 or position == len(terms) - 1
+            best = {}
+            for token, quality in self._expand(state, term, allow_prefix).items():
+                token_postings = postings[token]
+                idf = math.log(1 + total / len(token_postings))
+                for item_id, weight in token_postings.items():
+                    score = quality * weight * idf
+                    if score > best.get(item_id, 0):
+                        best[item_id] = score
+            for item_id, score in best.items():
+                scores[item_id] += score
+                matched[item_id] += 1
+
+        hits = []
+        for item_id, score in scores.items():
+            item_category, item_available, item_restaurant_id = items[item_id]
+            if restaurant_id is not None and item_restaurant_id != restaurant_id:
+                continue
+            if category and item_category != category:
+                continue
+            if available is not None and item_available != available:
+                continue
+            hits.append(SearchHit(item_id, score, matched[item_id]))
+        hits.sort(key=lambda hit: (-hit.matched, -hit.score, hit.id))
+        return hits
+
+
+menu_search = MenuSearchIndex()
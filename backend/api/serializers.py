@@ -1,18 +1,40 @@
 from rest_framework import serializers
-from .models import User, FoodItem, Order, OrderItem, CustomerEnquiry
-from django.contrib.auth import authenticate
+from .models import User, Restaurant, FoodItem, Order, OrderItem, OrderStatusEvent, CustomerEnquiry
+from django.db import transaction
+from django.utils import timezone
+from datetime import timedelta
+from .eta import eta_table
+from .images import image_source, srcsets, stored_image_url
+from .inventory import OutOfStock, order_quantities, reserve_stock
+from .logins import authenticate_login
+from .metrics import serialization_timer
+from .pricing import price_index
 
 
-class UserSerializer(serializers.ModelSerializer):
+class TimedSerializerMixin:
+    """Count to_representation time towards the request's serialize_ms metric"""
+
+    def to_representation(self, instance):
+        timer = serialization_timer.get()
+        if timer is None:
+            return super().to_representation(instance)
+        started = timer.start()
+        try:
+            return super().to_representation(instance)
+        finally:
+            timer.stop(started)
+
+
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for User model"""
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'first_name', 'last_name', 'role', 
-                  'phone', 'address', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'created_at', 'updated_at']
+                  'phone', 'address', 'restaurant', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'restaurant', 'created_at', 'updated_at']
 
 
-class UserRegistrationSerializer(serializers.ModelSerializer):
+class UserRegistrationSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for user registration"""
     password = serializers.CharField(write_only=True, min_length=6)
     confirm_password = serializers.CharField(write_only=True)
@@ -39,7 +61,7 @@ class LoginSerializer(serializers.Serializer):
     password = serializers.CharField(write_only=True)
 
     def validate(self, data):
-        user = authenticate(username=data['username'], password=data['password'])
+        user = authenticate_login(data['username'], data['password'], self.context.get('request'))
         if not user:
             raise serializers.ValidationError("Invalid credentials")
         data['user'] = user
@@ -58,29 +80,86 @@ class ChangePasswordSerializer(serializers.Serializer):
         return data
 
 
-class FoodItemSerializer(serializers.ModelSerializer):
+class RestaurantSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Serializer for Restaurant model"""
+
+    class Meta:
+        model = Restaurant
+        fields = ['id', 'name', 'address', 'phone', 'latitude', 'longitude',
+                  'is_active', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'created_at', 'updated_at']
+
+
+class FoodItemSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for FoodItem model"""
     image = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
+    restaurant = serializers.PrimaryKeyRelatedField(queryset=Restaurant.objects.all(), required=False)
     
     class Meta:
         model = FoodItem
-        fields = ['id', 'name', 'description', 'price', 'category', 
-                  'image', 'image_url', 'available', 'created_at', 'updated_at']
+        fields = ['id', 'restaurant', 'name', 'description', 'price', 'category', 
+                  'image', 'image_srcset', 'image_url', 'available', 'stock', 'created_at', 'updated_at']
         read_only_fields = ['id', 'created_at', 'updated_at']
     
+    def validate_restaurant(self, value):
+        if self.instance is not None and value != self.instance.restaurant:
+            raise serializers.ValidationError("Items cannot move to another restaurant")
+        return value
+    
+    def validate(self, data):
+        if self.instance is None:
+            data['restaurant'] = self._owning_restaurant(data.get('restaurant'))
+        if data.get('stock') == 0:
+            # Same rule checkout applies when an item sells out
+            data['available'] = False
+        return data
+    
+    def _owning_restaurant(self, requested):
+        """Staff create items for their own restaurant; a single-restaurant setup needs no choice"""
+        request = self.context.get('request')
+        own = request.user.restaurant if request and request.user.is_authenticated else None
+        if own is not None:
+            if requested is not None and requested != own:
+                raise serializers.ValidationError({'restaurant': "You can only add items to your own restaurant"})
+            return own
+        if requested is not None:
+            return requested
+        restaurants = list(Restaurant.objects.all()[:2])
+        if len(restaurants) != 1:
+            raise serializers.ValidationError({'restaurant': "This field is required."})
+        return restaurants[0]
+    
     def get_image(self, obj):
         """Return image_url if available, otherwise return image file URL"""
         if obj.image_url:
-            return obj.image_url
+            # Our cached copy once it has been downloaded
+            original = self._variants(obj).get('original')
+            return self._absolute_url(stored_image_url(original)) if original else obj.image_url
         elif obj.image:
-            request = self.context.get('request')
-            if request:
-                return request.build_absolute_uri(obj.image.url)
-            return obj.image.url
+            return self._absolute_url(obj.image.url)
         return None
+    
+    def get_image_srcset(self, obj):
+        """Resized variants of the image as {MIME type: srcset}, smallest first"""
+        return srcsets(self._variants(obj), self._absolute_url)
+    
+    def _variants(self, obj):
+        # Rows changed with update() may not have had their variants reset
+        variants = obj.image_variants
+        return variants if variants.get('source') == image_source(obj) else {}
+    
+    def _absolute_url(self, url):
+        request = self.context.get('request')
+        if request is None or not url.startswith('/') or url.startswith('//'):
+            return url
+        # A listing shares one child serializer, so the origin is worked out once per response
+        if not hasattr(self, '_origin'):
+            self._origin = request.build_absolute_uri('/')[:-1]
+        return self._origin + url
 
 
-class OrderItemSerializer(serializers.ModelSerializer):
+class OrderItemSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for OrderItem model"""
     subtotal = serializers.ReadOnlyField()
 
@@ -90,42 +169,164 @@ class OrderItemSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'subtotal']
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for Order model"""
     items = OrderItemSerializer(many=True, read_only=True)
     customer_details = UserSerializer(source='customer', read_only=True)
     delivery_staff_details = UserSerializer(source='delivery_staff', read_only=True)
+    eta = serializers.SerializerMethodField()
 
     class Meta:
         model = Order
-        fields = ['id', 'customer', 'customer_name', 'customer_details', 
-                  'delivery_address', 'phone_number', 'special_instructions',
+        fields = ['id', 'restaurant', 'customer', 'customer_name', 'customer_details', 
+                  'delivery_address', 'delivery_latitude', 'delivery_longitude',
+                  'phone_number', 'special_instructions',
                   'payment_method', 'total', 'status', 'delivery_staff', 
                   'delivery_staff_details', 'items', 'created_at', 'updated_at', 
-                  'delivered_at']
-        read_only_fields = ['id', 'created_at', 'updated_at']
+                  'delivered_at', 'eta']
+        # Totals are priced on the server at checkout and never taken from the client.
+        # Status and rider only change through update_status/assign_delivery/claim,
+        # which check the transition table and the caller and log the change
+        read_only_fields = ['id', 'restaurant', 'total', 'status', 'delivery_staff', 'created_at', 'updated_at']
 
+    def get_eta(self, obj):
+        """Expected delivery time from the precomputed zone/hour statistics"""
+        return eta_table.estimate(obj)
+
+    def validate(self, attrs):
+        # Read-only fields are silently dropped; say so instead of answering 200
+        workflow_fields = [field for field in ('status', 'delivery_staff') if field in self.initial_data]
+        if self.instance is not None and workflow_fields:
+            raise serializers.ValidationError({
+                field: 'Use the update_status or assign_delivery action to change this field'
+                for field in workflow_fields
+            })
+        return attrs
+
+
+class OrderStatusEventSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Serializer for OrderStatusEvent model"""
+
+    class Meta:
+        model = OrderStatusEvent
+        fields = ['id', 'order', 'from_status', 'to_status', 'actor', 'created_at']
+        read_only_fields = fields
 
-class OrderCreateSerializer(serializers.ModelSerializer):
+
+class OrderListSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Compact serializer for order listings with flat customer and staff fields"""
+    customer_username = serializers.CharField(source='customer.username', read_only=True)
+    delivery_staff_name = serializers.SerializerMethodField()
+    item_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Order
+        fields = ['id', 'restaurant', 'customer', 'customer_name', 'customer_username',
+                  'delivery_address', 'phone_number', 'payment_method', 'total',
+                  'status', 'delivery_staff', 'delivery_staff_name', 'item_count',
+                  'created_at', 'updated_at', 'delivered_at']
+        read_only_fields = fields
+
+    def get_delivery_staff_name(self, obj):
+        staff = obj.delivery_staff
+        if staff is None:
+            return None
+        return staff.get_full_name() or staff.username
+
+
+class OrderItemCreateSerializer(serializers.Serializer):
+    """Serializer for order lines; name and price always come from the menu"""
+    food_item = serializers.IntegerField(source='food_item_id')
+    quantity = serializers.IntegerField(min_value=1)
+    name = serializers.CharField(read_only=True)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+
+
+def reserve_order_stock(quantities):
+    try:
+        reserve_stock(quantities)
+    except OutOfStock as exc:
+        raise serializers.ValidationError({'items': str(exc)})
+
+
+class OrderBatchCreateSerializer(serializers.ListSerializer):
+    """Serializer for creating many orders in one transaction"""
+
+    def create(self, validated_data):
+        quantities = order_quantities(
+            (item['food_item_id'], item['quantity']) for order_data in validated_data for item in order_data['items']
+        )
+        with transaction.atomic():
+            # Stock for the whole batch is reserved in one statement; if any item is short, no order is created
+            reserve_order_stock(quantities)
+            orders = []
+            order_items = []
+            for order_data in validated_data:
+                items_data = order_data.pop('items')
+                order = Order.objects.create(**order_data)
+                orders.append(order)
+                order_items.extend(OrderItem(order=order, **item_data) for item_data in items_data)
+            # Items for every order in the batch go out as one multi-row INSERT
+            OrderItem.objects.bulk_create(order_items)
+        return orders
+
+
+class OrderCreateSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for creating orders"""
-    items = OrderItemSerializer(many=True)
+    items = OrderItemCreateSerializer(many=True, allow_empty=False)
 
     class Meta:
         model = Order
-        fields = ['customer', 'customer_name', 'delivery_address', 'phone_number',
-                  'special_instructions', 'payment_method', 'total', 'items']
+        fields = ['customer', 'customer_name', 'delivery_address', 'delivery_latitude',
+                  'delivery_longitude', 'phone_number', 'special_instructions',
+                  'payment_method', 'total', 'items']
+        read_only_fields = ['total']
+        list_serializer_class = OrderBatchCreateSerializer
+
+    def validate_items(self, items):
+        """Price every line from the menu index instead of trusting the client"""
+        menu = price_index.lookup({item['food_item_id'] for item in items})
+        for item in items:
+            entry = menu.get(item['food_item_id'])
+            if entry is None:
+                raise serializers.ValidationError(f"Food item {item['food_item_id']} does not exist")
+            if not entry.available:
+                raise serializers.ValidationError(f"{entry.name} is not available")
+            item['name'] = entry.name
+            item['price'] = entry.price
+            item['restaurant_id'] = entry.restaurant_id
+        return items
+
+    def validate(self, data):
+        restaurants = {item.pop('restaurant_id') for item in data['items']}
+        if len(restaurants) > 1:
+            raise serializers.ValidationError({'items': "All items must come from the same restaurant"})
+        data['restaurant_id'] = restaurants.pop()
+        data['total'] = sum(item['price'] * item['quantity'] for item in data['items'])
+        return data
 
     def create(self, validated_data):
         items_data = validated_data.pop('items')
-        order = Order.objects.create(**validated_data)
-        
-        for item_data in items_data:
-            OrderItem.objects.create(order=order, **item_data)
-        
+        with transaction.atomic():
+            reserve_order_stock(order_quantities((item['food_item_id'], item['quantity']) for item in items_data))
+            order = Order.objects.create(**validated_data)
+            OrderItem.objects.bulk_create([OrderItem(order=order, **item_data) for item_data in items_data])
         return order
 
 
-class CustomerEnquirySerializer(serializers.ModelSerializer):
+class RiderPingSerializer(serializers.Serializer):
+    """Serializer for a GPS ping posted by delivery staff"""
+    latitude = serializers.FloatField(min_value=-90, max_value=90)
+    longitude = serializers.FloatField(min_value=-180, max_value=180)
+    recorded_at = serializers.DateTimeField(required=False)
+
+    def validate_recorded_at(self, value):
+        if value > timezone.now() + timedelta(minutes=1):
+            raise serializers.ValidationError("recorded_at is in the future")
+        return value
+
+
+class CustomerEnquirySerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for CustomerEnquiry model"""
     subject = serializers.CharField(required=False, allow_blank=True, default='Contact Form Submission')
     phone = serializers.CharField(required=False, allow_blank=True, allow_null=True)
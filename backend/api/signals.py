@@ -0,0 +1,95 @@
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from .authentication import user_cache
+from .cache import bump_menu_version
+from .eta import record_status_timing
+from .images import refresh_image_variants
+from .inventory import release_order_stock
+from .models import FoodItem, Order, OrderStatusEvent, User
+from .orders import publish_order_change
+from .pricing import price_index
+from .remote_images import schedule_fetch
+from .rollups import record_order_change, record_sale, record_status_changes
+
+
+def _rollup_state(order):
+    # Read from __dict__ so deferred fields are never fetched just for bookkeeping
+    return order.__dict__.get('status'), order.__dict__.get('total')
+
+
+@receiver(post_init, sender=Order)
+def remember_order_state(sender, instance, **kwargs):
+    """Remember the loaded status and total so saves can be diffed"""
+    instance._rollup_state = _rollup_state(instance) if instance.pk else (None, None)
+
+
+@receiver(post_save, sender=Order)
+def update_order_rollups(sender, instance, created, **kwargs):
+    """Update rollups and the status log when a save changes an order's status or total"""
+    old_status, old_total = (None, None) if created else instance._rollup_state
+    new_status, new_total = _rollup_state(instance)
+    record_order_change(instance, old_status, old_total, new_status, new_total, created=created)
+    if old_status and new_status and old_status != new_status:
+        # Saves that bypass api.orders.transition_order (admin site, PUT/PATCH) are logged too
+        OrderStatusEvent.objects.create(order=instance, from_status=old_status, to_status=new_status)
+    if old_status != new_status:
+        publish_order_change(instance, old_status)
+    instance._rollup_state = (new_status, new_total)
+
+
+@receiver(post_save, sender=OrderStatusEvent)
+def update_delivery_time_stats(sender, instance, created, **kwargs):
+    """Feed completed prep and travel phases into the ETA statistics"""
+    if created:
+        record_status_timing(instance)
+
+
+@receiver(post_save, sender=OrderStatusEvent)
+def restock_cancelled_order(sender, instance, created, **kwargs):
+    """Put the portions of a cancelled order back into stock"""
+    if created and instance.to_status == 'cancelled':
+        release_order_stock(instance.order_id)
+
+
+@receiver(pre_delete, sender=Order)
+def remove_order_from_sales(sender, instance, **kwargs):
+    """Drop a delivered order from the sales rollups while its items still exist"""
+    if instance._rollup_state[0] == 'delivered':
+        record_sale(instance, sign=-1, total=instance._rollup_state[1])
+
+
+@receiver(post_delete, sender=Order)
+def remove_order_from_rollups(sender, instance, **kwargs):
+    """Drop a deleted order from the status rollup"""
+    old_status, old_total = instance._rollup_state
+    if old_status:
+        record_status_changes([(old_status, old_total, None, None)])
+
+
+@receiver(pre_save, sender=FoodItem)
+def build_image_variants(sender, instance, raw=False, **kwargs):
+    """Generate thumbnails of a newly uploaded image before the item is written"""
+    if not raw:
+        refresh_image_variants(instance)
+
+
+@receiver(post_save, sender=FoodItem)
+def fetch_remote_image(sender, instance, raw=False, **kwargs):
+    """Start downloading an image_url that has no local copy yet"""
+    if not raw and instance.image_url and instance.image_variants.get('source') != instance.image_url:
+        schedule_fetch(instance)
+
+
+@receiver(post_save, sender=FoodItem)
+@receiver(post_delete, sender=FoodItem)
+def invalidate_menu_caches(sender, instance, **kwargs):
+    """Drop cached prices and menu listings whenever a menu item changes"""
+    price_index.invalidate()
+    bump_menu_version(instance.restaurant_id)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    """Make token-authenticated requests in this process see user changes right away"""
+    user_cache.invalidate(instance.pk)
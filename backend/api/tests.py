@@ -1,3 +1,916 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest import mock, skipIf
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import AsyncClient, TransactionTestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from django.contrib.auth.signals import user_logged_in, user_login_failed
+from . import dispatch, logins, remote_images
+from .metrics import registry
+from rest_framework.test import APITestCase
+from .models import (
+    FoodItem, ItemSalesRollup, Order, OrderItem, OrderStatusEvent, Restaurant, RiderLocation, SalesRollup,
+    UsedRefreshToken, User,
+)
+from .authentication import issue_stream_ticket, issue_tokens, user_cache
+from .eta import eta_table, rebuild_delivery_stats
+from .events import get_broker, is_visible_to, order_event
+from .orders import claim_next_order, claim_order, transition_order
+from .tracking import RiderTracker
+from .pricing import price_index
 
-# Create your tests here.
+
+def make_item(restaurant, name='Margherita', price='10.00', category='Pizza', **kwargs):
+    return FoodItem.objects.create(
+        restaurant=restaurant, name=name, description=name, price=Decimal(price), category=category, **kwargs
+    )
+
+
+def make_order(customer, items=(), **kwargs):
+    """An order with one OrderItem per (food_item, quantity) pair, priced from the menu"""
+    restaurant = items[0][0].restaurant if items else Restaurant.objects.first()
+    fields = {
+        'restaurant': restaurant, 'customer': customer, 'customer_name': customer.username,
+        'delivery_address': '1 Main St', 'phone_number': '555', 'payment_method': 'cash',
+        'total': sum((item.price * quantity for item, quantity in items), Decimal('0')),
+    }
+    fields.update(kwargs)
+    order = Order.objects.create(**fields)
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, food_item=item, name=item.name, quantity=quantity, price=item.price)
+        for item, quantity in items
+    ])
+    return order
+
+
+class FeastoTestCase(APITestCase):
+    """Shared fixtures: one restaurant, a customer and an authenticated client"""
+
+    def setUp(self):
+        cache.clear()
+        price_index.invalidate()
+        self.restaurant = Restaurant.objects.create(name='Test Kitchen')
+        self.customer = User.objects.create_user('customer', password='secret', role='customer')
+        self.client.force_authenticate(self.customer)
+
+    def order_payload(self, items):
+        return {
+            'customer': self.customer.pk, 'customer_name': 'Customer', 'delivery_address': '1 Main St',
+            'phone_number': '555', 'payment_method': 'cash',
+            'items': [{'food_item': item.pk, 'quantity': quantity} for item, quantity in items],
+        }
+
+
+class OrderPricingTests(FeastoTestCase):
+
+    def test_total_is_priced_on_the_server(self):
+        pizza = make_item(self.restaurant, price='10.00')
+        payload = self.order_payload([(pizza, 2)])
+        payload['total'] = '0.01'
+        response = self.client.post('/api/orders/', payload, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(Order.objects.get().total, Decimal('20.00'))
+
+    def test_total_cannot_be_changed_after_checkout(self):
+        pizza = make_item(self.restaurant, price='10.00')
+        order = make_order(self.customer, [(pizza, 2)])
+        response = self.client.patch(f'/api/orders/{order.pk}/', {'total': '0.01'}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        order.refresh_from_db()
+        self.assertEqual(order.total, Decimal('20.00'))
+
+    def test_price_index_queries_only_uncached_items(self):
+        pizza = make_item(self.restaurant)
+        make_item(self.restaurant, name='Calzone')
+        price_index.lookup([pizza.pk])
+        # get_menu_version reads the cache, not the database
+        with self.assertNumQueries(0):
+            self.assertEqual(price_index.lookup([pizza.pk])[pizza.pk].price, Decimal('10.00'))
+        salad = make_item(self.restaurant, name='Salad', price='4.50')
+        with self.assertNumQueries(1):
+            found = price_index.lookup([pizza.pk, salad.pk])
+        self.assertEqual(found[salad.pk].price, Decimal('4.50'))
+
+
+class StockTests(FeastoTestCase):
+
+    def test_checkout_takes_the_ordered_portions(self):
+        pizza = make_item(self.restaurant, stock=3)
+        salad = make_item(self.restaurant, name='Salad')
+        response = self.client.post('/api/orders/', self.order_payload([(pizza, 2), (salad, 5)]), format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        pizza.refresh_from_db()
+        self.assertEqual(pizza.stock, 1)
+        self.assertTrue(pizza.available)
+        self.assertIsNone(FoodItem.objects.get(pk=salad.pk).stock)
+
+    def test_short_item_rejects_the_whole_order(self):
+        pizza = make_item(self.restaurant, stock=3)
+        calzone = make_item(self.restaurant, name='Calzone', stock=1)
+        response = self.client.post('/api/orders/', self.order_payload([(pizza, 2), (calzone, 2)]), format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Calzone', str(response.data['items']))
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(FoodItem.objects.get(pk=pizza.pk).stock, 3)
+        self.assertEqual(FoodItem.objects.get(pk=calzone.pk).stock, 1)
+
+    def test_last_portion_marks_the_item_unavailable(self):
+        pizza = make_item(self.restaurant, stock=2)
+        response = self.client.post('/api/orders/', self.order_payload([(pizza, 2)]), format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        pizza.refresh_from_db()
+        self.assertEqual(pizza.stock, 0)
+        self.assertFalse(pizza.available)
+
+    def test_cancelling_puts_the_portions_back(self):
+        pizza = make_item(self.restaurant, stock=3)
+        response = self.client.post('/api/orders/', self.order_payload([(pizza, 2)]), format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        order = Order.objects.get()
+        response = self.client.post(f'/api/orders/{order.pk}/update_status/', {'status': 'cancelled'}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(FoodItem.objects.get(pk=pizza.pk).stock, 3)
+
+
+class OrderStatusTests(FeastoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user('admin', password='secret', role='admin')
+        self.client.force_authenticate(self.admin)
+        self.order = make_order(self.customer, [(make_item(self.restaurant), 1)])
+
+    def update_status(self, new_status):
+        return self.client.post(f'/api/orders/{self.order.pk}/update_status/', {'status': new_status}, format='json')
+
+    def test_order_walks_the_transition_table_and_logs_each_step(self):
+        for new_status in ('confirmed', 'preparing', 'ready', 'out_for_delivery', 'delivered'):
+            response = self.update_status(new_status)
+            self.assertEqual(response.status_code, 200, response.content)
+        response = self.client.get(f'/api/orders/{self.order.pk}/history/')
+        steps = [(event['from_status'], event['to_status']) for event in response.data]
+        self.assertEqual(sorted(steps), sorted([
+            ('pending', 'confirmed'), ('confirmed', 'preparing'), ('preparing', 'ready'),
+            ('ready', 'out_for_delivery'), ('out_for_delivery', 'delivered'),
+        ]))
+        self.assertTrue(all(event['actor'] == self.admin.pk for event in response.data))
+        self.order.refresh_from_db()
+        self.assertIsNotNone(self.order.delivered_at)
+
+    def test_skipping_a_step_is_rejected(self):
+        response = self.update_status('delivered')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(response.data['allowed']), ['confirmed', 'cancelled'])
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'pending')
+        self.assertFalse(OrderStatusEvent.objects.exists())
+
+    def test_final_statuses_cannot_change(self):
+        self.assertEqual(self.update_status('cancelled').status_code, 200)
+        self.assertEqual(self.update_status('confirmed').status_code, 400)
+        self.assertEqual(OrderStatusEvent.objects.count(), 1)
+
+    def test_stale_status_loses_to_the_first_writer(self):
+        stale = Order.objects.get(pk=self.order.pk)
+        self.assertIsNotNone(transition_order(self.order, 'confirmed'))
+        self.assertIsNone(transition_order(stale, 'cancelled'))
+        self.assertEqual(Order.objects.get(pk=self.order.pk).status, 'confirmed')
+
+    def test_stale_update_status_request_gets_a_conflict(self):
+        stale = Order.objects.get(pk=self.order.pk)
+        transition_order(self.order, 'confirmed')
+        with mock.patch('api.views.OrderViewSet.get_object', return_value=stale):
+            response = self.update_status('cancelled')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Order.objects.get(pk=self.order.pk).status, 'confirmed')
+
+    def test_status_and_rider_cannot_be_patched(self):
+        rider = User.objects.create_user('rider', password='secret', role='delivery')
+        self.client.force_authenticate(self.customer)
+        for payload in ({'status': 'confirmed'}, {'delivery_staff': rider.pk}):
+            response = self.client.patch(f'/api/orders/{self.order.pk}/', payload, format='json')
+            self.assertEqual(response.status_code, 400)
+        response = self.client.patch(f'/api/orders/{self.order.pk}/', {'phone_number': '556'}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.status, self.order.delivery_staff), ('pending', None))
+        self.assertFalse(OrderStatusEvent.objects.exists())
+
+    def test_customers_can_only_cancel(self):
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.update_status('confirmed').status_code, 403)
+        self.assertEqual(self.update_status('cancelled').status_code, 200)
+
+
+class MenuListTests(FeastoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for n in range(60):
+            make_item(self.restaurant, name=f'Item {n}')
+
+    def test_async_and_sync_menus_do_not_share_cache_entries(self):
+        async_response = self.client.get('/api/async/food/')
+        sync_response = self.client.get('/api/food/')
+        for response in (async_response, sync_response):
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['count'], 60)
+            self.assertEqual(len(response.json()['results']), 50)
+        self.assertIn('/api/food/?page=2', sync_response.json()['next'])
+        self.assertIn('/api/async/food/?page=2', async_response.json()['next'])
+        self.assertNotEqual(async_response['ETag'], sync_response['ETag'])
+
+    def test_async_menu_pages_like_the_sync_menu(self):
+        async_page = self.client.get('/api/async/food/?page=2').json()
+        sync_page = self.client.get('/api/food/?page=2').json()
+        self.assertEqual(async_page['results'], sync_page['results'])
+        self.assertIsNone(async_page['next'])
+        self.assertEqual(self.client.get('/api/async/food/?page=3').status_code, 404)
+
+    def test_edits_from_other_processes_show_once_the_ttl_passes(self):
+        item = FoodItem.objects.order_by('-created_at', '-id').first()
+        etag = self.client.get('/api/food/')['ETag']
+        # update() skips the signals, like an edit made in a worker with its own locmem cache
+        FoodItem.objects.filter(pk=item.pk).update(price=Decimal('12.00'))
+        self.assertEqual(self.client.get('/api/food/')['ETag'], etag)
+
+        with mock.patch('time.time', return_value=time.time() + settings.FEASTO_MENU_CACHE_TTL + 1):
+            response = self.client.get('/api/food/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['price'], '12.00')
+
+
+class OrderListQueryTests(FeastoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        rider = User.objects.create_user('rider', password='secret', role='delivery')
+        pizza = make_item(self.restaurant)
+        salad = make_item(self.restaurant, name='Salad', price='4.50')
+        for n in range(30):
+            make_order(self.customer, [(pizza, 1), (salad, 2)], delivery_staff=rider if n % 2 else None)
+
+    def test_list_query_count_does_not_depend_on_page_size(self):
+        for page_size in (1, 10, 30):
+            with self.assertNumQueries(1):
+                response = self.client.get(f'/api/orders/?page_size={page_size}')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json()['results']), page_size)
+            self.assertEqual(response.json()['results'][0]['item_count'], 2)
+
+    def test_expanded_list_query_count_does_not_depend_on_page_size(self):
+        for page_size in (1, 30):
+            # Page plus the prefetched items; the ETA table is loaded once per process
+            self.client.get('/api/orders/?expand=full&page_size=1')
+            with self.assertNumQueries(2):
+                response = self.client.get(f'/api/orders/?expand=full&page_size={page_size}')
+            self.assertEqual(len(response.json()['results']), page_size)
+
+
+@skipIf(connection.vendor == 'sqlite', 'SQLite serialises writers; run against MySQL')
+class ClaimRaceTests(TransactionTestCase):
+    """Riders on separate threads and connections racing for the same ready orders"""
+    rider_count = 8
+    order_count = 40
+
+    def setUp(self):
+        restaurant = Restaurant.objects.create(name='Test Kitchen')
+        customer = User.objects.create_user('customer', password=None)
+        self.riders = [
+            User.objects.create_user(f'rider-{n}', password=None, role='delivery') for n in range(self.rider_count)
+        ]
+        self.order_ids = [
+            make_order(customer, restaurant=restaurant, total=Decimal('10.00'), status='ready').pk
+            for _ in range(self.order_count)
+        ]
+
+    def race(self, work):
+        """Run work(rider) on one thread per rider, started together; returns the (order_id, rider_id) claims"""
+        claims = []
+        errors = []
+        lock = threading.Lock()
+        start_gate = threading.Barrier(len(self.riders))
+
+        def run(rider):
+            start_gate.wait()
+            try:
+                for order in work(rider):
+                    with lock:
+                        claims.append((order.pk, rider.pk))
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=(rider,)) for rider in self.riders]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        return claims
+
+    def assertClaimedOnce(self, claims):
+        claimed = [order_id for order_id, _ in claims]
+        self.assertEqual(sorted(claimed), sorted(set(claimed)), 'an order was claimed twice')
+        stored = dict(Order.objects.filter(pk__in=self.order_ids).values_list('id', 'delivery_staff_id'))
+        for order_id, rider_id in claims:
+            self.assertEqual(stored[order_id], rider_id)
+        self.assertEqual(OrderStatusEvent.objects.filter(to_status='out_for_delivery').count(), len(claims))
+
+    def test_claim_has_one_winner_per_order(self):
+        def work(rider):
+            return [order for order in (claim_order(order_id, rider) for order_id in self.order_ids) if order]
+
+        claims = self.race(work)
+        self.assertEqual(len(claims), self.order_count)
+        self.assertClaimedOnce(claims)
+
+    def test_claim_next_hands_out_each_order_once(self):
+        def work(rider):
+            orders = []
+            while (order := claim_next_order(rider)) is not None:
+                orders.append(order)
+            return orders
+
+        claims = self.race(work)
+        self.assertEqual(len(claims), self.order_count)
+        self.assertClaimedOnce(claims)
+        self.assertFalse(Order.objects.filter(status='ready').exists())
+
+
+@override_settings(FEASTO_KITCHEN_LOCATION=None)
+class DispatchTests(FeastoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.rider = User.objects.create_user('rider', password='secret', role='delivery')
+        RiderLocation.objects.create(rider=self.rider, latitude=12.971, longitude=77.591, recorded_at=timezone.now())
+        self.kitchen = Restaurant.objects.create(name='Located Kitchen', latitude=12.97, longitude=77.59)
+
+    def test_orders_without_a_pickup_point_are_skipped(self):
+        unlocated = make_order(self.customer, restaurant=self.restaurant, total=Decimal('10.00'), status='ready')
+        located = make_order(self.customer, restaurant=self.kitchen, total=Decimal('10.00'), status='ready')
+        with self.assertLogs('api.dispatch', 'WARNING'):
+            assignments = dispatch.dispatch_ready_orders()
+        self.assertEqual([assignment.order_id for assignment in assignments], [located.pk])
+        unlocated.refresh_from_db()
+        self.assertIsNone(unlocated.delivery_staff)
+
+    def test_rider_carrying_an_order_is_not_assigned_another(self):
+        make_order(self.customer, restaurant=self.kitchen, total=Decimal('10.00'),
+                   status='out_for_delivery', delivery_staff=self.rider)
+        ready = make_order(self.customer, restaurant=self.kitchen, total=Decimal('10.00'), status='ready')
+        self.assertIsNone(dispatch.assign_to_idle_rider(ready.pk, self.rider))
+        ready.refresh_from_db()
+        self.assertIsNone(ready.delivery_staff)
+
+    @override_settings(FEASTO_AUTO_DISPATCH=True)
+    def test_marking_an_order_ready_schedules_dispatch_after_commit(self):
+        admin = User.objects.create_user('admin', password='secret', role='admin')
+        self.client.force_authenticate(admin)
+        order = make_order(self.customer, restaurant=self.restaurant, total=Decimal('10.00'), status='preparing')
+        with mock.patch.object(dispatch, 'schedule_dispatch') as schedule:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(f'/api/orders/{order.pk}/update_status/', {'status': 'ready'})
+        self.assertEqual(response.status_code, 200, response.content)
+        schedule.assert_called_once()
+
+    def test_background_dispatch_logs_errors(self):
+        with mock.patch.object(dispatch, 'dispatch_ready_orders', side_effect=RuntimeError('boom')):
+            with self.assertLogs('api.dispatch', 'ERROR'):
+                dispatch._dispatch_in_background()
+
+
+class WorkQueueTests(FeastoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.rider = User.objects.create_user('rider', password='secret', role='delivery')
+        self.client.force_authenticate(self.rider)
+
+    def ready_order(self, updated_at, **kwargs):
+        order = make_order(self.customer, restaurant=self.restaurant, total=Decimal('10.00'), status='ready', **kwargs)
+        Order.objects.filter(pk=order.pk).update(updated_at=updated_at)
+        return order
+
+    def test_since_returns_only_orders_changed_after_the_watermark(self):
+        now = timezone.now()
+        self.ready_order(now - timedelta(hours=1))
+        recent = self.ready_order(now - timedelta(minutes=1))
+        delivered = self.ready_order(now - timedelta(minutes=1), delivery_staff=self.rider)
+        Order.objects.filter(pk=delivered.pk).update(status='delivered')
+
+        response = self.client.get('/api/orders/work_queue/', {'since': (now - timedelta(minutes=5)).isoformat()})
+        body = response.json()
+        self.assertEqual([order['id'] for order in body['claimable']], [recent.pk])
+        # Orders that left the rider's hands are sent so the client can drop them
+        self.assertEqual([order['id'] for order in body['active']], [delivered.pk])
+        self.assertFalse(body['has_more'])
+
+    def test_full_page_resumes_from_its_last_row(self):
+        start = timezone.now() - timedelta(hours=1)
+        orders = [self.ready_order(start + timedelta(minutes=n)) for n in range(5)]
+
+        pages = []
+        body = {'watermark': start.isoformat(), 'has_more': True}
+        while body['has_more']:
+            body = self.client.get('/api/orders/work_queue/', {'since': body['watermark'], 'limit': 3}).json()
+            pages.append([order['id'] for order in body['claimable']])
+        # Each page repeats the last row of the one before, nothing is skipped
+        ids = [order.pk for order in orders]
+        self.assertEqual(pages, [ids[:3], ids[2:], ids[4:]])
+
+    def test_claimable_ids_drop_orders_claimed_by_other_riders(self):
+        now = timezone.now()
+        taken = self.ready_order(now)
+        free = self.ready_order(now)
+        other = User.objects.create_user('other', password='secret', role='delivery')
+        claim_order(taken.pk, other)
+
+        body = self.client.get('/api/orders/work_queue/', {'since': now.isoformat()}).json()
+        self.assertEqual(body['claimable_ids'], [free.pk])
+
+    def test_order_committed_after_the_poll_with_an_earlier_stamp_is_returned(self):
+        polled_at = timezone.now()
+        watermark = self.client.get('/api/orders/work_queue/').json()['watermark']
+
+        # Stamped just before the poll but only visible afterwards, like a transaction committing late
+        late = make_order(self.customer, restaurant=self.restaurant, total=Decimal('10.00'), status='ready')
+        Order.objects.filter(pk=late.pk).update(updated_at=polled_at - timedelta(seconds=5))
+
+        response = self.client.get('/api/orders/work_queue/', {'since': watermark})
+        self.assertEqual([order['id'] for order in response.json()['claimable']], [late.pk])
+
+
+class StubImageHandler(BaseHTTPRequestHandler):
+    """Serves a JPEG at /photo.jpg, an oversized body at /big and a redirect to a private address"""
+    hits = []
+
+    def do_GET(self):
+        self.hits.append(self.path)
+        if self.path == '/photo.jpg':
+            buffer = io.BytesIO()
+            Image.new('RGB', (800, 600), 'blue').save(buffer, 'JPEG')
+            self.reply(200, buffer.getvalue())
+        elif self.path == '/big':
+            self.reply(200, b'x' * 2048)
+        elif self.path == '/redirect':
+            self.send_response(302)
+            self.send_header('Location', 'http://10.0.0.1/photo.jpg')
+            self.end_headers()
+        else:
+            self.reply(404, b'')
+
+    def reply(self, code, body):
+        self.send_response(code)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(FEASTO_REMOTE_IMAGE_MAX_BYTES=1024 * 1024)
+class RemoteImageTests(FeastoTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = HTTPServer(('127.0.0.1', 0), StubImageHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_port}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        StubImageHandler.hits.clear()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def allow_loopback(self):
+        """Let downloads reach the stub server, which listens on a non-public address"""
+        return mock.patch.object(remote_images, 'is_public_address', side_effect=lambda ip: ip.is_loopback)
+
+    def test_image_is_downloaded_once_and_served_locally(self):
+        url = f'{self.base_url}/photo.jpg'
+        first = make_item(self.restaurant, image_url=url)
+        make_item(self.restaurant, name='Calzone', image_url=url)
+        self.assertEqual(self.client.get(f'/api/food/{first.pk}/').json()['image'], url)
+
+        with self.allow_loopback():
+            results = remote_images.refresh_remote_images(remote_images.pending_urls())
+        self.assertEqual(results, {url: None})
+        self.assertEqual(StubImageHandler.hits, ['/photo.jpg'])
+
+        data = self.client.get(f'/api/food/{first.pk}/').json()
+        self.assertTrue(data['image'].startswith('http://testserver/api/images/'))
+        self.assertIn('image/webp', data['image_srcset'])
+        response = self.client.get(data['image'].replace('http://testserver', ''))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_non_public_hosts_are_refused_before_connecting(self):
+        url = f'{self.base_url}/photo.jpg'
+        for refused in (url, 'http://169.254.169.254/latest/meta-data/', 'http://localhost/'):
+            with self.assertRaisesMessage(remote_images.FetchError, 'non-public address'):
+                remote_images.download(refused)
+        self.assertEqual(StubImageHandler.hits, [])
+
+    def test_redirects_to_non_public_hosts_are_refused(self):
+        with self.allow_loopback(), self.assertRaisesMessage(remote_images.FetchError, '10.0.0.1'):
+            remote_images.download(f'{self.base_url}/redirect')
+        self.assertEqual(StubImageHandler.hits, ['/redirect'])
+
+    @override_settings(FEASTO_REMOTE_IMAGE_MAX_BYTES=1024)
+    def test_failures_are_recorded_and_retried_on_request(self):
+        big = f'{self.base_url}/big'
+        make_item(self.restaurant, image_url=big)
+        with self.allow_loopback():
+            results = remote_images.refresh_remote_images([big, 'file:///etc/passwd'])
+        self.assertIn('larger than', results[big])
+        self.assertIn('Unsupported URL scheme', results['file:///etc/passwd'])
+        self.assertEqual(remote_images.pending_urls(), [])
+        self.assertEqual(remote_images.pending_urls(retry_failed=True), [big])
+
+
+class SalesRollupTests(FeastoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.pizza = make_item(self.restaurant, price='10.00', category='Pizza')
+        self.salad = make_item(self.restaurant, name='Salad', price='4.50', category='Salads')
+
+    def assertSales(self, category_revenue, item_quantities):
+        rows = SalesRollup.objects.values_list('category', 'order_count', 'revenue')
+        self.assertEqual({category: (count, revenue) for category, count, revenue in rows}, category_revenue)
+        self.assertEqual(dict(ItemSalesRollup.objects.values_list('food_item_id', 'quantity')), item_quantities)
+
+    def test_order_created_delivered_counts_its_items(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            make_order(self.customer, [(self.pizza, 2), (self.salad, 1)], status='delivered')
+        self.assertSales(
+            {'': (1, Decimal('24.50')), 'Pizza': (1, Decimal('20.00')), 'Salads': (1, Decimal('4.50'))},
+            {self.pizza.pk: 2, self.salad.pk: 1},
+        )
+
+    def test_order_delivered_later_counts_its_items(self):
+        order = make_order(self.customer, [(self.pizza, 1)], status='out_for_delivery')
+        order.status = 'delivered'
+        order.save()
+        self.assertSales({'': (1, Decimal('10.00')), 'Pizza': (1, Decimal('10.00'))}, {self.pizza.pk: 1})
+        order.delete()
+        self.assertSales(
+            {'': (0, Decimal('0.00')), 'Pizza': (0, Decimal('0.00'))}, {self.pizza.pk: 0},
+        )
+
+    def test_populate_data_fills_item_rollups(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('populate_data', stdout=io.StringIO())
+        self.assertTrue(ItemSalesRollup.objects.exists())
+        self.assertTrue(SalesRollup.objects.exclude(category='').exists())
+
+    def test_analytics_rejects_unknown_filters(self):
+        self.client.force_authenticate(User.objects.create_user('admin', password='secret', role='admin'))
+        for params in (
+            {'payment_method': 'bitcoin'},
+            {'start': '2024-02-30'},
+            {'end': 'yesterday'},
+            {'start': '2024-03-02', 'end': '2024-03-01'},
+        ):
+            response = self.client.get('/api/analytics/sales/', params)
+            self.assertEqual(response.status_code, 400, params)
+        response = self.client.get('/api/analytics/sales/', {'payment_method': 'cash', 'start': '2024-03-01'})
+        self.assertEqual(response.status_code, 200)
+
+
+class RiderTrackerFlushTests(TransactionTestCase):
+
+    def test_pings_are_written_without_further_records(self):
+        rider = User.objects.create_user('rider', password=None, role='delivery')
+        tracker = RiderTracker(flush_interval=0.1)
+        flushed = threading.Event()
+        flush = tracker.flush
+
+        def flush_and_signal():
+            written = flush()
+            if written:
+                flushed.set()
+            return written
+
+        tracker.flush = flush_and_signal
+        tracker.record(rider.pk, [(12.97, 77.59, time.time())])
+        # Wait on the flush rather than polling, since SQLite locks the table while it is written
+        self.assertTrue(flushed.wait(5))
+        self.assertEqual(RiderLocation.objects.get().rider_id, rider.pk)
+
+
+@override_settings(FEASTO_METRICS_ENABLED=True)
+class RequestMetricsTests(FeastoTestCase):
+
+    def test_time_outside_sql_is_reported_as_app_time(self):
+        registry.reset()
+        self.client.force_authenticate(User.objects.create_user('admin', password='secret', role='admin'))
+        self.client.get('/api/food/')
+        menu = self.client.get('/api/metrics/').json()['endpoints']['FoodItemViewSet.list']
+        self.assertEqual(menu['app_ms']['count'], 1)
+        self.assertIn('feasto_request_app_ms', self.client.get('/api/metrics/?format=prometheus').content.decode())
+
+    def test_serializer_and_render_time_is_reported_separately(self):
+        registry.reset()
+        make_item(self.restaurant)
+        make_item(self.restaurant, name='Calzone')
+        slow_image = mock.patch(
+            'api.serializers.FoodItemSerializer.get_image', side_effect=lambda obj: time.sleep(0.02)
+        )
+        with slow_image:
+            self.client.get('/api/food/')
+        self.client.force_authenticate(User.objects.create_user('admin', password='secret', role='admin'))
+        menu = self.client.get('/api/metrics/').json()['endpoints']['FoodItemViewSet.list']
+        self.assertEqual(menu['serialize_ms']['count'], 1)
+        self.assertGreaterEqual(menu['serialize_ms']['sum'], 40)
+        self.assertGreaterEqual(menu['app_ms']['sum'], menu['serialize_ms']['sum'])
+        self.assertIn('feasto_request_serialize_ms', self.client.get('/api/metrics/?format=prometheus').content.decode())
+
+
+class EtaTableTests(FeastoTestCase):
+
+    def test_rebuilding_the_statistics_reloads_the_table(self):
+        placed = timezone.now() - timedelta(hours=1)
+        hour = timezone.localtime(placed).hour
+        eta_table.invalidate()
+        default_prep = eta_table.durations('', hour)[0]
+
+        for _ in range(5):
+            order = make_order(self.customer, restaurant=self.restaurant, total=Decimal('10.00'), status='preparing')
+            Order.objects.filter(pk=order.pk).update(created_at=placed)
+            event = OrderStatusEvent.objects.create(order=order, from_status='preparing', to_status='ready')
+            OrderStatusEvent.objects.filter(pk=event.pk).update(created_at=placed + timedelta(minutes=5))
+        rebuild_delivery_stats()
+        self.assertNotEqual(eta_table.durations('', hour)[0], default_prep)
+        self.assertAlmostEqual(eta_table.durations('', hour)[0], 300, delta=1)
+
+
+@override_settings(FEASTO_LOGIN_FAILURES_PER_USER=3)
+class LoginTests(FeastoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(None)
+
+    def login(self, password, username='customer'):
+        return self.client.post('/api/auth/token/', {'username': username, 'password': password}, format='json')
+
+    def test_failed_logins_are_throttled_without_hashing(self):
+        for _ in range(3):
+            self.assertEqual(self.login('wrong').status_code, 400)
+        with mock.patch.object(logins, 'check_password', wraps=logins.check_password) as check:
+            response = self.login('secret')
+        self.assertEqual(response.status_code, 429)
+        check.assert_not_called()
+
+    def test_unknown_user_is_hashed_and_counted_like_a_wrong_password(self):
+        failed = []
+
+        def receiver(sender, credentials, **kwargs):
+            failed.append(credentials['username'])
+        user_login_failed.connect(receiver)
+        self.addCleanup(user_login_failed.disconnect, receiver)
+        with mock.patch.object(logins, 'make_password', wraps=logins.make_password) as make:
+            self.assertEqual(self.login('secret', username='nobody').status_code, 400)
+        make.assert_called_once_with('secret')
+        self.assertEqual(failed, ['nobody'])
+        self.assertEqual(cache.get(logins._username_key('nobody')), 1)
+
+    def test_token_login_sends_user_logged_in(self):
+        logged_in = []
+
+        def receiver(sender, user, **kwargs):
+            logged_in.append(user.pk)
+        user_logged_in.connect(receiver)
+        self.addCleanup(user_logged_in.disconnect, receiver)
+        self.assertEqual(self.login('secret').status_code, 200)
+        self.assertEqual(logged_in, [self.customer.pk])
+
+    def test_full_password_queue_answers_503(self):
+        pool = logins.PasswordCheckPool(workers=1, max_queue=0)
+        self.addCleanup(pool._executor.shutdown)
+        release = threading.Event()
+        busy = threading.Thread(target=pool.run, args=(release.wait,))
+        busy.start()
+        try:
+            while pool.snapshot()['running'] == 0:
+                time.sleep(0.01)
+            with mock.patch.object(logins, 'password_pool', pool):
+                response = self.login('secret')
+        finally:
+            release.set()
+            busy.join()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(pool.snapshot()['rejected'], 1)
+
+    def test_password_change_counts_against_the_login_limit(self):
+        self.client.force_authenticate(self.customer)
+        payload = {'old_password': 'wrong', 'new_password': 'changed', 'confirm_password': 'changed'}
+        for _ in range(3):
+            self.assertEqual(self.client.post('/api/auth/change-password/', payload).status_code, 400)
+        payload['old_password'] = 'secret'
+        self.assertEqual(self.client.post('/api/auth/change-password/', payload).status_code, 429)
+        self.customer.refresh_from_db()
+        self.assertTrue(self.customer.check_password('secret'))
+
+
+class TokenTests(FeastoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        user_cache.clear()
+        self.client.force_authenticate(None)
+        response = self.client.post('/api/auth/token/', {'username': 'customer', 'password': 'secret'}, format='json')
+        self.tokens = response.json()
+
+    def refresh(self, token):
+        return self.client.post('/api/auth/token/refresh/', {'refresh': token}, format='json')
+
+    def get_orders(self, access):
+        return self.client.get('/api/orders/', HTTP_AUTHORIZATION=f'Bearer {access}')
+
+    def test_access_token_authenticates(self):
+        self.assertEqual(self.get_orders(self.tokens['access']).status_code, 200)
+        self.assertEqual(self.get_orders(self.tokens['refresh']).status_code, 401)
+
+    def test_refresh_token_works_once(self):
+        response = self.refresh(self.tokens['refresh'])
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.get_orders(response.json()['access']).status_code, 200)
+        self.assertEqual(self.refresh(self.tokens['refresh']).status_code, 401)
+        # Recorded in the database, not a per-process cache
+        cache.clear()
+        self.assertEqual(self.refresh(self.tokens['refresh']).status_code, 401)
+        self.assertEqual(UsedRefreshToken.objects.count(), 1)
+
+    def test_expired_tokens_are_refused_and_their_ids_pruned(self):
+        UsedRefreshToken.objects.create(jti='0' * 32, expires_at=timezone.now() - timedelta(seconds=1))
+        with override_settings(FEASTO_JWT_ACCESS_TTL=-1, FEASTO_JWT_REFRESH_TTL=-1):
+            expired = issue_tokens(self.customer)
+        self.assertEqual(self.get_orders(expired['access']).status_code, 401)
+        self.assertEqual(self.refresh(expired['refresh']).status_code, 401)
+        self.assertEqual(self.refresh(self.tokens['refresh']).status_code, 200)
+        self.assertFalse(UsedRefreshToken.objects.filter(jti='0' * 32).exists())
+
+    def test_logout_and_password_change_retire_refresh_tokens(self):
+        other = self.client.post('/api/auth/token/', {'username': 'customer', 'password': 'secret'}, format='json')
+        self.client.post('/api/auth/logout/', {'refresh': self.tokens['refresh']}, format='json')
+        self.assertEqual(self.refresh(self.tokens['refresh']).status_code, 401)
+        self.customer.set_password('changed')
+        self.customer.save()
+        self.assertEqual(self.refresh(other.json()['refresh']).status_code, 401)
+
+    def test_cached_users_are_copies_dropped_on_save(self):
+        first = user_cache.get(self.customer.pk)
+        first.role = 'admin'
+        self.assertEqual(user_cache.get(self.customer.pk).role, 'customer')
+        with self.assertNumQueries(0):
+            user_cache.get(self.customer.pk)
+        self.customer.is_active = False
+        self.customer.save()
+        self.assertIsNone(user_cache.get(self.customer.pk))
+        self.assertEqual(self.get_orders(self.tokens['access']).status_code, 401)
+
+
+class OrderEventTests(FeastoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.rider = User.objects.create_user('rider', password='secret', role='delivery')
+        self.other_rider = User.objects.create_user('other', password='secret', role='delivery')
+        self.admin = User.objects.create_user('admin', password='secret', role='admin')
+
+    def event(self, status, previous_status, delivery_staff=None, customer=None):
+        order = make_order(
+            customer or self.customer, restaurant=self.restaurant, total=Decimal('10.00'),
+            status=status, delivery_staff=delivery_staff,
+        )
+        return order_event(order, previous_status)
+
+    def test_events_are_filtered_by_role(self):
+        neighbour = User.objects.create_user('neighbour', password='secret', role='customer')
+        mine = self.event('confirmed', 'pending')
+        theirs = self.event('confirmed', 'pending', customer=neighbour)
+        ready = self.event('ready', 'preparing')
+        claimed = self.event('out_for_delivery', 'ready', delivery_staff=self.other_rider)
+        delivered = self.event('delivered', 'out_for_delivery', delivery_staff=self.other_rider)
+        events = [mine, theirs, ready, claimed, delivered]
+
+        def visible(user):
+            return [is_visible_to(event, user) for event in events]
+
+        self.assertEqual(visible(self.customer), [True, False, True, True, True])
+        # Riders follow the claimable pool, including orders leaving it, and their own deliveries
+        self.assertEqual(visible(self.rider), [False, False, True, True, False])
+        self.assertEqual(visible(self.other_rider), [False, False, True, True, True])
+        self.assertEqual(visible(self.admin), [True] * 5)
+
+        elsewhere = Restaurant.objects.create(name='Elsewhere')
+        self.admin.restaurant = elsewhere
+        self.assertFalse(is_visible_to(ready, self.admin))
+
+    def test_status_changes_are_published_after_commit(self):
+        order = make_order(self.customer, [(make_item(self.restaurant), 1)])
+        with mock.patch.object(get_broker(), 'publish') as publish:
+            with self.captureOnCommitCallbacks() as callbacks:
+                transition_order(order, 'confirmed')
+            publish.assert_not_called()
+            for callback in callbacks:
+                callback()
+        event = publish.call_args.args[0]
+        self.assertEqual(
+            (event['order_id'], event['previous_status'], event['status']), (order.pk, 'pending', 'confirmed')
+        )
+
+    def test_stream_needs_a_stream_ticket_in_the_url(self):
+        self.assertEqual(self.client.get('/api/events/orders/', {'ticket': 'bogus'}).status_code, 401)
+        access = issue_tokens(self.rider)['access']
+        self.assertEqual(self.client.get('/api/events/orders/', {'ticket': access}).status_code, 401)
+        self.assertEqual(self.client.get('/api/events/orders/', {'access_token': access}).status_code, 401)
+        self.client.force_authenticate(self.rider)
+        response = self.client.post('/api/events/orders/ticket/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['expires_in'], settings.FEASTO_EVENT_TICKET_TTL)
+        # A stream ticket is not an access token
+        self.assertEqual(self.get_with_bearer('/api/orders/', response.data['ticket']).status_code, 401)
+
+    def get_with_bearer(self, path, token):
+        self.client.force_authenticate(None)
+        return self.client.get(path, HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    async def test_rider_stream_carries_only_visible_events(self):
+        ticket = await asyncio.to_thread(issue_stream_ticket, self.rider)
+        response = await AsyncClient().get('/api/events/orders/', {'ticket': ticket})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = aiter(response.streaming_content)
+        self.assertIn(b': connected', await anext(chunks))
+
+        hidden = {'type': 'order.updated', 'order_id': 1, 'restaurant_id': self.restaurant.pk,
+                  'status': 'delivered', 'previous_status': 'out_for_delivery',
+                  'customer_id': self.customer.pk, 'delivery_staff_id': self.other_rider.pk}
+        shown = {**hidden, 'order_id': 2, 'status': 'ready', 'previous_status': 'preparing',
+                 'delivery_staff_id': None}
+        get_broker().publish(hidden)
+        get_broker().publish(shown)
+        chunk = (await asyncio.wait_for(anext(chunks), timeout=5)).decode()
+        await chunks.aclose()
+        self.assertTrue(chunk.startswith('event: order.updated\n'))
+        self.assertEqual(json.loads(chunk.split('data: ', 1)[1])['order_id'], 2)
+
+
+class BenchIndexesTests(TransactionTestCase):
+
+    def index_names(self):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, Order._meta.db_table)
+        return {name for name, info in constraints.items() if info['index']}
+
+    def test_refuses_a_database_with_data(self):
+        Restaurant.objects.create(name='Live Kitchen')
+        with self.assertRaisesMessage(CommandError, 'is not empty'):
+            call_command('bench_indexes', database='default', stdout=io.StringIO())
+
+    def test_indexes_are_restored_when_the_run_fails(self):
+        before = self.index_names()
+        with mock.patch(
+            'api.management.commands.bench_indexes.Command.measure', side_effect=KeyboardInterrupt
+        ):
+            with self.assertRaises(KeyboardInterrupt):
+                call_command('bench_indexes', database='default', orders=20, stdout=io.StringIO())
+        self.assertEqual(self.index_names(), before)
+        self.assertFalse(Order.objects.exists())
+
+    def test_benchmark_leaves_the_schema_as_it_found_it(self):
+        before = self.index_names()
+        call_command('bench_indexes', database='default', orders=20, runs=1, stdout=io.StringIO())
+        self.assertEqual(self.index_names(), before)
+        self.assertFalse(Restaurant.objects.exists())
@@ -0,0 +1,186 @@
+"""
+Live rider location tracking.
+
+Pings posted by delivery staff go into a fixed-size ring buffer per rider
+(parallel arrays of doubles, no object per ping) and into a pending batch that
+is written to RiderLocation with a single bulk_create once it is large, or by
+a background thread every flush_interval seconds. Each rider's latest position
+is also filed in a grid of ~1 km cells, so "riders near a point" only looks at
+the cells around it.
+
+Like the default event broker, the tracker lives in the process that received
+the pings; lookups for riders it has not seen fall back to the table.
+"""
+import atexit
+import logging
+import math
+import threading
+import time
+from array import array
+from collections import namedtuple
+from datetime import datetime, timezone as dt_timezone
+from django.db import connection
+from .models import RiderLocation
+
+logger = logging.getLogger(__name__)
+
+RiderPosition = namedtuple('RiderPosition', ['rider_id', 'latitude', 'longitude', 'timestamp', 'distance_km'])
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.32
+
+
+def distance_km(lat1, lng1, lat2, lng2):
+    """Great-circle (haversine) distance between two points"""
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+class RiderTrack:
+    """Ring buffer of a rider's most recent pings"""
+    __slots__ = ('latitudes', 'longitudes', 'timestamps', 'size', 'head', 'cell')
+
+    def __init__(self, capacity):
+        self.latitudes = array('d', [0.0]) * capacity
+        self.longitudes = array('d', [0.0]) * capacity
+        self.timestamps = array('d', [0.0]) * capacity
+        self.size = 0
+        self.head = 0
+        self.cell = None
+
+    def append(self, latitude, longitude, timestamp):
+        self.latitudes[self.head] = latitude
+        self.longitudes[self.head] = longitude
+        self.timestamps[self.head] = timestamp
+        self.head = (self.head + 1) % len(self.timestamps)
+        self.size = min(self.size + 1, len(self.timestamps))
+
+    def latest(self):
+        """(latitude, longitude, timestamp) of the newest ping, or None"""
+        if not self.size:
+            return None
+        index = self.head - 1
+        return self.latitudes[index], self.longitudes[index], self.timestamps[index]
+
+
+class RiderTracker:
+    """Per-rider ring buffers, a grid index of latest positions and a write-behind batch"""
+
+    def __init__(self, ring_size=120, cell_degrees=0.01, flush_size=500, flush_interval=10, active_window=300):
+        self.ring_size = ring_size
+        self.cell_degrees = cell_degrees
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        # Riders silent for longer than this drop out of nearby() results
+        self.active_window = active_window
+        self._lock = threading.Lock()
+        self._tracks = {}
+        self._cells = {}
+        self._pending = []
+        self._flushed_at = time.monotonic()
+        self._flusher = None
+
+    def cell_of(self, latitude, longitude):
+        return math.floor(latitude / self.cell_degrees), math.floor(longitude / self.cell_degrees)
+
+    def record(self, rider_id, pings):
+        """Add (latitude, longitude, timestamp) pings for a rider, flushing the batch when due"""
+        pings = sorted(pings, key=lambda ping: ping[2])
+        with self._lock:
+            track = self._tracks.get(rider_id)
+            if track is None:
+                track = self._tracks[rider_id] = RiderTrack(self.ring_size)
+            newest = track.latest()
+            for latitude, longitude, timestamp in pings:
+                # Late pings are still stored, but never rewind the live position
+                if newest is None or timestamp >= newest[2]:
+                    track.append(latitude, longitude, timestamp)
+            self._move(rider_id, track)
+            self._pending.extend((rider_id, *ping) for ping in pings)
+            due = len(self._pending) >= self.flush_size or time.monotonic() - self._flushed_at >= self.flush_interval
+            if self._flusher is None:
+                self._flusher = threading.Thread(
+                    target=self._flush_periodically, name='rider-tracker-flush', daemon=True
+                )
+                self._flusher.start()
+        if due:
+            self.flush()
+
+    def _flush_periodically(self):
+        # Writes the last pings of riders who stop posting, which record() alone would hold forever
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                if time.monotonic() - self._flushed_at >= self.flush_interval:
+                    self.flush()
+            except Exception:
+                logger.exception('Could not write rider locations')
+            finally:
+                # The connection belongs to this thread, which sleeps between flushes
+                connection.close()
+
+    def _move(self, rider_id, track):
+        cell = self.cell_of(*track.latest()[:2])
+        if cell == track.cell:
+            return
+        if track.cell is not None:
+            riders = self._cells[track.cell]
+            riders.discard(rider_id)
+            if not riders:
+                del self._cells[track.cell]
+        self._cells.setdefault(cell, set()).add(rider_id)
+        track.cell = cell
+
+    def flush(self):
+        """Write the pending pings to RiderLocation in one batch; returns the number written"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            self._flushed_at = time.monotonic()
+        if not pending:
+            return 0
+        RiderLocation.objects.bulk_create([
+            RiderLocation(
+                rider_id=rider_id,
+                latitude=latitude,
+                longitude=longitude,
+                recorded_at=datetime.fromtimestamp(timestamp, dt_timezone.utc),
+            )
+            for rider_id, latitude, longitude, timestamp in pending
+        ], batch_size=self.flush_size)
+        return len(pending)
+
+    def position(self, rider_id):
+        """Latest known position of a rider from this process, or None"""
+        track = self._tracks.get(rider_id)
+        latest = track.latest() if track is not None else None
+        if latest is None:
+            return None
+        return RiderPosition(rider_id, *latest, None)
+
+    def nearby(self, latitude, longitude, radius_km, limit=None):
+        """Active riders within radius_km of a point, nearest first"""
+        lat_cells = math.ceil(radius_km / KM_PER_DEGREE / self.cell_degrees)
+        lng_scale = max(math.cos(math.radians(latitude)), 0.01)
+        lng_cells = math.ceil(radius_km / (KM_PER_DEGREE * lng_scale) / self.cell_degrees)
+        center_lat, center_lng = self.cell_of(latitude, longitude)
+        cutoff = time.time() - self.active_window
+
+        found = []
+        with self._lock:
+            for cell_lat in range(center_lat - lat_cells, center_lat + lat_cells + 1):
+                for cell_lng in range(center_lng - lng_cells, center_lng + lng_cells + 1):
+                    for rider_id in self._cells.get((cell_lat, cell_lng), ()):
+                        rider_lat, rider_lng, timestamp = self._tracks[rider_id].latest()
+                        if timestamp < cutoff:
+                            continue
+                        distance = distance_km(latitude, longitude, rider_lat, rider_lng)
+                        if distance <= radius_km:
+                            found.append(RiderPosition(rider_id, rider_lat, rider_lng, timestamp, distance))
+        found.sort(key=lambda position: position.distance_km)
+        return found[:limit] if limit else found
+
+
+rider_tracker = RiderTracker()
+# Don't lose the last partial batch on a clean shutdown
+atexit.register(rider_tracker.flush)
@@ -1,10 +1,11 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import async_views, views
 
 # Create router for ViewSets
 router = DefaultRouter()
 router.register(r'users', views.UserViewSet, basename='user')
+router.register(r'restaurants', views.RestaurantViewSet, basename='restaurant')
 router.register(r'food', views.FoodItemViewSet, basename='fooditem')
 router.register(r'orders', views.OrderViewSet, basename='order')
 router.register(r'enquiries', views.CustomerEnquiryViewSet, basename='enquiry')
@@ -15,10 +16,35 @@ urlpatterns = [
     path('auth/login/', views.login_view, name='login'),
     path('auth/logout/', views.logout_view, name='logout'),
     path('auth/change-password/', views.change_password_view, name='change-password'),
+    path('auth/token/', views.token_obtain_view, name='token-obtain'),
+    path('auth/token/refresh/', views.token_refresh_view, name='token-refresh'),
     
     # Dashboard stats
     path('dashboard/stats/', views.dashboard_stats, name='dashboard-stats'),
     
+    # Sales analytics
+    path('analytics/sales/', views.sales_analytics, name='sales-analytics'),
+    
+    # Rider tracking
+    path('tracking/pings/', views.rider_pings, name='rider-pings'),
+    path('tracking/nearby/', views.riders_nearby, name='riders-nearby'),
+    
+    # Menu images (resized variants and downloaded image_url copies)
+    path('images/<str:name>', views.image_file, name='image-file'),
+    
+    # Async read endpoints (serve with ASGI)
+    path('async/food/', async_views.menu_list, name='async-food-list'),
+    path('async/orders/', async_views.order_list, name='async-order-list'),
+    path('async/orders/<int:pk>/', async_views.order_detail, name='async-order-detail'),
+    path('async/dashboard/stats/', async_views.dashboard_stats, name='async-dashboard-stats'),
+    
+    # Order event stream (Server-Sent Events, serve with ASGI)
+    path('events/orders/', views.order_events, name='order-events'),
+    path('events/orders/ticket/', views.order_events_ticket, name='order-events-ticket'),
+    
+    # Request metrics
+    path('metrics/', views.request_metrics, name='request-metrics'),
+    
     # Include router URLs
     path('', include(router.urls)),
 ]
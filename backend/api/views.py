@@ -1,15 +1,54 @@
 from rest_framework import viewsets, status
-from rest_framework.decorators import api_view, action
+from rest_framework.decorators import api_view, action, authentication_classes, renderer_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
+from rest_framework.renderers import JSONRenderer
 from django.contrib.auth import login, logout
+from django.contrib.auth.signals import user_logged_in
+import asyncio
+import json
+import mimetypes
+import re
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, JsonResponse, StreamingHttpResponse
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce, Trunc
 from django.utils import timezone
-from .models import User, FoodItem, Order, OrderItem, CustomerEnquiry
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.http import http_date
+from .models import (
+    User, Restaurant, FoodItem, Order, OrderItem, CustomerEnquiry, OrderStatusEvent,
+    OrderStatusRollup, SalesRollup, ItemSalesRollup, RiderLocation
+)
+from .authentication import (
+    InvalidToken, bearer_token, decode_token, issue_stream_ticket, issue_tokens, refresh_tokens, revoke_refresh_token,
+    user_from_token,
+)
+from .cache import (
+    DASHBOARD_STATS_KEY, DASHBOARD_STATS_TTL, MENU_CACHE_TTL,
+    cached, get_menu_version, menu_cache_key
+)
+from .events import get_broker, is_visible_to
+from .images import VARIANT_DIR
+from .inventory import low_stock
+from .logins import confirm_password, password_pool
+from .metrics import PrometheusRenderer, registry
+from .orders import (
+    InvalidTransition, assign_order, claim_next_order, claim_order, claimable_filters, transition_order
+)
+from .pagination import CreatedAtCursorPagination
+from .search import menu_search
 from .serializers import (
     UserSerializer, UserRegistrationSerializer, LoginSerializer,
-    ChangePasswordSerializer, FoodItemSerializer, OrderSerializer,
-    OrderCreateSerializer, CustomerEnquirySerializer
+    ChangePasswordSerializer, RestaurantSerializer, FoodItemSerializer, OrderSerializer,
+    OrderListSerializer, OrderCreateSerializer, OrderStatusEventSerializer,
+    RiderPingSerializer, CustomerEnquirySerializer
 )
+from .tracking import rider_tracker
 
 
 # Authentication Views
@@ -29,7 +68,7 @@ def register_view(request):
 @api_view(['POST'])
 def login_view(request):
     """Login user"""
-    serializer = LoginSerializer(data=request.data)
+    serializer = LoginSerializer(data=request.data, context={'request': request})
     if serializer.is_valid():
         user = serializer.validated_data['user']
         login(request, user)
@@ -42,11 +81,44 @@ def login_view(request):
 
 @api_view(['POST'])
 def logout_view(request):
-    """Logout user"""
+    """Logout user, revoking the refresh token if one is sent"""
     logout(request)
+    refresh = request.data.get('refresh')
+    if refresh:
+        try:
+            revoke_refresh_token(decode_token(refresh, 'refresh'))
+        except InvalidToken:
+            pass
     return Response({'message': 'Logout successful'}, status=status.HTTP_200_OK)
 
 
+@api_view(['POST'])
+@authentication_classes([])
+def token_obtain_view(request):
+    """Issue an access and refresh token pair without starting a session"""
+    serializer = LoginSerializer(data=request.data, context={'request': request})
+    if serializer.is_valid():
+        user = serializer.validated_data['user']
+        # login() sends this for session logins
+        user_logged_in.send(sender=user.__class__, request=request, user=user)
+        return Response({
+            **issue_tokens(user),
+            'user': UserSerializer(user).data
+        }, status=status.HTTP_200_OK)
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['POST'])
+@authentication_classes([])
+def token_refresh_view(request):
+    """Trade a refresh token for a new token pair"""
+    try:
+        _, tokens = refresh_tokens(request.data.get('refresh', ''))
+    except InvalidToken as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_401_UNAUTHORIZED)
+    return Response(tokens, status=status.HTTP_200_OK)
+
+
 @api_view(['POST'])
 def change_password_view(request):
     """Change user password"""
@@ -55,10 +127,10 @@ def change_password_view(request):
     
     serializer = ChangePasswordSerializer(data=request.data)
     if serializer.is_valid():
-        if not request.user.check_password(serializer.validated_data['old_password']):
+        if not confirm_password(request.user, serializer.validated_data['old_password'], request):
             return Response({'error': 'Invalid old password'}, status=status.HTTP_400_BAD_REQUEST)
         
-        request.user.set_password(serializer.validated_data['new_password'])
+        password_pool.run(request.user.set_password, serializer.validated_data['new_password'])
         request.user.save()
         return Response({'message': 'Password changed successfully'}, status=status.HTTP_200_OK)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -69,6 +141,7 @@ class UserViewSet(viewsets.ModelViewSet):
     """ViewSet for User model"""
     queryset = User.objects.all()
     serializer_class = UserSerializer
+    pagination_class = CreatedAtCursorPagination
     
     def get_permissions(self):
         if self.action in ['list', 'destroy']:
@@ -80,6 +153,36 @@ class UserViewSet(viewsets.ModelViewSet):
         return [permission() for permission in permission_classes]
 
 
+# Restaurant ViewSet
+class RestaurantViewSet(viewsets.ModelViewSet):
+    """ViewSet for Restaurant model"""
+    queryset = Restaurant.objects.all()
+    serializer_class = RestaurantSerializer
+    
+    def get_permissions(self):
+        if self.action in ['list', 'retrieve']:
+            permission_classes = [AllowAny]
+        else:
+            permission_classes = [IsAuthenticated]
+        return [permission() for permission in permission_classes]
+    
+    def check_permissions(self, request):
+        super().check_permissions(request)
+        if self.action in ['list', 'retrieve']:
+            return
+        # Restaurant admins manage their own restaurant; only global admins add new ones
+        if request.user.role != 'admin' or (self.action == 'create' and request.user.restaurant_id):
+            self.permission_denied(request, message='Admin access required')
+    
+    def get_queryset(self):
+        queryset = Restaurant.objects.all()
+        if self.action == 'list':
+            return queryset.filter(is_active=True)
+        if self.action != 'retrieve' and self.request.user.restaurant_id:
+            return queryset.filter(id=self.request.user.restaurant_id)
+        return queryset
+
+
 # Food Item ViewSet
 class FoodItemViewSet(viewsets.ModelViewSet):
     """ViewSet for FoodItem model"""
@@ -88,26 +191,131 @@ class FoodItemViewSet(viewsets.ModelViewSet):
     permission_classes = [AllowAny]  # Allow all for development
     
     def get_queryset(self):
-        queryset = FoodItem.objects.all()
-        available = self.request.query_params.get('available', None)
-        if available is not None:
-            queryset = queryset.filter(available=available.lower() == 'true')
-        category = self.request.query_params.get('category', None)
-        if category:
-            queryset = queryset.filter(category=category)
+        queryset = filter_menu(FoodItem.objects.all(), self.request.query_params)
+        user = self.request.user
+        if self.action not in ('list', 'retrieve') and user.is_authenticated and user.restaurant_id:
+            # Restaurant staff can only change their own menu
+            queryset = queryset.filter(restaurant_id=user.restaurant_id)
         return queryset
+    
+    def list(self, request, *args, **kwargs):
+        """List the menu, served from cache and revalidated with ETag/Last-Modified"""
+        version, last_modified = get_menu_version(menu_restaurant(request.query_params))
+        key = menu_cache_key(version, request, request.query_params, request.accepted_renderer.format)
+        etag = f'"{key.rsplit(":", 1)[-1]}"'
+        
+        not_modified = get_conditional_response(request, etag=etag, last_modified=int(last_modified))
+        if not_modified is None:
+            list_view = super().list
+            data = cached(key, lambda: list_view(request, *args, **kwargs).data, MENU_CACHE_TTL)
+            response = Response(data)
+        else:
+            response = not_modified
+        
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, no_cache=True)
+        return response
+    
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Search the menu by name, category and description, best matches first"""
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({'error': 'q is required'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(int(request.query_params.get('limit', 20)), 100)
+        except ValueError:
+            return Response({'error': 'Invalid limit'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        available = request.query_params.get('available', None)
+        hits = menu_search.search(
+            query,
+            category=request.query_params.get('category') or None,
+            available=None if available is None else available.lower() == 'true',
+            restaurant_id=menu_restaurant(request.query_params),
+        )
+        items = FoodItem.objects.in_bulk([hit.id for hit in hits[:limit]])
+        results = []
+        for hit in hits[:limit]:
+            # Skip items deleted since the index was built
+            if hit.id in items:
+                data = self.get_serializer(items[hit.id]).data
+                data['score'] = round(hit.score, 3)
+                results.append(data)
+        return Response({'count': len(hits), 'results': results}, status=status.HTTP_200_OK)
+    
+    @action(detail=False, methods=['get'])
+    def low_stock(self, request):
+        """Get items with at most threshold portions left, fewest first (admin report)"""
+        if not request.user.is_authenticated or request.user.role != 'admin':
+            return Response({'error': 'Admin access required'}, status=status.HTTP_403_FORBIDDEN)
+        try:
+            threshold = int(request.query_params.get('threshold', settings.FEASTO_LOW_STOCK_THRESHOLD))
+        except ValueError:
+            return Response({'error': 'Invalid threshold'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        restaurant_id = request.user.restaurant_id or menu_restaurant(request.query_params)
+        items = low_stock(threshold, restaurant_id)
+        return Response({
+            'threshold': threshold,
+            'results': self.get_serializer(items, many=True).data,
+        }, status=status.HTTP_200_OK)
+
+
+def menu_restaurant(params):
+    """Restaurant id of a menu request, or None for the combined menu"""
+    restaurant = params.get('restaurant', '')
+    return int(restaurant) if restaurant.isdigit() else None
+
+
+def filter_menu(queryset, params):
+    """Apply the menu's restaurant, available and category query parameters"""
+    if params.get('restaurant'):
+        restaurant_id = menu_restaurant(params)
+        if restaurant_id is None:
+            return queryset.none()
+        queryset = queryset.filter(restaurant_id=restaurant_id)
+    available = params.get('available', None)
+    if available is not None:
+        queryset = queryset.filter(available=available.lower() == 'true')
+    category = params.get('category', None)
+    if category:
+        queryset = queryset.filter(category=category)
+    return queryset
+
+
+def orders_visible_to(user, queryset):
+    """Limit orders to the ones the user's role and restaurant may see"""
+    if user.role == 'customer':
+        return queryset.filter(customer=user)
+    if user.restaurant_id:
+        queryset = queryset.filter(restaurant_id=user.restaurant_id)
+    if user.role == 'delivery':
+        return queryset.filter(delivery_staff=user) | queryset.filter(status='ready')
+    # Admins see all orders of their restaurant, or of every restaurant
+    return queryset
 
 
 # Order ViewSet
 class OrderViewSet(viewsets.ModelViewSet):
     """ViewSet for Order model"""
     queryset = Order.objects.all()
+    pagination_class = CreatedAtCursorPagination
+    lookup_value_regex = r'\d+'
+    batch_max_size = 100
     
     def get_serializer_class(self):
-        if self.action == 'create':
+        if self.action in ['create', 'batch']:
             return OrderCreateSerializer
+        if self.is_lean_list():
+            return OrderListSerializer
         return OrderSerializer
     
+    def is_lean_list(self):
+        """Lists use the compact representation unless ?expand= asks for nested details"""
+        return self.action == 'list' and not self.request.query_params.get('expand')
+    
     def get_permissions(self):
         if self.action in ['list', 'update', 'partial_update']:
             permission_classes = [IsAuthenticated]
@@ -118,22 +326,82 @@ class OrderViewSet(viewsets.ModelViewSet):
         return [permission() for permission in permission_classes]
     
     def get_queryset(self):
-        queryset = Order.objects.all()
-        user = self.request.user
-        
         # Filter based on user role
-        if user.role == 'customer':
-            queryset = queryset.filter(customer=user)
-        elif user.role == 'delivery':
-            queryset = queryset.filter(delivery_staff=user) | queryset.filter(status='ready')
-        # Admins see all orders
+        queryset = orders_visible_to(self.request.user, Order.objects.all())
         
         # Filter by status
         status_param = self.request.query_params.get('status', None)
         if status_param:
             queryset = queryset.filter(status=status_param)
         
-        return queryset.select_related('customer', 'delivery_staff').prefetch_related('items')
+        queryset = queryset.select_related('customer', 'delivery_staff')
+        if self.is_lean_list():
+            return with_item_count(queryset)
+        return queryset.prefetch_related('items')
+    
+    @action(detail=False, methods=['get'])
+    def work_queue(self, request):
+        """Get the delivery user's active deliveries and the claimable ready orders"""
+        if request.user.role != 'delivery':
+            return Response({'error': 'Delivery staff access required'}, status=status.HTTP_403_FORBIDDEN)
+        
+        since = None
+        if request.query_params.get('since'):
+            since = parse_datetime(request.query_params['since'])
+            if since is None:
+                return Response({'error': 'Invalid since'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(int(request.query_params.get('limit', 50)), 200)
+        except ValueError:
+            return Response({'error': 'Invalid limit'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # updated_at is stamped before commit, so a row can become visible after a later
+        # read; stepping the watermark back re-sends recent changes, which clients dedupe by id
+        watermark = timezone.now() - timedelta(seconds=settings.FEASTO_WORK_QUEUE_OVERLAP)
+        orders = with_item_count(Order.objects.select_related('customer', 'delivery_staff'))
+        claimable = Order.objects.filter(status='ready', **claimable_filters(request.user))
+        
+        # Two separate predicates, each served by its own index, instead of one OR
+        if since is None:
+            active = orders.filter(delivery_staff=request.user, status='out_for_delivery')
+            claimable_orders = orders.filter(status='ready', **claimable_filters(request.user))
+            ordering = ('created_at',)
+        else:
+            # Includes orders that left 'out_for_delivery' so the client can drop them.
+            # >= re-sends rows stamped exactly at the watermark rather than skipping ties
+            active = orders.filter(delivery_staff=request.user, updated_at__gte=since)
+            claimable_orders = orders.filter(
+                status='ready', updated_at__gte=since, **claimable_filters(request.user)
+            )
+            # Oldest changes first, so a full page ends where the next poll picks up
+            ordering = ('updated_at', 'id')
+        active = list(active.order_by(*ordering)[:limit])
+        claimable_orders = list(claimable_orders.order_by(*ordering)[:limit])
+        
+        has_more = False
+        if since is not None:
+            for page in (active, claimable_orders):
+                if len(page) == limit:
+                    # Changes after the last row were not sent; resume from it
+                    has_more = True
+                    watermark = min(watermark, page[-1].updated_at)
+        
+        return Response({
+            'watermark': watermark,
+            'has_more': has_more,
+            'active': OrderListSerializer(active, many=True).data,
+            'claimable': OrderListSerializer(claimable_orders, many=True).data,
+            # Lets the client drop orders that were claimed by someone else since the last poll
+            'claimable_ids': list(claimable.order_by('created_at').values_list('id', flat=True)[:limit]),
+        }, status=status.HTTP_200_OK)
+    
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """Create many orders in a single request"""
+        serializer = self.get_serializer(data=request.data, many=True, max_length=self.batch_max_size)
+        serializer.is_valid(raise_exception=True)
+        orders = serializer.save()
+        return Response(OrderSerializer(orders, many=True).data, status=status.HTTP_201_CREATED)
     
     @action(detail=True, methods=['post'])
     def update_status(self, request, pk=None):
@@ -143,28 +411,113 @@ class OrderViewSet(viewsets.ModelViewSet):
         
         if new_status not in dict(Order.STATUS_CHOICES):
             return Response({'error': 'Invalid status'}, status=status.HTTP_400_BAD_REQUEST)
+        if request.user.role == 'customer' and new_status != 'cancelled':
+            return Response({'error': 'Customers can only cancel orders'}, status=status.HTTP_403_FORBIDDEN)
         
-        order.status = new_status
-        if new_status == 'delivered':
-            order.delivered_at = timezone.now()
-        order.save()
+        try:
+            updated = transition_order(order, new_status, actor=request.user)
+        except InvalidTransition as exc:
+            return Response({
+                'error': str(exc),
+                'allowed': Order.STATUS_TRANSITIONS[order.status],
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if updated is None:
+            return Response({'error': 'Order was changed by someone else'}, status=status.HTTP_409_CONFLICT)
         
-        return Response(OrderSerializer(order).data, status=status.HTTP_200_OK)
+        return Response(OrderSerializer(updated).data, status=status.HTTP_200_OK)
     
     @action(detail=True, methods=['post'])
     def assign_delivery(self, request, pk=None):
         """Assign delivery staff to order"""
+        if request.user.role != 'admin':
+            return Response({'error': 'Admin access required'}, status=status.HTTP_403_FORBIDDEN)
         order = self.get_object()
         staff_id = request.data.get('delivery_staff_id')
         
         try:
             staff = User.objects.get(id=staff_id, role='delivery')
-            order.delivery_staff = staff
-            order.status = 'out_for_delivery'
-            order.save()
-            return Response(OrderSerializer(order).data, status=status.HTTP_200_OK)
-        except User.DoesNotExist:
+        except (User.DoesNotExist, ValueError):
             return Response({'error': 'Invalid delivery staff'}, status=status.HTTP_400_BAD_REQUEST)
+        if staff.restaurant_id and staff.restaurant_id != order.restaurant_id:
+            return Response({'error': 'Delivery staff works for another restaurant'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            updated = assign_order(order, staff, actor=request.user)
+        except InvalidTransition as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        if updated is None:
+            return Response({'error': 'Order was changed by someone else'}, status=status.HTTP_409_CONFLICT)
+        return Response(OrderSerializer(updated).data, status=status.HTTP_200_OK)
+    
+    @action(detail=True, methods=['get'])
+    def history(self, request, pk=None):
+        """Get the status change log of an order"""
+        order = self.get_object()
+        events = order.status_events.all()
+        return Response(OrderStatusEventSerializer(events, many=True).data, status=status.HTTP_200_OK)
+    
+    @action(detail=False, methods=['get'])
+    def status_events(self, request):
+        """Get status changes across all orders after an event id (admin feed)"""
+        if request.user.role != 'admin':
+            return Response({'error': 'Admin access required'}, status=status.HTTP_403_FORBIDDEN)
+        
+        try:
+            after = int(request.query_params.get('after', 0))
+            limit = min(int(request.query_params.get('limit', 100)), 1000)
+        except ValueError:
+            return Response({'error': 'Invalid after or limit'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        events = OrderStatusEvent.objects.filter(id__gt=after)
+        if request.user.restaurant_id:
+            events = events.filter(order__restaurant_id=request.user.restaurant_id)
+        events = list(events.order_by('id')[:limit])
+        return Response({
+            'next_after': events[-1].id if events else after,
+            'results': OrderStatusEventSerializer(events, many=True).data,
+        }, status=status.HTTP_200_OK)
+    
+    @action(detail=True, methods=['post'])
+    def claim(self, request, pk=None):
+        """Claim a ready order for the current delivery user"""
+        if request.user.role != 'delivery':
+            return Response({'error': 'Delivery staff access required'}, status=status.HTTP_403_FORBIDDEN)
+        
+        order = claim_order(pk, request.user)
+        if order is None:
+            return Response({'error': 'Order is no longer available'}, status=status.HTTP_409_CONFLICT)
+        return Response(OrderSerializer(order).data, status=status.HTTP_200_OK)
+    
+    @action(detail=False, methods=['post'])
+    def claim_next(self, request):
+        """Claim the oldest ready order for the current delivery user"""
+        if request.user.role != 'delivery':
+            return Response({'error': 'Delivery staff access required'}, status=status.HTTP_403_FORBIDDEN)
+        
+        order = claim_next_order(request.user)
+        if order is None:
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        return Response(OrderSerializer(order).data, status=status.HTTP_200_OK)
+    
+    @action(detail=True, methods=['get'])
+    def rider_location(self, request, pk=None):
+        """Get the latest position of the rider delivering an order"""
+        order = self.get_object()
+        if order.delivery_staff_id is None:
+            return Response({'error': 'No rider assigned'}, status=status.HTTP_404_NOT_FOUND)
+        
+        position = rider_position(order.delivery_staff_id)
+        if position is None:
+            return Response({'error': 'Rider location unknown'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(position, status=status.HTTP_200_OK)
+
+
+def with_item_count(queryset):
+    """Annotate orders with item_count using a per-row subquery instead of a GROUP BY"""
+    item_count = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order').annotate(
+        count=Count('id')
+    ).values('count')
+    return queryset.annotate(item_count=Coalesce(Subquery(item_count, output_field=IntegerField()), 0))
 
 
 # Customer Enquiry ViewSet
@@ -172,6 +525,7 @@ class CustomerEnquiryViewSet(viewsets.ModelViewSet):
     """ViewSet for CustomerEnquiry model"""
     queryset = CustomerEnquiry.objects.all().order_by('-created_at')
     serializer_class = CustomerEnquirySerializer
+    pagination_class = CreatedAtCursorPagination
     permission_classes = [AllowAny]  # Allow all for development
 
 
@@ -182,14 +536,312 @@ def dashboard_stats(request):
     if not request.user.is_authenticated or request.user.role != 'admin':
         return Response({'error': 'Admin access required'}, status=status.HTTP_403_FORBIDDEN)
     
-    total_orders = Order.objects.count()
-    pending_orders = Order.objects.filter(status='pending').count()
-    total_customers = User.objects.filter(role='customer').count()
-    total_revenue = sum(order.total for order in Order.objects.filter(status='delivered'))
+    return Response(cached(DASHBOARD_STATS_KEY, _dashboard_stats, DASHBOARD_STATS_TTL), status=status.HTTP_200_OK)
+
+
+# One aggregate over the per-status rollup (a handful of rows) instead of the orders table
+DASHBOARD_ROLLUP_AGGREGATES = {
+    'total_orders': Sum('order_count', default=0),
+    'pending_orders': Sum('order_count', filter=Q(status='pending'), default=0),
+    'total_revenue': Sum('revenue', filter=Q(status='delivered'), default=0),
+}
+
+
+def dashboard_payload(stats, total_customers):
+    return {
+        'total_orders': stats['total_orders'],
+        'pending_orders': stats['pending_orders'],
+        'total_customers': total_customers,
+        'total_revenue': float(stats['total_revenue']),
+    }
+
+
+def _dashboard_stats():
+    stats = OrderStatusRollup.objects.aggregate(**DASHBOARD_ROLLUP_AGGREGATES)
+    return dashboard_payload(stats, User.objects.filter(role='customer').count())
+
+
+# Sales Analytics View
+ANALYTICS_BUCKETS = ('hour', 'day', 'week')
+
+
+def _query_date(request, name):
+    """Date query parameter name as a date, None if absent; raises ValueError(name) if malformed"""
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        # Well formed but not a real date, e.g. 2024-02-30
+        parsed = None
+    if parsed is None:
+        raise ValueError(name)
+    return parsed
+
+
+@api_view(['GET'])
+def sales_analytics(request):
+    """Get revenue, order count, average basket and top items per time bucket"""
+    if not request.user.is_authenticated or request.user.role != 'admin':
+        return Response({'error': 'Admin access required'}, status=status.HTTP_403_FORBIDDEN)
+    
+    bucket = request.query_params.get('bucket', 'day')
+    if bucket not in ANALYTICS_BUCKETS:
+        return Response({'error': 'Invalid bucket'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    today = timezone.now().date()
+    try:
+        start = _query_date(request, 'start') or today - timedelta(days=30)
+        end = _query_date(request, 'end') or today
+    except ValueError as exc:
+        return Response({'error': f'Invalid {exc}'}, status=status.HTTP_400_BAD_REQUEST)
+    if start > end:
+        return Response({'error': 'start is after end'}, status=status.HTTP_400_BAD_REQUEST)
+    category = request.query_params.get('category', '')
+    payment_method = request.query_params.get('payment_method', None)
+    if payment_method and payment_method not in dict(Order.PAYMENT_METHOD_CHOICES):
+        return Response({'error': 'Invalid payment_method'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        top = int(request.query_params.get('top', 5))
+    except ValueError:
+        return Response({'error': 'Invalid top'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    # Rollup rows are keyed by hour; the requested bucket is aggregated in the database
+    filters = {
+        'hour__gte': timezone.make_aware(datetime.combine(start, time.min)),
+        'hour__lt': timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min)),
+    }
+    if payment_method:
+        filters['payment_method'] = payment_method
+    period = Trunc('hour', bucket)
+    
+    totals = SalesRollup.objects.filter(category=category, **filters).annotate(
+        period=period
+    ).values('period').annotate(
+        order_count=Sum('order_count'), revenue=Sum('revenue')
+    ).order_by('period')
+    
+    items = ItemSalesRollup.objects.filter(**filters)
+    if category:
+        items = items.filter(category=category)
+    items = items.annotate(period=period).values(
+        'period', 'food_item', 'food_item__name'
+    ).annotate(
+        quantity=Sum('quantity'), revenue=Sum('revenue')
+    ).order_by('period', '-quantity', '-revenue')
+    
+    top_items = {}
+    for row in items:
+        period_items = top_items.setdefault(row['period'], [])
+        if len(period_items) < top and row['quantity'] > 0:
+            period_items.append({
+                'food_item': row['food_item'],
+                'name': row['food_item__name'],
+                'quantity': row['quantity'],
+                'revenue': float(row['revenue']),
+            })
+    
+    results = []
+    for row in totals:
+        if not row['order_count']:
+            continue
+        results.append({
+            'period': row['period'],
+            'order_count': row['order_count'],
+            'revenue': float(row['revenue']),
+            'average_basket': float(row['revenue'] / row['order_count']),
+            'top_items': top_items.get(row['period'], []),
+        })
+    
+    return Response({'bucket': bucket, 'results': results}, status=status.HTTP_200_OK)
+
+
+# Rider Tracking Views
+RIDER_PING_BATCH_SIZE = 500
+NEARBY_MAX_RADIUS_KM = 20
+
+
+def rider_position(rider_id):
+    """Latest position of a rider, from the live tracker or else the stored pings"""
+    position = rider_tracker.position(rider_id)
+    if position is not None:
+        return {
+            'rider': rider_id,
+            'latitude': position.latitude,
+            'longitude': position.longitude,
+            'recorded_at': datetime.fromtimestamp(position.timestamp, dt_timezone.utc),
+        }
+    # Pings for this rider went to another worker, or predate a restart
+    location = RiderLocation.objects.filter(rider_id=rider_id).order_by('-recorded_at').first()
+    if location is None:
+        return None
+    return {
+        'rider': rider_id,
+        'latitude': location.latitude,
+        'longitude': location.longitude,
+        'recorded_at': location.recorded_at,
+    }
+
+
+@api_view(['POST'])
+def rider_pings(request):
+    """Record a batch of GPS pings for the current delivery user"""
+    if not request.user.is_authenticated or request.user.role != 'delivery':
+        return Response({'error': 'Delivery staff access required'}, status=status.HTTP_403_FORBIDDEN)
+    
+    serializer = RiderPingSerializer(
+        data=request.data.get('pings') if isinstance(request.data, dict) else request.data,
+        many=True, allow_empty=False, max_length=RIDER_PING_BATCH_SIZE
+    )
+    serializer.is_valid(raise_exception=True)
+    
+    now = timezone.now().timestamp()
+    rider_tracker.record(request.user.id, [
+        (
+            ping['latitude'],
+            ping['longitude'],
+            ping['recorded_at'].timestamp() if 'recorded_at' in ping else now,
+        )
+        for ping in serializer.validated_data
+    ])
+    return Response({'accepted': len(serializer.validated_data)}, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+def riders_nearby(request):
+    """Get active riders within radius_km of a point, nearest first"""
+    if not request.user.is_authenticated or request.user.role != 'admin':
+        return Response({'error': 'Admin access required'}, status=status.HTTP_403_FORBIDDEN)
+    
+    try:
+        latitude = float(request.query_params['lat'])
+        longitude = float(request.query_params['lng'])
+        radius_km = min(float(request.query_params.get('radius_km', 3)), NEARBY_MAX_RADIUS_KM)
+        limit = min(int(request.query_params.get('limit', 20)), 100)
+    except (KeyError, ValueError):
+        return Response({'error': 'lat and lng are required'}, status=status.HTTP_400_BAD_REQUEST)
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180) or radius_km <= 0:
+        return Response({'error': 'Invalid coordinates or radius'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    positions = rider_tracker.nearby(latitude, longitude, radius_km, limit=limit)
+    rider_ids = [position.rider_id for position in positions]
+    active_orders = dict(
+        Order.objects.filter(delivery_staff_id__in=rider_ids, status='out_for_delivery').values(
+            'delivery_staff_id'
+        ).annotate(count=Count('id')).values_list('delivery_staff_id', 'count')
+    )
+    usernames = dict(User.objects.filter(id__in=rider_ids).values_list('id', 'username'))
     
     return Response({
-        'total_orders': total_orders,
-        'pending_orders': pending_orders,
-        'total_customers': total_customers,
-        'total_revenue': float(total_revenue),
+        'results': [{
+            'rider': position.rider_id,
+            'username': usernames.get(position.rider_id),
+            'latitude': position.latitude,
+            'longitude': position.longitude,
+            'distance_km': round(position.distance_km, 3),
+            'recorded_at': datetime.fromtimestamp(position.timestamp, dt_timezone.utc),
+            'active_orders': active_orders.get(position.rider_id, 0),
+        } for position in positions],
     }, status=status.HTTP_200_OK)
+
+# Image Views
+STORED_IMAGE_RE = re.compile(r'[0-9a-f]{32}\.(webp|avif|jpg|png|gif)')
+STORED_IMAGE_MAX_AGE = 365 * 24 * 3600
+
+
+def image_file(request, name):
+    """Serve a stored image variant or downloaded original; names are content hashes, so they never change"""
+    if not STORED_IMAGE_RE.fullmatch(name):
+        raise Http404
+    etag = f'"{name.split(".")[0]}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        try:
+            image = default_storage.open(f'{VARIANT_DIR}/{name}', 'rb')
+        except FileNotFoundError:
+            raise Http404
+        response = FileResponse(image, content_type=mimetypes.guess_type(name)[0])
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, max_age=STORED_IMAGE_MAX_AGE, immutable=True)
+    return response
+
+
+# Request Metrics View
+@api_view(['GET'])
+@renderer_classes([JSONRenderer, PrometheusRenderer])
+def request_metrics(request):
+    """Get per-endpoint request metrics as JSON or Prometheus text (?format=prometheus)"""
+    if not request.user.is_authenticated or request.user.role != 'admin':
+        return Response({'error': 'Admin access required'}, status=status.HTTP_403_FORBIDDEN)
+    
+    return Response({
+        'endpoints': registry.snapshot(),
+        'password_checks': password_pool.snapshot(),
+    }, status=status.HTTP_200_OK)
+
+
+# Order Event Stream View
+def _authenticated_user(request):
+    """User of a bearer token, else of the session"""
+    token = bearer_token(request)
+    if token:
+        try:
+            return user_from_token(token)
+        except InvalidToken:
+            return None
+    return request.user if request.user.is_authenticated else None
+
+
+def _stream_user(request):
+    """User of a ?ticket= stream ticket, since EventSource cannot set headers, else as _authenticated_user"""
+    ticket = request.GET.get('ticket')
+    if ticket:
+        try:
+            return user_from_token(ticket, 'stream')
+        except InvalidToken:
+            return None
+    return _authenticated_user(request)
+
+
+@api_view(['POST'])
+def order_events_ticket(request):
+    """Issue a stream ticket for opening /api/events/orders/?ticket= with EventSource"""
+    if not request.user.is_authenticated:
+        return Response({'error': 'Authentication required'}, status=status.HTTP_401_UNAUTHORIZED)
+    return Response({
+        'ticket': issue_stream_ticket(request.user),
+        'expires_in': settings.FEASTO_EVENT_TICKET_TTL,
+    }, status=status.HTTP_200_OK)
+
+
+async def _event_stream(user):
+    broker = get_broker()
+    subscription = broker.subscribe()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.FEASTO_EVENT_STREAM_TIMEOUT
+    try:
+        yield 'retry: 3000\n: connected\n\n'
+        while loop.time() < deadline:
+            try:
+                event = await subscription.get(timeout=15)
+            except asyncio.TimeoutError:
+                # Comment line keeps proxies from closing an idle connection
+                yield ': keep-alive\n\n'
+                continue
+            if is_visible_to(event, user):
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+    finally:
+        broker.unsubscribe(subscription)
+
+
+async def order_events(request):
+    """Stream order status and assignment events for the current user as Server-Sent Events"""
+    user = await sync_to_async(_stream_user)(request)
+    if user is None:
+        return JsonResponse({'error': 'Authentication required'}, status=status.HTTP_401_UNAUTHORIZED)
+    
+    response = StreamingHttpResponse(_event_stream(user), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
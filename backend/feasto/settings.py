@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -46,6 +47,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.RequestMetricsMiddleware',  # Per-endpoint metrics, see FEASTO_METRICS_ENABLED
     'corsheaders.middleware.CorsMiddleware',  # CORS middleware
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -93,10 +95,45 @@ DATABASES = {
         'OPTIONS': {
             'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
         },
+        # Reuse connections across requests instead of reconnecting each time
+        'CONN_MAX_AGE': 60,
     }
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# FEASTO_CACHE_BACKEND selects the backend:
+#   locmem - per-process memory (default, single node)
+#   file   - shared directory, for several processes on one host
+#   redis  - any Redis-compatible server (requires the redis package)
+
+CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'feasto', {'MAX_ENTRIES': 10000}),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', str(BASE_DIR / '.cache'), {'MAX_ENTRIES': 10000}),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis://127.0.0.1:6379/1', {}),
+}
+FEASTO_CACHE_BACKEND = os.environ.get('FEASTO_CACHE_BACKEND', 'locmem')
+CACHE_BACKEND, CACHE_LOCATION, CACHE_OPTIONS = CACHE_BACKENDS[FEASTO_CACHE_BACKEND]
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.environ.get('FEASTO_CACHE_LOCATION', CACHE_LOCATION),
+        'TIMEOUT': 300,
+        'KEY_PREFIX': 'feasto',
+        'OPTIONS': CACHE_OPTIONS,
+    }
+}
+
+# Lifetime of cached menu listings and of the version counters behind their ETags. locmem is
+# per process, so a menu edit only reaches other workers once these expire; keep that short
+FEASTO_MENU_CACHE_TTL = 60 if FEASTO_CACHE_BACKEND == 'locmem' else 60 * 60
+
+# Sessions are read from the cache and only fall back to the database on a miss
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -156,6 +193,7 @@ CORS_ALLOWED_ORIGINS = [
 # REST Framework Settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        'api.authentication.JWTAuthentication',  # Authorization: Bearer <access token>
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -165,6 +203,23 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 50,
 }
 
+# JWT access/refresh tokens (/api/auth/token/); lifetimes in seconds
+FEASTO_JWT_SECRET = os.environ.get('FEASTO_JWT_SECRET', SECRET_KEY)
+FEASTO_JWT_ACCESS_TTL = 15 * 60
+FEASTO_JWT_REFRESH_TTL = 7 * 24 * 3600
+# Users behind access tokens are cached per process; role changes apply within the TTL
+FEASTO_JWT_USER_CACHE_SIZE = 1024
+FEASTO_JWT_USER_CACHE_TTL = 60
+
+# Login throttling: failed attempts allowed per username and per client IP within the window (seconds)
+FEASTO_LOGIN_FAILURES_PER_USER = 5
+FEASTO_LOGIN_FAILURES_PER_IP = 50
+FEASTO_LOGIN_FAILURE_WINDOW = 300
+# Password checks run on this many threads; logins beyond the queue get 503 + Retry-After.
+# A check takes a few hundred ms of CPU, so the queue bounds the worst login wait to a few seconds
+FEASTO_PASSWORD_WORKERS = int(os.environ.get('FEASTO_PASSWORD_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+FEASTO_PASSWORD_QUEUE = 4 * FEASTO_PASSWORD_WORKERS
+
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
@@ -172,6 +227,38 @@ MEDIA_ROOT = BASE_DIR / 'media'
 # Custom User Model
 AUTH_USER_MODEL = 'api.User'
 
+# Order event push channel (/api/events/orders/), served as Server-Sent Events under ASGI
+FEASTO_EVENT_BROKER = os.environ.get('FEASTO_EVENT_BROKER', 'api.events.InProcessBroker')
+# Streams are closed after this many seconds; EventSource clients then reconnect
+FEASTO_EVENT_STREAM_TIMEOUT = 300
+# Stream tickets (?ticket=) open event streams only and expire after this many seconds,
+# so a ticket left in an access log or browser history is soon useless
+FEASTO_EVENT_TICKET_TTL = 60
+
+# Request metrics (query count, SQL time, response size per endpoint) at /api/metrics/
+FEASTO_METRICS_ENABLED = os.environ.get('FEASTO_METRICS_ENABLED', '') == '1'
+
+# Order dispatch: pickup point as "lat,lng", and whether ready orders are assigned to riders automatically
+FEASTO_KITCHEN_LOCATION = (
+    tuple(float(part) for part in os.environ['FEASTO_KITCHEN_LOCATION'].split(','))
+    if os.environ.get('FEASTO_KITCHEN_LOCATION') else None
+)
+FEASTO_AUTO_DISPATCH = os.environ.get('FEASTO_AUTO_DISPATCH', '') == '1'
+# Riders further than this from an order's pickup are not considered for it
+FEASTO_DISPATCH_MAX_KM = 10
+# Seconds the work queue's ?since= watermark is stepped back to catch rows committed late;
+# must exceed the longest transaction that changes an order
+FEASTO_WORK_QUEUE_OVERLAP = 30
+
+# Menu images given as image_url are downloaded and served from /api/images/; fetch them in the
+# background as soon as an item's URL changes (otherwise run manage.py fetch_remote_images)
+FEASTO_FETCH_REMOTE_IMAGES = os.environ.get('FEASTO_FETCH_REMOTE_IMAGES', '') == '1'
+FEASTO_REMOTE_IMAGE_TIMEOUT = 10
+FEASTO_REMOTE_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+
+# Default threshold of the low-stock report (/api/food/low_stock/)
+FEASTO_LOW_STOCK_THRESHOLD = 10
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/6.0/howto/static-files/
 